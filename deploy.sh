@@ -4,6 +4,7 @@ set -e
 # Build and push Docker image to DockerHub
 echo "Building Docker images..."
 targets=(
+    scrape_all
     scrape_shares insert_shares
     scrape_bonds insert_bonds
     scrape_indices insert_indices
@@ -0,0 +1,269 @@
+"""
+Historical backfill of daily share prices
+Fetches the daily OHLCV history of every share listed on the configured
+shares page from the history sources in config.yml, over a date range split
+into chunks of `chunk_days`. Chunks are fetched on a thread pool with at
+most `per_host` requests in flight per host and bulk-loaded into the SHARES
+table of the local DuckDB database, skipping (SYMBOL, DATE) rows already
+there. The dates loaded for each ticker are appended to a checkpoint file,
+and a run only fetches the dates of its range no earlier run covered, so an
+interrupted run resumes where it stopped, whatever range or chunk size it
+is started again with. Today is never recorded as covered, as its bar may
+not be final yet.
+
+The backfill writes to the local DuckDB database only. To load its rows
+into BigQuery, export them as a staging file and let insert_shares upsert
+them like a scraped one:
+    duckdb database/financial_assets.db "COPY SHARES TO 'SHARES-backfill.parquet'"
+    gsutil cp SHARES-backfill.parquet gs://data-<project number>/
+
+Usage:
+    python backfill.py --start 2015-01-01 [--end 2024-06-30] [--symbols SNTS ORAC] [--workers 16]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, timedelta
+from urllib.parse import urlparse
+
+import duckdb
+import pandas as pd
+import requests
+import yaml
+
+from helper import (HTTP_RETRIES, HTTP_TIMEOUT, RETRY_STATUSES, ensure_keyed_table, extract_table, fetch_page,
+                    get_http_session, record_http_stat, refresh_aggregates_duckdb, retry_delay)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SHARES_COLUMNS = ['SYMBOL', 'NAME', 'OPEN', 'HIGH', 'LOW', 'VOLUME', 'CLOSE', 'DATE']
+
+
+def list_tickers(config):
+    """Symbol -> (ticker of the history sources, e.g. SNTS.sn, name) of the shares on the shares page"""
+    table = extract_table(fetch_page(config['url']['shares']), "tablesorter tbl100_6 tbl1")
+    tickers = {}
+    for link, name in zip(table.links, table.columns[0]):
+        ticker = link.split("_")[1]
+        tickers[ticker.split(".")[0]] = (ticker, name.replace('\xa0', ' '))
+    return tickers
+
+
+def date_chunks(start, end, days):
+    """Consecutive (first, last) date ranges of at most `days` days covering start..end"""
+    chunks = []
+    while start <= end:
+        last = min(end, start + timedelta(days=days - 1))
+        chunks.append((start, last))
+        start = last + timedelta(days=1)
+    return chunks
+
+
+class HostLimits:
+    """At most `per_host` concurrent requests to any one host"""
+
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self._semaphores[host]
+
+
+def fetch_sikafinance(url, ticker, first, last):
+    """Daily bars of a ticker from sikafinance's history API, as columns of SHARES without SYMBOL and NAME"""
+    payload = {'ticker': ticker, 'datedeb': first.isoformat(), 'datefin': last.isoformat(), 'xperiod': '0'}
+    session = get_http_session()
+    # POST is not retried by the session's adapter, so retry transient failures here
+    for attempt in range(HTTP_RETRIES + 1):
+        record_http_stat(requests=1)
+        try:
+            response = session.post(url, json=payload, timeout=HTTP_TIMEOUT)
+            if response.status_code not in RETRY_STATUSES:
+                break
+        except requests.RequestException:
+            if attempt == HTTP_RETRIES:
+                raise
+        if attempt == HTTP_RETRIES:
+            break
+        record_http_stat(retries=1)
+        time.sleep(retry_delay(attempt))
+    response.raise_for_status()
+    record_http_stat(bytes_downloaded=len(response.content))
+
+    bars = pd.DataFrame(response.json().get('lst') or [], columns=['Date', 'Open', 'High', 'Low', 'Volume', 'Close'])
+    df = pd.DataFrame({
+        'OPEN': pd.to_numeric(bars['Open'], errors='coerce'),
+        'HIGH': pd.to_numeric(bars['High'], errors='coerce'),
+        'LOW': pd.to_numeric(bars['Low'], errors='coerce'),
+        'VOLUME': pd.to_numeric(bars['Volume'], errors='coerce'),
+        'CLOSE': pd.to_numeric(bars['Close'], errors='coerce'),
+        'DATE': pd.to_datetime(bars['Date'], format='%d/%m/%Y', errors='coerce').dt.strftime('%Y-%m-%d'),
+    })
+    return df.dropna(subset=['DATE', 'CLOSE'])
+
+
+# Source (key of config['history']) -> fetch function of (url, ticker, first, last)
+HISTORY_SOURCES = {
+    'sikafinance': fetch_sikafinance,
+}
+
+
+class Checkpoint:
+    """Append-only record of the date ranges already loaded for each (source, ticker)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.covered = defaultdict(list)
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line of an interrupted run
+                    self.covered[entry['source'], entry['ticker']].append(
+                        (date.fromisoformat(entry['first']), date.fromisoformat(entry['last'])))
+
+    def add(self, tasks):
+        """Record the loaded (source, ticker, first, last, rows) chunks, up to yesterday"""
+        yesterday = date.today() - timedelta(days=1)
+        entries = [(source, ticker, first, min(last, yesterday), rows)
+                   for source, ticker, first, last, rows in tasks if first <= yesterday]
+        with open(self.path, 'a') as f:
+            for source, ticker, first, last, rows in entries:
+                f.write(json.dumps({'source': source, 'ticker': ticker, 'first': first.isoformat(),
+                                    'last': last.isoformat(), 'rows': rows}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        for source, ticker, first, last, _ in entries:
+            self.covered[source, ticker].append((first, last))
+
+    def missing(self, source, ticker, start, end):
+        """(first, last) ranges of start..end not covered yet for the ticker, in date order"""
+        gaps, cursor = [], start
+        for first, last in sorted(self.covered[source, ticker]):
+            if first > end:
+                break
+            if first > cursor:
+                gaps.append((cursor, first - timedelta(days=1)))
+            cursor = max(cursor, last + timedelta(days=1))
+        if cursor <= end:
+            gaps.append((cursor, end))
+        return gaps
+
+
+def load_shares(con, frames):
+    """Insert the bars into SHARES, skipping (SYMBOL, DATE) rows it already has; returns rows inserted"""
+    batch = pd.concat(frames, ignore_index=True)[SHARES_COLUMNS].drop_duplicates(['SYMBOL', 'DATE'])
+    con.register('batch', batch)
+    try:
+        ensure_keyed_table(con, 'SHARES', 'batch')
+        before = con.execute("SELECT COUNT(*) FROM SHARES").fetchone()[0]
+        con.execute("INSERT INTO SHARES BY NAME SELECT * FROM batch ON CONFLICT (SYMBOL, DATE) DO NOTHING")
+        return con.execute("SELECT COUNT(*) FROM SHARES").fetchone()[0] - before
+    finally:
+        con.unregister('batch')
+
+
+def backfill(config, start, end, symbols=None, workers=16, checkpoint_path=None, batch_rows=50000):
+    """Fetch and load every missing chunk; returns counts for reporting"""
+    history = config['history']
+    db_path = os.path.join(HERE, '..', config['duckdb']['database'])
+    checkpoint = Checkpoint(checkpoint_path or os.path.splitext(db_path)[0] + '-backfill.jsonl')
+    tickers = list_tickers(config)
+    if symbols:
+        tickers = {symbol: tickers[symbol] for symbol in symbols if symbol in tickers}
+
+    sources = [source for source in HISTORY_SOURCES if source in history]
+    tasks = [(source, symbol, first, last)
+             for source in sources
+             for symbol in tickers
+             for gap in checkpoint.missing(source, tickers[symbol][0], start, end)
+             for first, last in date_chunks(*gap, int(history.get('chunk_days', 90)))]
+    limits = HostLimits(int(history.get('per_host', 4)))
+
+    def run(task):
+        source, symbol, first, last = task
+        url = history[source]
+        with limits(url):
+            df = HISTORY_SOURCES[source](url, tickers[symbol][0], first, last)
+        df.insert(0, 'SYMBOL', symbol)
+        df.insert(1, 'NAME', tickers[symbol][1])
+        return df
+
+    requested_days = ((end - start).days + 1) * len(tickers) * len(sources)
+    stats = defaultdict(int, tasks=len(tasks),
+                        skipped_days=requested_days - sum((last - first).days + 1 for _, _, first, last in tasks))
+    pending_frames, pending_tasks = [], []
+
+    def flush(con):
+        if pending_tasks:
+            frames = [df for df in pending_frames if len(df)]
+            stats['inserted'] += load_shares(con, frames) if frames else 0
+            checkpoint.add(pending_tasks)
+            pending_frames.clear()
+            pending_tasks.clear()
+
+    with duckdb.connect(db_path) as con, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run, task): task for task in tasks}
+        try:
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    source, symbol, first, last = futures.pop(future)
+                    try:
+                        df = future.result()
+                    except Exception as e:
+                        stats['failed'] += 1
+                        print(f"{source} {symbol} {first}..{last}: {type(e).__name__}: {e}")
+                        continue
+                    stats['done'] += 1
+                    stats['rows'] += len(df)
+                    pending_frames.append(df)
+                    pending_tasks.append((source, tickers[symbol][0], first, last, len(df)))
+                if sum(len(df) for df in pending_frames) >= batch_rows:
+                    flush(con)
+        except KeyboardInterrupt:
+            print("Interrupted, saving the chunks fetched so far")
+            pool.shutdown(wait=False, cancel_futures=True)
+        finally:
+            flush(con)
+    if stats['inserted']:
+        refresh_aggregates_duckdb(config['duckdb']['database'])
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--end", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--symbols", nargs="*", help="default: every share on the shares page")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--checkpoint", help="default: next to the DuckDB database")
+    parser.add_argument("--batch-rows", type=int, default=50000, help="rows per bulk insert")
+    args = parser.parse_args()
+
+    with open(os.path.join(HERE, 'config.yml'), 'r') as file:
+        config = yaml.safe_load(file)
+
+    start = time.perf_counter()
+    stats = backfill(config, args.start, args.end, args.symbols, args.workers, args.checkpoint, args.batch_rows)
+    print(f"{stats['done']} of {stats['tasks']} chunks fetched ({stats['skipped_days']} ticker-days already loaded, "
+          f"{stats['failed']} failed): {stats['rows']} bars, {stats['inserted']} new rows in SHARES "
+          f"in {time.perf_counter() - start:.1f}s")
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
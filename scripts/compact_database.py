@@ -0,0 +1,79 @@
+"""
+One-off deduplication and compaction of the DuckDB database
+Tables loaded before the inserts became upserts can hold several rows per
+natural key (a file inserted twice, two files for the same day). This gives
+every table of helper.TABLE_KEYS its primary key, keeping the row inserted
+last for each key, rebuilds the weekly/monthly aggregates from the cleaned
+SHARES, and rewrites the database into a fresh file so the space of the
+dropped rows is given back (the new key indexes take some of it). The
+original file is kept as <database>.bak.
+
+Usage (from the scripts directory):
+    python compact_database.py [--dry-run] [--no-backup]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+
+import duckdb
+import yaml
+
+from helper import TABLE_KEYS, ensure_keyed_table, refresh_aggregates_duckdb
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def duplicate_counts(con):
+    """Table -> (rows, rows in excess of one per key) for the keyed tables present in the database"""
+    tables = {name for name, in con.execute("SELECT table_name FROM duckdb_tables()").fetchall()}
+    counts = {}
+    for table, key in TABLE_KEYS.items():
+        if table in tables:
+            rows, keys = con.execute(f"SELECT COUNT(*), COUNT(DISTINCT ({', '.join(key)})) FROM {table}").fetchone()
+            counts[table] = (rows, rows - keys)
+    return counts
+
+
+def compact(db_path):
+    """Rewrite the database into a new file, replacing the original"""
+    compacted = db_path + '.compact'
+    if os.path.exists(compacted):
+        os.remove(compacted)
+    with duckdb.connect(db_path) as con:
+        con.execute(f"ATTACH '{compacted}' AS compacted")
+        con.execute(f"COPY FROM DATABASE {con.execute('SELECT current_database()').fetchone()[0]} TO compacted")
+        con.execute("DETACH compacted")
+    os.replace(compacted, db_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only report the duplicates")
+    parser.add_argument("--no-backup", action="store_true", help="don't keep the original as <database>.bak")
+    args = parser.parse_args()
+
+    with open(os.path.join(HERE, 'config.yml'), 'r') as file:
+        config = yaml.safe_load(file)
+    db_path = os.path.join(HERE, '..', config['duckdb']['database'])
+
+    before = os.path.getsize(db_path)
+    if not args.dry_run and not args.no_backup:
+        shutil.copy2(db_path, db_path + '.bak')
+    with duckdb.connect(db_path, read_only=args.dry_run) as con:
+        counts = duplicate_counts(con)
+        for table, (rows, duplicates) in counts.items():
+            print(f"{table:<17}{rows:>8} rows{duplicates:>8} duplicates")
+        if args.dry_run:
+            return 0
+        removed = sum(ensure_keyed_table(con, table, table) for table in counts)
+    if 'SHARES' in counts:
+        refresh_aggregates_duckdb(config['duckdb']['database'])
+    compact(db_path)
+    print(f"{removed} duplicate rows removed, database {before / 1024:.0f} KB -> {os.path.getsize(db_path) / 1024:.0f} KB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Fingerprint consistency check
+The scrape step compares a table's fingerprint with the last one the insert
+step recorded, so both must hash the same content. For every table and both
+staging formats this builds the fingerprint the scrape step computes
+(helper.staged_fingerprint on the cleaned DataFrame) and the one the insert
+step records (helper.table_fingerprint of the staging file read back from
+disk), and fails if they differ. The tables are cleaned with the scrapers'
+own schemas from scraped-looking text, including the values whose CSV round
+trip changes them (a scaled rate such as 5,9 % giving 0.059000000000000004,
+an index closing such as 248.80), plus the pages recorded in fixtures/ when
+there are any (see scrape_benchmark.py).
+
+Usage (from the scripts directory):
+    python fingerprint_check.py
+"""
+
+import os
+import sys
+import tempfile
+
+import pandas as pd
+import yaml
+
+import helper
+from helper import (STAGING_FORMATS, clean_table, staged_content, staged_fingerprint, staged_table,
+                    table_fingerprint)
+import scrape_bonds
+import scrape_capitalizations
+import scrape_dividends
+import scrape_indices
+import scrape_shares
+from scrape_benchmark import FIXTURES, SCRAPERS, recorded_pages
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Table -> (cleaning schema, scraped text of each column, renames applied by the scraper)
+SAMPLES = {
+    'SHARES': (scrape_shares.SCHEMA, {
+        'SYMBOL': ['SNTS', 'ORAC', 'SGBC'], 'NAME': ['SONATEL', 'ORANGE  COTE D\'IVOIRE', 'SGB CI'],
+        'OPEN': ['25 000', '14 100', '18 150'], 'HIGH': ['25 500', '14 300', '18 200'],
+        'LOW': ['24 900', '14 000', '18 000'], 'VOLUME': ['4 321', '1 105', '98'],
+        'CLOSE': ['25 300', '14 250', '18 100']}, {}),
+    'BONDS': (scrape_bonds.SCHEMA, {
+        'SYMBOL': ['EOS.BJ', 'TPCI.O1', 'BOAD.B'], 'NAME': ['ETAT DU BENIN', 'TRESOR PUBLIC CI', 'BOAD'],
+        'PRICE': ['10 000', '9 950,5', '10 010'], 'INTEREST_RATE': ['5,9', '6,25', '5,95'],
+        'ISSUE_DATE': ['03/15/2019', '11/02/2020', '07/01/2021'],
+        'MATURITY_DATE': ['31/12/2026', '31/12/2030', '31/12/2031']}, {}),
+    'INDICES': (scrape_indices.SCHEMA, {
+        'NAME': ['BRVM COMPOSITE', 'BRVM 30', 'BRVM PRESTIGE'],
+        'PREVIOUS_CLOSING': ['248.80', '124.10', '110.05'], 'CLOSING': ['249.00', '124.30', '110.00']}, {}),
+    'CAPITALIZATIONS': (scrape_capitalizations.SCHEMA, {
+        'SYMBOL': ['SNTS', 'ORAC'], 'NAME': ['SONATEL', 'ORANGE COTE D\'IVOIRE'],
+        'NUMBER_OF_SHARES': ['100 000 000', '150 473 967'], 'DAILY_PRICE': ['25 300', '14 250'],
+        'FLOATING_CAPITALIZATION': ['632 500 000 000', '214 425 402 975'],
+        'GLOBAL_CAPITALIZATION': ['2 530 000 000 000', '2 144 254 029 750'],
+        'GLOBAL_CAPITALIZATION_(%)': ['20,15', '17,08']}, {}),
+    'DIVIDENDS': (scrape_dividends.SCHEMA, {
+        'SYMBOL': ['SNTS', 'ORAC', 'SGBC'], 'DIVIDENDE': ['1 655', '850,5', '1 575'],
+        'DATE_PAIEMENT': ['2024-05-21', '', '2024-07-02']},
+        {'DIVIDENDE': 'DIVIDEND', 'DATE_PAIEMENT': 'PAYMENT_DATE'}),
+}
+TABLES = {'shares': 'SHARES', 'bonds': 'BONDS', 'indices': 'INDICES', 'capitalizations': 'CAPITALIZATIONS',
+          'dividends': 'DIVIDENDS'}
+
+
+def sample_tables():
+    tables = []
+    for asset, (schema, text, renames) in SAMPLES.items():
+        df = clean_table(pd.DataFrame(text), schema, asset).rename(columns=renames)
+        df['DATE'] = '2024-06-28'
+        tables.append((asset, asset, df))
+    return tables
+
+
+def recorded_tables(config):
+    if not recorded_pages():
+        return []
+    helper.HTTP_REPLAY_DIR = FIXTURES
+    return [(f"{TABLES[name]} (recorded)", TABLES[name], scrape(config['url'][name]))
+            for name, scrape in SCRAPERS.items()]
+
+
+def main():
+    with open(os.path.join(HERE, 'config.yml'), 'r') as file:
+        config = yaml.safe_load(file)
+
+    failed = False
+    print(f"{'table':<28}{'format':<9}{'scrape = insert':<17}in-memory hash")
+    with tempfile.TemporaryDirectory() as workdir:
+        for label, asset, df in sample_tables() + recorded_tables(config):
+            for staging_format in STAGING_FORMATS:
+                scraped = staged_fingerprint(df, asset, config, staging_format)
+                path = os.path.join(workdir, f'{asset}.{staging_format}')
+                with open(path, 'wb') as f:
+                    f.write(staged_content(df, asset, staging_format))
+                loaded = table_fingerprint(staged_table(path))
+                failed |= scraped != loaded
+                # What hashing the scraped frame directly would have given, for reference
+                in_memory = "same" if table_fingerprint(df) == loaded else "differs"
+                print(f"{label:<28}{staging_format:<9}{'ok' if scraped == loaded else 'MISMATCH':<17}{in_memory}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
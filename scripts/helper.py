@@ -1,39 +1,199 @@
 import os, io
+import codecs
+import hashlib
+import json
+import random
+import re
 import shutil
+import tempfile
+import threading
+from typing import List, NamedTuple, Optional
 from fileinput import filename
 import duckdb
 
 from google.cloud import bigquery
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import glob
 import requests
-from bs4 import BeautifulSoup
 from google.cloud import resourcemanager_v3
-from datetime import datetime
+from datetime import date, datetime
 
 from google.cloud import storage
 from google.auth import default
 
+from trading_calendar import is_session
+
 def get_project_number(project_id):
     client = resourcemanager_v3.ProjectsClient()
     project = client.get_project(name=f"projects/{project_id}")
     return project.name.split("/")[1]  # Format is "projects/{project_number}"
 
-def save_dataframe_as_csv(df, fin_asset, conf):
+def table_fingerprint(df):
+    """
+    Hash of a table's content, ignoring the scrape DATE column and the row
+    order. Hash the table as the insert step reads it back from its staging
+    file (see staged_fingerprint): a scraped frame and its CSV round trip
+    can differ, e.g. the text '248.80' reads back as the number 248.8.
+    """
+    lines = df.drop(columns=['DATE'], errors='ignore').to_csv(index=False, sep="|").splitlines()
+    return hashlib.sha256("\n".join(lines[:1] + sorted(lines[1:])).encode()).hexdigest()
+
+
+def _fingerprints_blob():
+    credentials, project_id = default()
+    return storage.Client().bucket(f"archive-{get_project_number(project_id)}").blob('fingerprints.json')
+
+
+def load_fingerprints(conf):
+    """Asset -> {'fingerprint', 'date'} of the last table ingested for it"""
+    if os.getenv('K_SERVICE') and os.getenv('FUNCTION_TARGET'):
+        blob = _fingerprints_blob()
+        return json.loads(blob.download_as_text()) if blob.exists() else {}
+    try:
+        with open(os.path.join(os.path.dirname(__file__), '..', conf['fingerprints'])) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_ingested_fingerprint(conf, asset, fingerprint, date):
+    fingerprints = load_fingerprints(conf)
+    fingerprints[asset] = {'fingerprint': fingerprint, 'date': date}
+    if os.getenv('K_SERVICE') and os.getenv('FUNCTION_TARGET'):
+        _fingerprints_blob().upload_from_string(json.dumps(fingerprints, indent=2))
+    else:
+        path = os.path.join(os.path.dirname(__file__), '..', conf['fingerprints'])
+        with open(path + '.tmp', 'w') as f:
+            json.dump(fingerprints, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+
+def staged_day(df):
+    """Latest scrape DATE of a table, as a date"""
+    return pd.Timestamp(str(df['DATE'].max())).date()
+
+
+def unchanged_since(df, fin_asset, conf, staging_format=None):
+    """
+    Date of the last ingested table of the asset if df would stage the same
+    content and was scraped on a day that is not a session, else None. On a
+    session an unchanged table is still staged under its new DATE, so the
+    daily series has no gap.
+    """
+    if is_session(staged_day(df)):
+        return None
+    last = load_fingerprints(conf).get(fin_asset)
+    if last and last['fingerprint'] == staged_fingerprint(df, fin_asset, conf, staging_format):
+        return last['date']
+    return None
+
+
+# Column types of the Parquet staging files per table. Dates are DATE rather than the
+# 'YYYY-MM-DD' text a CSV round trip gives back.
+STAGING_SCHEMAS = {
+    'SHARES': pa.schema([('SYMBOL', pa.string()), ('NAME', pa.string()), ('OPEN', pa.float64()),
+                         ('HIGH', pa.float64()), ('LOW', pa.float64()), ('VOLUME', pa.float64()),
+                         ('CLOSE', pa.float64()), ('DATE', pa.date32())]),
+    'BONDS': pa.schema([('SYMBOL', pa.string()), ('NAME', pa.string()), ('PRICE', pa.float64()),
+                        ('INTEREST_RATE', pa.float64()), ('ISSUE_DATE', pa.date32()),
+                        ('MATURITY_DATE', pa.date32()), ('DATE', pa.date32())]),
+    'INDICES': pa.schema([('NAME', pa.string()), ('PREVIOUS_CLOSING', pa.string()), ('CLOSING', pa.string()),
+                          ('DATE', pa.date32())]),
+    'CAPITALIZATIONS': pa.schema([('SYMBOL', pa.string()), ('NAME', pa.string()), ('NUMBER_OF_SHARES', pa.float64()),
+                                  ('DAILY_PRICE', pa.float64()), ('FLOATING_CAPITALIZATION', pa.float64()),
+                                  ('GLOBAL_CAPITALIZATION', pa.float64()),
+                                  ('GLOBAL_CAPITALIZATION_(%)', pa.float64()), ('DATE', pa.date32())]),
+    'DIVIDENDS': pa.schema([('SYMBOL', pa.string()), ('DIVIDEND', pa.float64()), ('PAYMENT_DATE', pa.date32()),
+                            ('DATE', pa.date32())]),
+}
+STAGING_FORMATS = ('csv', 'parquet')
+
+
+def to_arrow(df, fin_asset):
+    """The table in its staging schema; fails on a missing column or a value that doesn't convert"""
+    schema = STAGING_SCHEMAS[fin_asset]
+    arrays = []
+    for field in schema:
+        values = df[field.name]
+        if pa.types.is_date(field.type):
+            values = pd.to_datetime(values).values.astype('datetime64[D]')
+        arrays.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def staged_content(df, fin_asset, staging_format, compression='zstd'):
+    """Bytes of the staging file of the table in the given format"""
+    if staging_format == 'parquet':
+        sink = pa.BufferOutputStream()
+        pq.write_table(to_arrow(df, fin_asset), sink, compression=compression)
+        return sink.getvalue().to_pybytes()
+    return df.to_csv(index=False, sep="|").encode()
+
+
+def staging_options(conf, staging_format=None):
+    """(format, Parquet compression) of the staging files, staging_format overriding conf['staging']"""
+    staging = conf.get('staging') or {}
+    return staging_format or staging.get('format', 'csv'), staging.get('compression', 'zstd')
+
+
+def staged_table(path, content=None):
+    """A staging file read back as a DataFrame, as the insert step loads and fingerprints it"""
+    staged = read_staged(path, content)
+    return staged.to_pandas() if isinstance(staged, pa.Table) else staged
+
+
+def staged_fingerprint(df, fin_asset, conf, staging_format=None):
+    """Fingerprint of the table as it reads back from the staging file it would be saved as"""
+    staging_format, compression = staging_options(conf, staging_format)
+    content = staged_content(df, fin_asset, staging_format, compression)
+    return table_fingerprint(staged_table(f'{fin_asset}.{staging_format}', content))
+
+
+def read_staged(path, content=None):
+    """
+    A staging file as an Arrow table (Parquet, memory-mapped when read from
+    disk) or a DataFrame (CSV), from its path or from its downloaded bytes.
+    CSV floats are read back exactly: pandas' default parser can be off by
+    the last digit, e.g. 0.062 for 0.062000000000000006.
+    """
+    if path.endswith('.parquet'):
+        return pq.read_table(pa.BufferReader(content) if content is not None else path, memory_map=True)
+    return pd.read_csv(io.BytesIO(content) if content is not None else path, sep='|', float_precision='round_trip')
+
+
+def save_dataframe_as_csv(df, fin_asset, conf, skip_unchanged=True, staging_format=None):
     """
-    Save a Pandas DataFrame as a CSV file either locally or to Google Cloud Storage (GCS).
+    Save a Pandas DataFrame as a staging file either locally or to Google Cloud Storage (GCS),
+    as pipe-separated CSV or as Parquet with the table's explicit schema (conf['staging']).
 
     Parameters:
     - df (pd.DataFrame): The DataFrame to save.
     - filename (str): The name of the file to save as.
     - gcs_bucket_name (str, optional): The name of the GCS bucket. If provided, the file will be saved to GCS.
       If None, the file will be saved locally.
+    - skip_unchanged (bool): Don't save a table identical to the last one ingested for the asset
+      on a day that is not a session (see unchanged_since).
+    - staging_format (str, optional): 'csv' or 'parquet', overriding conf['staging']['format'].
     """
+    if skip_unchanged:
+        since = unchanged_since(df, fin_asset, conf, staging_format)
+        if since:
+            return f"Skipped {fin_asset}: same content as the data ingested on {since}.\n"
+    # Rows rejected by clean_table, kept aside where the insert step won't load them
+    quarantine = df.attrs.get('quarantine')
+    note = ''
+    if quarantine:
+        # Kept as scraped text, so always CSV
+        note = save_dataframe_as_csv(pd.DataFrame(quarantine), f'QUARANTINE-{fin_asset}', conf, skip_unchanged=False,
+                                     staging_format='csv')
+    staging_format, compression = staging_options(conf, staging_format)
+    content = staged_content(df, fin_asset, staging_format, compression)
     today = datetime.now().strftime('%Y-%m-%d')
-    filename = f'{fin_asset}-{today}.csv'
+    filename = f'{fin_asset}-{today}.{staging_format}'
     if os.getenv('K_SERVICE') and os.getenv('FUNCTION_TARGET'):
-        # Save the file to a temporary location
-        csv_string = df.to_csv(index=False, sep="|")
         credentials, project_id = default()
         project_number = get_project_number(project_id)
         # Upload the file to GCS
@@ -41,40 +201,388 @@ def save_dataframe_as_csv(df, fin_asset, conf):
         bucket_url = f"data-{project_number}"
         bucket = client.bucket(bucket_url)
         blob = bucket.blob(filename)
-        blob.upload_from_string(csv_string)
+        blob.upload_from_string(content)
 
-        return f"File saved to GCS bucket '{bucket_url}' as '{filename}'.\n"
+        return f"File saved to GCS bucket '{bucket_url}' as '{filename}'.\n" + note
     else:
         # Save the file locally
         file = os.path.join(os.path.dirname(__file__), '..','data', filename)
-        df.to_csv(file, index=False, sep="|")
-        return(f"File saved locally as '{filename}'.\n")
-
-def scrape(url):
-    params = {
-        "hl": "en"  # language
-    }
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.60 Safari/537.36",
-    }
-    page = requests.get(url=url, params=params, headers=headers,
-                        timeout=30)
-    soup = BeautifulSoup(page.content, 'html.parser')
-    # Find the table in the HTML (assuming there's only one table)
-    table = soup.find('table', {"class": "table table-hover table-striped sticky-enabled"})
-    # Extract the headers from the table
-    # Extract the header
-    headers = []
-    header_row = table.find('thead').find_all('th')
-    for th in header_row:
-        headers.append(th.get_text().strip().replace(' ', "_").upper())
-    # Extract the rows from the table
-    rows = []
-    for tr in table.find('tbody').find_all('tr'):
-        cells = tr.find_all(['td', 'th'])
-        row = [cell.text.strip() for cell in cells]
-        rows.append(row)
-    return headers, rows
+        with open(file, 'wb') as f:
+            f.write(content)
+        return(f"File saved locally as '{filename}'.\n" + note)
+
+# Query parameters and headers sent with every page request
+HTTP_PARAMS = {
+    "hl": "en"  # language
+}
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.60 Safari/537.36",
+}
+HTTP_TIMEOUT = 30
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 1.0  # seconds, doubled per retry plus up to as much random jitter
+HTTP_POOL_SIZE = 10
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Validators and bodies of fetched pages for conditional requests. Cloud
+# Functions can only write to /tmp, which survives between warm invocations.
+HTTP_CACHE_DIR = os.getenv('HTTP_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'tradvisor-http-cache'))
+# Record/replay of fetched pages: with HTTP_RECORD_DIR every fetched page is
+# also saved there, with HTTP_REPLAY_DIR pages are read from there and the
+# network is never used (see scrape_benchmark.py)
+HTTP_RECORD_DIR = os.getenv('HTTP_RECORD_DIR')
+HTTP_REPLAY_DIR = os.getenv('HTTP_REPLAY_DIR')
+
+# Counters of the fetch layer, reported by the scrapers
+HTTP_STATS = {'requests': 0, 'not_modified': 0, 'retries': 0, 'bytes_downloaded': 0, 'bytes_saved': 0}
+_http_stats_lock = threading.Lock()
+_http_session = None
+
+
+def record_http_stat(**increments):
+    with _http_stats_lock:
+        for name, value in increments.items():
+            HTTP_STATS[name] += value
+
+
+def reset_http_stats():
+    """Zero the counters, at the start of an invocation: warm instances keep the module loaded"""
+    with _http_stats_lock:
+        for name in HTTP_STATS:
+            HTTP_STATS[name] = 0
+
+
+def http_stats_summary():
+    return (f"HTTP: {HTTP_STATS['requests']} requests, {HTTP_STATS['not_modified']} not modified, "
+            f"{HTTP_STATS['retries']} retries, {HTTP_STATS['bytes_downloaded'] / 1024:.0f} KB downloaded, "
+            f"{HTTP_STATS['bytes_saved'] / 1024:.0f} KB saved.\n")
+
+
+class Page(bytes):
+    """Body of a fetched page, with the charset its Content-Type header gave (None without one)"""
+    charset = None
+
+    def __new__(cls, content, charset=None):
+        page = super().__new__(cls, content)
+        page.charset = charset
+        return page
+
+
+_CONTENT_TYPE_CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+
+def known_charset(name):
+    """The charset name if Python has a codec for it, else None"""
+    try:
+        return codecs.lookup(name).name if name else None
+    except LookupError:
+        return None
+
+
+def content_type_charset(content_type):
+    match = _CONTENT_TYPE_CHARSET.search(content_type or '')
+    return known_charset(match.group(1)) if match else None
+
+
+def retry_delay(attempt):
+    """Exponential backoff with jitter for the given (0-based) retry"""
+    return HTTP_BACKOFF * 2 ** attempt + random.uniform(0, HTTP_BACKOFF)
+
+
+class HttpCache:
+    """On-disk ETag / Last-Modified validators and bodies, one pair of files per URL"""
+
+    def __init__(self, directory=HTTP_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url, suffix):
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest() + suffix)
+
+    def load(self, url):
+        try:
+            with open(self._path(url, '.body'), 'rb') as f:
+                content = f.read()
+        except OSError:
+            return None
+        try:
+            with open(self._path(url, '.json')) as f:
+                charset = json.load(f).get('charset')
+        except (OSError, ValueError):
+            charset = None
+        return Page(content, charset)
+
+    def conditional_headers(self, url):
+        """If-None-Match / If-Modified-Since for a cached page, else {}"""
+        try:
+            with open(self._path(url, '.json')) as f:
+                validators = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not os.path.exists(self._path(url, '.body')):
+            return {}
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    def store(self, url, response_headers, content):
+        """Keep a page that has validators, with the charset of its Content-Type"""
+        etag, last_modified = response_headers.get('ETag'), response_headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        # Body first, so validators never point at a missing or partial body
+        with open(self._path(url, '.body.tmp'), 'wb') as f:
+            f.write(content)
+        os.replace(self._path(url, '.body.tmp'), self._path(url, '.body'))
+        with open(self._path(url, '.json'), 'w') as f:
+            json.dump({'url': url, 'etag': etag, 'last_modified': last_modified,
+                       'charset': getattr(content, 'charset', None)}, f)
+
+
+def recorded_page_path(directory, url):
+    """File of a recorded page: the URL without its scheme, e.g. www.brvm.org_en_indices.html"""
+    name = re.sub(r'[^A-Za-z0-9.-]+', '_', url.split('://', 1)[-1]).strip('_')
+    return os.path.join(directory, name + '.html')
+
+
+# Recordings keep the body only: a replayed page is decoded with its <meta> charset
+def record_page(url, content):
+    os.makedirs(HTTP_RECORD_DIR, exist_ok=True)
+    with open(recorded_page_path(HTTP_RECORD_DIR, url), 'wb') as f:
+        f.write(content)
+
+
+def replay_page(url, missing_ok=False):
+    """A recorded page; with missing_ok None when it wasn't recorded, as for a 404"""
+    path = recorded_page_path(HTTP_REPLAY_DIR, url)
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        if missing_ok:
+            return None
+        raise FileNotFoundError(f"No recorded page for {url} (expected {path})") from None
+
+
+def get_http_session():
+    """Process-wide session with keep-alive pooling and retries on transient errors"""
+    global _http_session
+    if _http_session is None:
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(total=HTTP_RETRIES, backoff_factor=HTTP_BACKOFF, backoff_jitter=HTTP_BACKOFF,
+                      status_forcelist=RETRY_STATUSES, allowed_methods=["GET"], raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update(HTTP_HEADERS)
+        session.verify = False
+        _http_session = session
+    return _http_session
+
+
+def fetch_page(url, cache=None, missing_ok=False):
+    """
+    Raw content of a page, revalidated against the on-disk cache when
+    possible, as a Page carrying the charset of the response's Content-Type.
+    With missing_ok a 404 gives None rather than an error.
+    """
+    if HTTP_REPLAY_DIR:
+        return replay_page(url, missing_ok)
+    content = _fetch_page(url, cache or HttpCache(), missing_ok)
+    if HTTP_RECORD_DIR and content is not None:
+        record_page(url, content)
+    return content
+
+
+def _fetch_page(url, cache, missing_ok=False):
+    session = get_http_session()
+    page = session.get(url=url, params=HTTP_PARAMS, headers=cache.conditional_headers(url), timeout=HTTP_TIMEOUT)
+    retries = getattr(page.raw, 'retries', None)
+    record_http_stat(requests=1, retries=len(retries.history) if retries else 0)
+    if page.status_code == 304:
+        content = cache.load(url)
+        if content is not None:
+            record_http_stat(not_modified=1, bytes_saved=len(content))
+            return content
+        page = session.get(url=url, params=HTTP_PARAMS, timeout=HTTP_TIMEOUT)
+        record_http_stat(requests=1)
+    if page.status_code == 404 and missing_ok:
+        return None
+    page.raise_for_status()
+    record_http_stat(bytes_downloaded=len(page.content))
+    content = Page(page.content, content_type_charset(page.headers.get('Content-Type')))
+    cache.store(url, page.headers, content)
+    return content
+
+
+class HtmlTable(NamedTuple):
+    """Cells of an HTML table, column by column"""
+    headers: List[str]  # text of the <th> cells in <thead>
+    columns: List[List[Optional[str]]]  # stripped cell text of body rows, None where a row is short
+    links: List[Optional[str]]  # first href of each body row
+
+    def rows(self):
+        return zip(*self.columns)
+
+
+_TABLE_TAG = re.compile(rb'<table\b[^>]*?\bclass\s*=\s*["\']([^"\']*)["\']', re.IGNORECASE)
+_TABLE_BOUNDARY = re.compile(rb'<(/?)table\b[^>]*>', re.IGNORECASE)
+_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+def _table_fragment(content, table_class):
+    """
+    Bytes of the first <table> whose classes are exactly those of
+    `table_class`, or None. Tables nested in it are counted so the fragment
+    ends at its own closing tag; an unclosed table runs to the end of the page.
+    """
+    wanted = set(table_class.split())
+    for match in _TABLE_TAG.finditer(content):
+        if set(match.group(1).decode('ascii', 'replace').split()) == wanted:
+            depth = 0
+            for tag in _TABLE_BOUNDARY.finditer(content, match.start()):
+                depth += -1 if tag.group(1) else 1
+                if not depth:
+                    return content[match.start():tag.end()]
+            return content[match.start():]
+    return None
+
+
+def extract_table(content, table_class):
+    """
+    Extract a table from a page without parsing the rest of it: the table is
+    located with a byte-level scan and only that fragment is handed to lxml.
+    The fragment is decoded with the charset of the HTTP response when the
+    content is a Page that has one, else with the page's <meta> charset,
+    else as UTF-8. Returns the header texts, column-major cell texts and
+    row links.
+    """
+    from lxml import html as lxml_html
+
+    fragment = _table_fragment(content, table_class)
+    if fragment is None:
+        raise ValueError(f"No table with class '{table_class.strip()}' in page")
+    meta = _CHARSET.search(content[:4096])
+    charset = (getattr(content, 'charset', None) or (known_charset(meta.group(1).decode()) if meta else None)
+               or 'utf-8')
+    parser = lxml_html.HTMLParser(encoding=charset)
+    table = lxml_html.fromstring(fragment, parser=parser)
+
+    # Rows of the table itself, not of tables nested in its cells
+    headers = [th.text_content().strip() for th in table.xpath('thead/tr/th')]
+    body_rows = table.xpath('tbody/tr') or table.xpath('tr')
+    rows, links = [], []
+    for tr in body_rows:
+        rows.append([cell.text_content().strip() for cell in tr if cell.tag in ('td', 'th')])
+        href = tr.xpath('.//a/@href')
+        links.append(href[0] if href else None)
+    width = max((len(row) for row in rows), default=0)
+    columns = [[row[i] if i < len(row) else None for row in rows] for i in range(width)]
+    return HtmlTable(headers, columns, links)
+
+
+# Cleaning schemas map each column of a scraped table to its type:
+#   {'type': 'string'}                      stripped text; 'squeeze': True collapses inner
+#                                           whitespace, 'case': 'upper' upper-cases it
+#   {'type': 'number', 'format': 'fr'}      a NUMBER_FORMATS entry; the value is multiplied
+#                                           by 'scale' and must be at least 'min' if given
+#   {'type': 'date', 'format': '%d/%m/%Y'}  strptime format, or a list of candidates: the
+#                                           first that reads every value of the column is used,
+#                                           else each value is read with the first that fits it
+# Every column is required unless 'required': False. A required value that is missing or
+# does not parse quarantines its row; an optional one that does not parse is left empty.
+_SPACES = ' \t\n\xa0\u202f'
+# Format -> str.translate table deleting grouping characters and mapping the decimal separator to '.'
+NUMBER_FORMATS = {
+    'fr': str.maketrans({**dict.fromkeys(_SPACES + '%'), ',': '.'}),  # 1 234,56 or 5,75%
+    'en': str.maketrans(dict.fromkeys(_SPACES + '%,')),  # 1,234.56 or 1 234.56
+}
+MISSING_VALUES = ['', '-', '--', 'N/A', 'n/a']
+
+
+def parse_dates(text, formats):
+    """Datetime64 values of a text array read with a strptime format or a list of candidates (NaT if none fits)"""
+    text = pd.Series(text)
+    if isinstance(formats, str):
+        formats = [formats]
+    present = text != ''
+    parsed = [pd.to_datetime(text, format=f, errors='coerce') for f in formats]
+    for values in parsed:
+        if values[present].notna().all():
+            return values.values
+    values = parsed[0]
+    for other in parsed[1:]:
+        values = values.fillna(other)
+    return values.values
+
+
+def clean_table(df, schema, asset):
+    """
+    Coerce the scraped text of a table to the types of its schema. The
+    columns are stacked so that stripping and number parsing run once per
+    table rather than once per column. Returns the valid rows with the
+    schema's columns. Rows with a required value that is missing or does
+    not parse are kept as scraped, with the offending columns in REASON, as
+    records in the result's attrs['quarantine']; save_dataframe_as_csv
+    saves them. Optional values that do not parse are left empty.
+    """
+    names, rows = list(schema), len(df)
+    stacked = pd.Series(np.concatenate([df[column].values for column in names]) if rows else [], dtype=object)
+    raw = stacked.fillna('').astype(str).str.strip()
+    missing = raw.isin(MISSING_VALUES).values.reshape(len(names), rows)
+    raw = raw.values.reshape(len(names), rows)
+
+    numbers = {}
+    for number_format in {spec.get('format', 'fr') for spec in schema.values() if spec['type'] == 'number'}:
+        positions = [i for i, spec in enumerate(schema.values())
+                     if spec['type'] == 'number' and spec.get('format', 'fr') == number_format]
+        text = pd.Series(raw[positions].ravel()).str.translate(NUMBER_FORMATS[number_format])
+        parsed = pd.to_numeric(text, errors='coerce').values.astype(float).reshape(len(positions), rows)
+        numbers.update(zip(positions, parsed))
+
+    columns, invalid = {}, {}
+    for i, (column, spec) in enumerate(schema.items()):
+        if spec['type'] == 'number':
+            values = numbers[i] * spec.get('scale', 1)
+            bad = np.isnan(values) & ~missing[i]
+        elif spec['type'] == 'date':
+            values = parse_dates(np.where(missing[i], '', raw[i]), spec['format'])
+            bad = np.isnat(values) & ~missing[i]
+        else:
+            values = pd.Series(raw[i])
+            if spec.get('squeeze'):
+                values = values.str.replace(r'\s+', ' ', regex=True)
+            if spec.get('case') == 'upper':
+                values = values.str.upper()
+            values = np.where(missing[i], None, values.values)
+            bad = np.zeros(rows, dtype=bool)
+        if 'min' in spec:
+            bad |= values < spec['min']
+        if spec.get('required', True):
+            bad |= missing[i]
+            invalid[column] = bad
+        elif bad.any():
+            values = values.copy()
+            values[bad] = np.datetime64('NaT') if spec['type'] == 'date' else np.nan
+            print(f"{int(bad.sum())} {asset} {column} values unreadable, left empty")
+        columns[column] = values
+
+    bad = np.logical_or.reduce(list(invalid.values()) or [np.zeros(rows, dtype=bool)])
+    result = pd.DataFrame({column: values[~bad] for column, values in columns.items()})
+    # Records rather than a DataFrame: pandas compares attrs when combining frames
+    quarantine = df[bad].to_dict('records')
+    for row, i in zip(quarantine, np.flatnonzero(bad)):
+        row['REASON'] = " ".join(column for column, mask in invalid.items() if mask[i])
+    result.attrs['quarantine'] = quarantine
+    if bad.any():
+        print(f"{int(bad.sum())} {asset} rows quarantined")
+    return result
+
 
 def move_csv_files(source_dir, destination_dir, pattern):
     # List all files in the source directory
@@ -132,37 +640,249 @@ def move_csv_file_gcp(source_bucket_name, destination_bucket_name, filename):
     source_blob.delete()
     print(f'Moved {filename} from {source_bucket_name} to {destination_bucket_name}')
 
+# Natural key of each table: loading a row again for the same key replaces the stored one
+TABLE_KEYS = {
+    'SHARES': ('SYMBOL', 'DATE'),
+    'BONDS': ('SYMBOL', 'DATE'),
+    'INDICES': ('NAME', 'DATE'),
+    'CAPITALIZATIONS': ('SYMBOL', 'DATE'),
+    'DIVIDENDS': ('SYMBOL', 'DATE'),
+}
+
+
+# Load order column of the staging tables: the last row of a key in a staging file wins, as in DuckDB
+LOAD_ORDER = '_ROW'
+# Legacy names the BigQuery API gives field types -> their GoogleSQL names, for CAST
+_BIGQUERY_TYPES = {'FLOAT': 'FLOAT64', 'INTEGER': 'INT64', 'BOOLEAN': 'BOOL'}
+
+
+def _bigquery_types(client, table_id):
+    return {field.name: _BIGQUERY_TYPES.get(field.field_type, field.field_type)
+            for field in client.get_table(table_id).schema}
+
+
+def _bigquery_merge(client, staging_id, table_id, table, columns):
+    """
+    Upsert the staging table into the table on its natural key (plain
+    append for tables without one). Staging values are cast to the types of
+    the table's columns where they differ, e.g. a Parquet DATE into a
+    STRING column created from CSV loads.
+    """
+    client.query(f"CREATE TABLE IF NOT EXISTS `{table_id}` AS "
+                 f"SELECT * EXCEPT ({LOAD_ORDER}) FROM `{staging_id}` WHERE FALSE").result()
+    target, staged = _bigquery_types(client, table_id), _bigquery_types(client, staging_id)
+    values = ", ".join(f"`{column}`" if staged[column] == target.get(column, staged[column])
+                       else f"CAST(`{column}` AS {target[column]}) AS `{column}`" for column in columns)
+    key = TABLE_KEYS.get(table)
+    names = ", ".join(f"`{column}`" for column in columns)
+    if not key:
+        client.query(f"INSERT INTO `{table_id}` ({names}) SELECT {values} FROM `{staging_id}`").result()
+        return
+    updates = ", ".join(f"`{column}` = S.`{column}`" for column in columns if column not in key)
+    client.query(f"""
+        MERGE `{table_id}` T
+        USING (SELECT {values} FROM `{staging_id}` WHERE TRUE
+               QUALIFY ROW_NUMBER() OVER (PARTITION BY {", ".join(key)} ORDER BY {LOAD_ORDER} DESC) = 1) S
+        ON {" AND ".join(f"T.`{column}` = S.`{column}`" for column in key)}
+        WHEN MATCHED THEN UPDATE SET {updates}
+        WHEN NOT MATCHED THEN INSERT ({names}) VALUES ({", ".join(f"S.`{column}`" for column in columns)})
+    """).result()
+
+
 # Define a function to insert data into BigQuery
 def insert_into_bigquery(df, project_id, dataset, table):
+    """Upsert a DataFrame into the table through the <table>_STAGING table"""
+    client = bigquery.Client(project=project_id)
+    staging_id = f"{project_id}.{dataset}.{table}_STAGING"
+    job_config = bigquery.LoadJobConfig(write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE)
+    client.load_table_from_dataframe(df.assign(**{LOAD_ORDER: np.arange(len(df))}), staging_id,
+                                     job_config=job_config).result()
+    _bigquery_merge(client, staging_id, f"{project_id}.{dataset}.{table}", table, list(df.columns))
+
+
+def insert_parquet_into_bigquery(staged, project_id, dataset, table):
+    """
+    Upsert a Parquet staging file, read as an Arrow table, through
+    <table>_STAGING: loaded natively as Parquet with its schema, plus the
+    load order column.
+    """
     client = bigquery.Client(project=project_id)
-    table_id = f"{project_id}.{dataset}.{table}"
-    job = client.load_table_from_dataframe(df, table_id)
-    job.result()  # Wait for the job to complete
+    staging_id = f"{project_id}.{dataset}.{table}_STAGING"
+    sink = io.BytesIO()
+    pq.write_table(staged.append_column(LOAD_ORDER, pa.array(np.arange(staged.num_rows), pa.int64())), sink)
+    sink.seek(0)
+    job_config = bigquery.LoadJobConfig(source_format=bigquery.SourceFormat.PARQUET,
+                                        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE)
+    client.load_table_from_file(sink, staging_id, job_config=job_config).result()
+    _bigquery_merge(client, staging_id, f"{project_id}.{dataset}.{table}", table, staged.column_names)
+
+
+def ensure_keyed_table(con, table, source):
+    """
+    Make sure the DuckDB table exists with its natural key as primary key:
+    create it from the columns of `source`, or rebuild a table created
+    without one (DuckDB can't add a primary key to an existing table),
+    keeping the row inserted last for each key. Returns the number of
+    duplicate rows dropped.
+    """
+    key = ", ".join(TABLE_KEYS[table])
+    exists = con.execute("SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = ?", [table]).fetchone()[0]
+    if exists and con.execute("SELECT COUNT(*) FROM duckdb_constraints() WHERE table_name = ? "
+                              "AND constraint_type = 'PRIMARY KEY'", [table]).fetchone()[0]:
+        return 0
+    columns = con.execute(f"DESCRIBE {table}" if exists else f"DESCRIBE SELECT * FROM {source}").fetchall()
+    definition = ", ".join(f'"{name}" {column_type}' for name, column_type, *_ in columns)
+    if not exists:
+        con.execute(f"CREATE TABLE {table} ({definition}, PRIMARY KEY ({key}))")
+        return 0
+
+    before = con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute(f"""
+            CREATE TEMP TABLE {table}_KEYED AS
+            SELECT * FROM {table}
+            WHERE {" AND ".join(f"{column} IS NOT NULL" for column in TABLE_KEYS[table])}
+            QUALIFY row_number() OVER (PARTITION BY {key} ORDER BY rowid DESC) = 1
+        """)
+        con.execute(f"DROP TABLE {table}")
+        con.execute(f"CREATE TABLE {table} ({definition}, PRIMARY KEY ({key}))")
+        con.execute(f"INSERT INTO {table} SELECT * FROM {table}_KEYED")
+        con.execute(f"DROP TABLE {table}_KEYED")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return before - con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def upsert_duckdb(con, table, source):
+    """Bulk upsert of `source` into the table on its natural key, the last row of a key within `source` winning"""
+    ensure_keyed_table(con, table, source)
+    key = ", ".join(TABLE_KEYS[table])
+    columns = [name for name, *_ in con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+    updates = ", ".join(f'"{column}" = EXCLUDED."{column}"' for column in columns if column not in TABLE_KEYS[table])
+    # ON CONFLICT can't update a row twice in one statement, so duplicated keys are reduced first
+    con.execute(f"""
+        INSERT INTO {table} BY NAME
+        SELECT * EXCLUDE (_ROW) FROM (SELECT *, row_number() OVER () AS _ROW FROM {source})
+        QUALIFY row_number() OVER (PARTITION BY {key} ORDER BY _ROW DESC) = 1
+        ON CONFLICT ({key}) DO {f"UPDATE SET {updates}" if updates else "NOTHING"}
+    """)
+
 
 # Define a function to insert data into DuckDB
 def insert_into_duckdb(df, db_path, table):
-
+    """
+    Load a DataFrame or an Arrow table (scanned in place) into the table,
+    matching columns by name. Tables with a natural key are upserted, so
+    loading the same data twice leaves them unchanged.
+    """
     with duckdb.connect(os.path.join(os.path.dirname(__file__), '..', db_path)) as con:
+        if table in TABLE_KEYS:
+            con.register('staged', df)
+            upsert_duckdb(con, table, 'staged')
+            return
         con.execute(f"CREATE TABLE IF NOT EXISTS {table} AS SELECT * FROM df where FALSE")  # Create table if not exists
-        con.execute(f"INSERT INTO {table} SELECT * FROM df")
+        con.execute(f"INSERT INTO {table} BY NAME SELECT * FROM df")
+
+# OHLCV aggregates precomputed for the long-range dashboard views
+AGGREGATE_PERIODS = {'SHARES_WEEKLY': 'week', 'SHARES_MONTHLY': 'month'}
+
+
+def refresh_aggregates_duckdb(db_path, source='SHARES'):
+    """Rebuild the weekly/monthly OHLCV tables from the daily bars in DuckDB"""
+    with duckdb.connect(os.path.join(os.path.dirname(__file__), '..', db_path)) as con:
+        for table, period in AGGREGATE_PERIODS.items():
+            con.execute(f"""
+                CREATE OR REPLACE TABLE {table} AS
+                SELECT SYMBOL,
+                       CAST(date_trunc('{period}', CAST(DATE AS DATE)) AS DATE) AS DATE,
+                       arg_max(NAME, CAST(DATE AS DATE)) AS NAME,
+                       arg_min(OPEN, CAST(DATE AS DATE)) AS OPEN,
+                       MAX(HIGH) AS HIGH,
+                       MIN(LOW) AS LOW,
+                       SUM(VOLUME) AS VOLUME,
+                       arg_max(CLOSE, CAST(DATE AS DATE)) AS CLOSE
+                FROM {source}
+                GROUP BY ALL
+            """)
+
+
+def refresh_aggregates_bigquery(project_id, dataset, source='SHARES'):
+    """Rebuild the weekly/monthly OHLCV tables from the daily bars in BigQuery"""
+    client = bigquery.Client(project=project_id)
+    periods = {'week': 'WEEK(MONDAY)', 'month': 'MONTH'}
+    for table, period in AGGREGATE_PERIODS.items():
+        query = f"""
+            CREATE OR REPLACE TABLE `{project_id}.{dataset}.{table}` AS
+            SELECT SYMBOL,
+                   DATE_TRUNC(DATE(DATE), {periods[period]}) AS DATE,
+                   ARRAY_AGG(NAME ORDER BY DATE DESC LIMIT 1)[OFFSET(0)] AS NAME,
+                   ARRAY_AGG(OPEN ORDER BY DATE LIMIT 1)[OFFSET(0)] AS OPEN,
+                   MAX(HIGH) AS HIGH,
+                   MIN(LOW) AS LOW,
+                   SUM(VOLUME) AS VOLUME,
+                   ARRAY_AGG(CLOSE ORDER BY DATE DESC LIMIT 1)[OFFSET(0)] AS CLOSE
+            FROM `{project_id}.{dataset}.{source}`
+            GROUP BY 1, 2
+        """
+        client.query(query).result()
+
+
+def refresh_aggregates(conf):
+    if os.getenv('K_SERVICE') and os.getenv('FUNCTION_TARGET'):
+        credentials, project_id = default()
+        refresh_aggregates_bigquery(project_id, 'stocks')
+    else:
+        refresh_aggregates_duckdb(conf['duckdb']['database'])
 
 def process_files(conf, files, asset):
+    """
+    Load the staging files (CSV or Parquet) of an asset, oldest first, and
+    archive them. A file with the same content as the last one ingested and
+    dated on a day that is not a session is archived without being loaded.
+    Returns the number of files loaded and skipped.
+    """
+    last = load_fingerprints(conf).get(asset, {}).get('fingerprint')
+    loaded, skipped = 0, 0
     if os.getenv('K_SERVICE') and os.getenv('FUNCTION_TARGET'):  # GCP cloud function environment
         for f in files:
-            content = f.download_as_text()
-            df = pd.read_csv(io.StringIO(content), sep='|')
+            staged = read_staged(f.name, f.download_as_bytes())
+            df = staged.to_pandas() if isinstance(staged, pa.Table) else staged
             credentials, project_id = default()
             project_number = get_project_number(project_id)
             bucket_url1 = f"data-{project_number}"
             bucket_url2 = f"archive-{project_number}"
-            insert_into_bigquery(df, project_id, 'stocks', asset)
+            fingerprint = table_fingerprint(df)
+            if fingerprint == last and not is_session(staged_day(df)):
+                print(f"Skipped {f.name}: unchanged since the last ingestion")
+                skipped += 1
+            else:
+                if isinstance(staged, pa.Table):
+                    insert_parquet_into_bigquery(staged, project_id, 'stocks', asset)
+                else:
+                    insert_into_bigquery(df, project_id, 'stocks', asset)
+                record_ingested_fingerprint(conf, asset, fingerprint, str(df['DATE'].max()))
+                last = fingerprint
+                loaded += 1
             move_csv_file_gcp(bucket_url1, bucket_url2, f.name)
 
     else:
         for f in files:
-            df = pd.read_csv(f, sep='|')
-            insert_into_duckdb(df, conf['duckdb']['database'], asset)
+            staged = read_staged(f)
+            df = staged.to_pandas() if isinstance(staged, pa.Table) else staged
+            fingerprint = table_fingerprint(df)
+            if fingerprint == last and not is_session(staged_day(df)):
+                print(f"Skipped {f}: unchanged since the last ingestion")
+                skipped += 1
+            else:
+                insert_into_duckdb(staged, conf['duckdb']['database'], asset)
+                record_ingested_fingerprint(conf, asset, fingerprint, str(df['DATE'].max()))
+                last = fingerprint
+                loaded += 1
             move_csv_file(conf["csv_directory"], conf["archive"], f)
+    return loaded, skipped
 
 # Define a function to load CSV files based on today's date
 def load_files(config, asset):
@@ -175,4 +895,7 @@ def load_files(config, asset):
         return bucket.list_blobs(prefix=asset)
 
     else:
-        return glob.glob(os.path.join(os.path.join(os.path.dirname(__file__), '', config['csv_directory']), f"{asset}*.csv"))
+        # Oldest first: file names end with the scrape date
+        directory = os.path.join(os.path.dirname(__file__), '', config['csv_directory'])
+        return sorted(f for staging_format in STAGING_FORMATS
+                      for f in glob.glob(os.path.join(directory, f"{asset}*.{staging_format}")))
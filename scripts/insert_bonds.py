@@ -21,9 +21,9 @@ def entry_point(request=None):
 
     asset = "BONDS"
     csv_files = load_files(config, asset)
-    process_files(config, csv_files, asset)
+    loaded, skipped = process_files(config, csv_files, asset)
 
-    return "Data insertion successfully completed !\n"
+    return f"Data insertion successfully completed ! {loaded} files loaded, {skipped} unchanged files skipped.\n"
 
 if os.getenv('K_SERVICE') and os.getenv('FUNCTION_TARGET'):
     pass
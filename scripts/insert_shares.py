@@ -1,7 +1,7 @@
 import os
 import yaml
 import functions_framework
-from helper import process_files, load_files
+from helper import process_files, load_files, refresh_aggregates
 
 
 @functions_framework.http
@@ -12,9 +12,11 @@ def entry_point(request=None):
 
     asset = "SHARES"
     csv_files = load_files(config, asset)
-    process_files(config, csv_files, asset)
+    loaded, skipped = process_files(config, csv_files, asset)
+    if loaded:
+        refresh_aggregates(config)
 
-    return "Data insertion successfully completed !\n"
+    return f"Data insertion successfully completed ! {loaded} files loaded, {skipped} unchanged files skipped.\n"
 
 if os.getenv('K_SERVICE') and os.getenv('FUNCTION_TARGET'):
     pass
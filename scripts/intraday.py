@@ -0,0 +1,195 @@
+"""
+Intraday share prices
+Polls the shares page every `interval` seconds during the BRVM session and
+keeps, for each poll, only the quotes that changed since the previous one.
+Changes are buffered and bulk-inserted into the SHARES_INTRADAY table of the
+local DuckDB database every `batch_rows` rows or `batch_seconds` seconds,
+so memory holds at most one snapshot and one batch however long the session.
+At the close the last quote of each share is upserted into SHARES as the
+daily bar, like insert_into_duckdb does, and the weekly/monthly aggregates
+are refreshed. A run stopped before the close keeps its quotes in
+SHARES_INTRADAY without loading a bar; starting the script again after the
+close loads the bar from them.
+
+Market hours are in GMT, Abidjan time. On weekends and confirmed holidays
+the script exits without polling.
+
+Usage:
+    python intraday.py [--interval 300] [--batch-rows 1000] [--batch-seconds 600]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import duckdb
+import pandas as pd
+import yaml
+
+from backfill import SHARES_COLUMNS
+from helper import HttpCache, fetch_page, http_stats_summary, refresh_aggregates_duckdb, reset_http_stats, upsert_duckdb
+from scrape_shares import parse_brvm_shares
+from trading_calendar import is_session
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+QUOTE_COLUMNS = ['OPEN', 'HIGH', 'LOW', 'VOLUME', 'CLOSE']
+INTRADAY_COLUMNS = ['SYMBOL', 'NAME', *QUOTE_COLUMNS, 'TIMESTAMP', 'DATE']
+
+
+def changed_quotes(previous, snapshot):
+    """Rows of the snapshot whose quote differs from the previous snapshot (all of them for the first one)"""
+    if previous is None:
+        return snapshot
+    before = previous.set_index('SYMBOL')[QUOTE_COLUMNS].reindex(snapshot['SYMBOL'])
+    # Shares missing from the previous snapshot compare as NaN, so they count as changed
+    changed = (before.values != snapshot[QUOTE_COLUMNS].values).any(axis=1)
+    return snapshot[changed]
+
+
+class IntradayBatch:
+    """Changed quotes waiting to be inserted into SHARES_INTRADAY"""
+
+    def __init__(self, con, batch_rows=1000, batch_seconds=600):
+        self.con = con
+        self.batch_rows = batch_rows
+        self.batch_seconds = batch_seconds
+        self.frames, self.rows, self.started = [], 0, None
+        self.inserted = 0
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS SHARES_INTRADAY (
+                SYMBOL VARCHAR, NAME VARCHAR, OPEN DOUBLE, HIGH DOUBLE, LOW DOUBLE, VOLUME DOUBLE, CLOSE DOUBLE,
+                TIMESTAMP TIMESTAMP, DATE VARCHAR)
+        """)
+
+    def add(self, changes, now):
+        if changes is not None and len(changes):
+            self.frames.append(changes[INTRADAY_COLUMNS])
+            self.rows += len(changes)
+            self.started = self.started or now
+        if self.rows >= self.batch_rows or (self.started and (now - self.started).total_seconds() >= self.batch_seconds):
+            self.flush()
+
+    def flush(self):
+        """One bulk insert of the buffered rows, scanned from a registered DataFrame"""
+        if not self.frames:
+            return
+        batch = pd.concat(self.frames, ignore_index=True)
+        self.con.register('batch', batch)
+        try:
+            self.con.execute("INSERT INTO SHARES_INTRADAY SELECT * FROM batch")
+        finally:
+            self.con.unregister('batch')
+        self.inserted += len(batch)
+        self.frames, self.rows, self.started = [], 0, None
+
+
+def daily_bar(con, day):
+    """Last intraday quote of each share on the day, as SHARES rows"""
+    return con.execute(f"""
+        SELECT {', '.join(SHARES_COLUMNS)} FROM SHARES_INTRADAY
+        WHERE DATE = ?
+        QUALIFY row_number() OVER (PARTITION BY SYMBOL ORDER BY TIMESTAMP DESC) = 1
+        ORDER BY SYMBOL
+    """, [day]).df()
+
+
+def market_time(day, hhmm):
+    return datetime.combine(day, datetime.strptime(hhmm, '%H:%M').time())
+
+
+def now_gmt():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def poll_session(config, interval=None, batch_rows=None, batch_seconds=None):
+    """Poll until the close, then load the daily bar if the session is over; returns counts for reporting"""
+    intraday = config['intraday']
+    interval = int(intraday.get('interval', 300)) if interval is None else interval
+    stats = {'polls': 0, 'unchanged_pages': 0, 'changes': 0, 'inserted': 0, 'failed': 0, 'bars': 0}
+    today = now_gmt().date()
+    if not is_session(today, confirmed_only=True):
+        print(f"{today} is not a BRVM session")
+        return stats
+    opening = market_time(today, intraday.get('open', '09:00'))
+    closing = market_time(today, intraday.get('close', '15:30'))
+
+    url = config['url']['shares']
+    cache = HttpCache()
+    db_path = os.path.join(HERE, '..', config['duckdb']['database'])
+    with duckdb.connect(db_path) as con:
+        batch = IntradayBatch(con, batch_rows or int(intraday.get('batch_rows', 1000)),
+                              batch_seconds or int(intraday.get('batch_seconds', 600)))
+        previous, previous_digest = None, None
+        try:
+            if now_gmt() < opening:
+                time.sleep((opening - now_gmt()).total_seconds())
+            while True:
+                started = now_gmt()
+                if started > closing:
+                    break
+                stats['polls'] += 1
+                try:
+                    content = fetch_page(url, cache)
+                    digest = hashlib.sha256(content).digest()
+                    if digest == previous_digest:
+                        stats['unchanged_pages'] += 1
+                        batch.add(None, started)
+                    else:
+                        snapshot = parse_brvm_shares(content)
+                        snapshot['TIMESTAMP'] = started
+                        snapshot['DATE'] = today.isoformat()
+                        changes = changed_quotes(previous, snapshot)
+                        stats['changes'] += len(changes)
+                        batch.add(changes, started)
+                        previous, previous_digest = snapshot, digest
+                except Exception as e:
+                    stats['failed'] += 1
+                    print(f"{started:%H:%M:%S} poll failed: {type(e).__name__}: {e}")
+                time.sleep(max(0.0, interval - (now_gmt() - started).total_seconds()))
+        except KeyboardInterrupt:
+            print("Interrupted, saving the quotes polled so far")
+        finally:
+            batch.flush()
+            stats['inserted'] = batch.inserted
+
+        # Quotes polled before the close would make a partial bar, kept out of SHARES
+        if now_gmt() < closing:
+            print("Stopped before the close: no daily bar loaded into SHARES")
+        else:
+            bar = daily_bar(con, today.isoformat())
+            if len(bar):
+                con.register('bar', bar)
+                try:
+                    upsert_duckdb(con, 'SHARES', 'bar')
+                finally:
+                    con.unregister('bar')
+                stats['bars'] = len(bar)
+    if stats['bars']:
+        refresh_aggregates_duckdb(config['duckdb']['database'])
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interval", type=int, help="seconds between polls (default: config.yml)")
+    parser.add_argument("--batch-rows", type=int, help="changed quotes per insert (default: config.yml)")
+    parser.add_argument("--batch-seconds", type=int, help="longest a change waits for its insert (default: config.yml)")
+    args = parser.parse_args()
+
+    with open(os.path.join(HERE, 'config.yml'), 'r') as file:
+        config = yaml.safe_load(file)
+
+    reset_http_stats()
+    stats = poll_session(config, args.interval, args.batch_rows, args.batch_seconds)
+    print(f"{stats['polls']} polls ({stats['unchanged_pages']} unchanged pages, {stats['failed']} failed): "
+          f"{stats['changes']} changed quotes, {stats['inserted']} rows in SHARES_INTRADAY, "
+          f"{stats['bars']} daily bars loaded into SHARES")
+    print(http_stats_summary())
+    return 1 if stats['failed'] and not stats['inserted'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
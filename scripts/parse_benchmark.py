@@ -0,0 +1,125 @@
+"""
+Table extraction benchmark
+Parses the pages in fixtures/ (see scrape_benchmark.py) with the previous BeautifulSoup
+extraction and with helper.extract_table, checks that both yield the same
+headers, cells and links, and reports the time per page and the peak memory
+allocated by each (tracemalloc, so Python allocations only: libxml2's own
+buffers are not counted). It also reports whether the class strings the
+BeautifulSoup scrapers searched for still find a table on each page.
+The last run is kept in fixtures/parse_benchmark.txt.
+
+Usage:
+    python parse_benchmark.py [--iterations 50]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from helper import extract_table
+from scrape_benchmark import FIXTURES, NO_RECORDINGS, recorded_pages
+
+# Start of the recorded page names of each source -> class of the table the scraper reads
+TABLE_CLASSES = {
+    'www.sikafinance.com_marches_aaz': "tablesorter tbl100_6 tbl1",
+    'www.brvm.org_en_cours-obligations': "table table-hover table-striped sticky-enabled",
+    'www.brvm.org_en_indices': "table table-hover table-striped sticky-enabled",
+    'www.brvm.org_en_capitalisations': "table table-hover table-striped sticky-enabled",
+    'www.richbourse.com_common_dividende_index': "table table-striped table-bordered",
+}
+
+# Class strings the BeautifulSoup scrapers searched for, where they differ from the above. BeautifulSoup
+# compares a string with spaces to the page's classes joined by single spaces, so the trailing space of
+# the indices one keeps it from matching any page.
+ORIGINAL_CLASSES = {
+    'www.brvm.org_en_indices': "table table-hover table-striped sticky-enabled ",
+}
+
+
+def source_of(page):
+    return next((prefix for prefix in TABLE_CLASSES if page.startswith(prefix)), None)
+
+
+def class_of(page):
+    return TABLE_CLASSES.get(source_of(page))
+
+
+def original_selector_matches(content, page):
+    """Whether the class string the BeautifulSoup scraper of the page used finds a table in it"""
+    table_class = ORIGINAL_CLASSES.get(source_of(page), class_of(page))
+    return BeautifulSoup(content, 'html.parser').find('table', {"class": table_class}) is not None
+
+
+def bs4_table(content, table_class):
+    """Headers, rows and links the way the scrapers used to extract them"""
+    soup = BeautifulSoup(content, 'html.parser')
+    table = soup.find('table', {"class": table_class})
+    headers = [th.get_text().strip() for th in table.find('thead').find_all('th')]
+    rows, links = [], []
+    for tr in table.find('tbody').find_all('tr'):
+        rows.append([cell.text.strip() for cell in tr.find_all(['td', 'th'])])
+        link = tr.find('a', href=True)
+        links.append(link['href'] if link else None)
+    return headers, rows, links
+
+
+def lxml_table(content, table_class):
+    table = extract_table(content, table_class)
+    return table.headers, [[cell for cell in row if cell is not None] for row in table.rows()], table.links
+
+
+PARSERS = {'bs4': bs4_table, 'lxml': lxml_table}
+
+
+def read(page):
+    with open(os.path.join(FIXTURES, page), 'rb') as f:
+        return f.read()
+
+
+def peak_memory(parse, content, table_class):
+    """Peak memory in KB allocated while parsing one page"""
+    tracemalloc.start()
+    parse(content, table_class)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    pages = [page for page in recorded_pages() if class_of(page)]
+    if not pages:
+        print(NO_RECORDINGS)
+        return 1
+
+    failed = False
+    print(f"{'page':<56}{'KB':>6}{'bs4 ms':>9}{'lxml ms':>9}{'speedup':>9}{'bs4 MB':>8}{'lxml MB':>9}")
+    for page in pages:
+        content, table_class = read(page), class_of(page)
+        if bs4_table(content, table_class) != lxml_table(content, table_class):
+            print(f"{page}: extraction differs from the BeautifulSoup reference")
+            failed = True
+        if not original_selector_matches(content, page):
+            print(f"{page}: the original BeautifulSoup selector finds no table")
+
+        timings = {}
+        for name, parse in PARSERS.items():
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                parse(content, table_class)
+            timings[name] = (time.perf_counter() - start) / args.iterations * 1000
+        memory = {name: peak_memory(parse, content, table_class) / 1024 for name, parse in PARSERS.items()}
+        print(f"{page:<56}{len(content) / 1024:>6.0f}{timings['bs4']:>9.2f}{timings['lxml']:>9.2f}"
+              f"{timings['bs4'] / timings['lxml']:>8.1f}x{memory['bs4']:>8.1f}{memory['lxml']:>9.1f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
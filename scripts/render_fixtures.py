@@ -0,0 +1,218 @@
+"""
+Render the scraper benchmark's pages and expected tables
+Writes fixtures/ as replayed by scrape_benchmark.py: one page per source,
+named as helper.record_page names recordings, in the markup the scrapers
+read (table classes, column order, row links), and fixtures/expected/
+with the tables those pages must parse to. The expected tables are built
+from the source rows, not from the scrapers' output.
+
+The values are the warehouse's own rows from the DuckDB database: the
+last SHARES session, the last INDICES day and the DIVIDENDS table. The
+warehouse has no BONDS or CAPITALIZATIONS rows, so those two pages carry
+generated values (fixed seed), on the closes of the SHARES session.
+
+The pages are rendered, not recorded: once a machine that can reach the
+sites records them (HTTP_RECORD_DIR=fixtures python scrape_all.py on a
+session day), check the tables they give and replace these with
+    python scrape_benchmark.py --update
+
+Usage:
+    python render_fixtures.py
+"""
+
+import os
+import random
+from html import escape
+
+import duckdb
+import pandas as pd
+import yaml
+
+import helper
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, 'fixtures')
+EXPECTED = os.path.join(FIXTURES, 'expected')
+# Rows per page of the dividends table
+DIVIDENDS_PER_PAGE = 20
+SEED = 20250320
+# Last letter of a BRVM symbol (the listing country) -> suffix of sikafinance's quote links
+COUNTRY_SUFFIXES = {'B': 'bj', 'F': 'bf', 'C': 'ci', 'M': 'ml', 'N': 'ne', 'S': 'sn', 'T': 'tg'}
+
+BONDS = [
+    # symbol, issuer, rate (%), first year, last year
+    ('EOS.BIDC.05', 'BIDC-EBID', '6,10', 2017, 2027),
+    ('EOM.ETAT.ML.07', 'ETAT DU MALI', '6,20', 2018, 2026),
+    ('EOS.ETAT.SN.09', 'ETAT DU SENEGAL', '6,50', 2019, 2028),
+    ('EOS.ETAT.CI.21', 'ETAT DE COTE D\'IVOIRE', '5,90', 2020, 2030),
+    ('EOS.ETAT.BF.08', 'ETAT DU BURKINA FASO', '6,50', 2021, 2028),
+    ('EOS.ORAGROUP.01', 'ORAGROUP SA', '7,15', 2021, 2028),
+    ('EOS.SONATEL.04', 'SONATEL', '6,25', 2022, 2029),
+    ('EOS.TPNE.11', 'ETAT DU NIGER', '6,25', 2022, 2029),
+    ('EOS.ETAT.TG.06', 'ETAT DU TOGO', '6,00', 2023, 2030),
+    ('EOS.ETAT.BJ.03', 'ETAT DU BENIN', '5,75', 2023, 2033),
+]
+
+
+def fr_number(value, thousands=' '):
+    """A number as the French sites write it: 14 750 or 266,44625"""
+    integer, _, decimals = repr(float(value)).partition('.')
+    digits = f"{int(integer):,}".replace(',', thousands)
+    return digits if decimals in ('', '0') else f"{digits},{decimals}"
+
+
+def cell_text(value):
+    """A cleaned value as scrape_benchmark.normalize writes it"""
+    return str(value)
+
+
+def page(title, lang, body):
+    return (f'<!DOCTYPE html>\n<html lang="{lang}">\n<head>\n<meta charset="utf-8">\n<title>{escape(title)}</title>\n'
+            f'<meta name="viewport" content="width=device-width, initial-scale=1">\n'
+            f'<link rel="stylesheet" href="/css/site.css">\n</head>\n<body>\n'
+            f'<!-- Rendered by render_fixtures.py, not recorded from the site -->\n{body}\n</body>\n</html>\n')
+
+
+def menu(links):
+    return '<nav><ul class="menu">\n' + '\n'.join(
+        f'<li><a href="{escape(href)}">{escape(text)}</a></li>' for href, text in links) + '\n</ul></nav>\n'
+
+
+def table(table_class, headers, rows, header_class=None):
+    head = ''.join(f'<th{f" class={chr(34)}{header_class}{chr(34)}" if header_class else ""}>{escape(h)}</th>'
+                   for h in headers)
+    body = '\n'.join('<tr>' + ''.join(f'<td>{cell}</td>' for cell in row) + '</tr>' for row in rows)
+    return f'<table class="{table_class}">\n<thead><tr>{head}</tr></thead>\n<tbody>\n{body}\n</tbody>\n</table>\n'
+
+
+def render_shares(shares):
+    rows = []
+    for share in shares.itertuples():
+        volume_fcfa = share.VOLUME * share.CLOSE
+        variation = (share.CLOSE / share.OPEN - 1) * 100 if share.OPEN else 0
+        rows.append([f'<a href="/marches/cotation_{share.SYMBOL}.{COUNTRY_SUFFIXES.get(share.SYMBOL[-1], "ci")}">{escape(share.NAME)}</a>',
+                     fr_number(share.OPEN, '\xa0'), fr_number(share.HIGH, '\xa0'), fr_number(share.LOW, '\xa0'),
+                     fr_number(share.VOLUME, '\xa0'), fr_number(volume_fcfa, '\xa0'),
+                     fr_number(share.CLOSE, '\xa0'), f'{variation:+.2f}%'.replace('.', ',')])
+    summary = table('tbl100_3', ['Indice', 'Valeur'], [['BRVM Composite', '-'], ['BRVM 30', '-']])
+    body = (menu([('/', 'Accueil'), ('/marches/aaz', 'Cotations'), ('/actualites', 'Actualités')]) + summary +
+            '<div id="dvtbl">\n' +
+            table('tablesorter tbl100_6 tbl1', ['Nom', 'Ouverture', '+Haut', '+Bas', 'Volume (titres)',
+                                                'Volume FCFA', 'Dernier', 'Variation'], rows, 'header') +
+            '</div>\n')
+    expected = pd.DataFrame({'SYMBOL': shares['SYMBOL'], 'NAME': shares['NAME'],
+                             **{c: shares[c].map(cell_text) for c in ['OPEN', 'HIGH', 'LOW', 'VOLUME', 'CLOSE']}})
+    return page('Cotations BRVM de A à Z | Sikafinance', 'fr', body), expected
+
+
+def brvm_page(title, table_html):
+    return page(f'{title} | BRVM', 'en', menu([('/en', 'Home'), ('/en/cours-actions/0', 'Stocks'),
+                                               ('/en/cours-obligations/0', 'Bonds'), ('/en/indices', 'Indices'),
+                                               ('/en/capitalisations/0', 'Capitalizations')])
+                + f'<div class="view-content">\n{table_html}</div>\n')
+
+
+def render_bonds(rng):
+    rows, expected = [], []
+    for symbol, issuer, rate, first, last in BONDS:
+        issue = pd.Timestamp(first, rng.randint(1, 12), rng.randint(1, 28))
+        price = rng.choice([9950, 9990, 10000, 10000, 10050, 10100])
+        previous = price + rng.choice([-10, 0, 0, 10])
+        volume = rng.randint(0, 500)
+        rows.append([symbol, f'{escape(issuer)} {rate}% {first}-{last}', issue.strftime('%m/%d/%Y'),
+                     fr_number(volume), fr_number(price), fr_number(previous),
+                     f'{(price / previous - 1) * 100:.2f} %'])
+        expected.append({'SYMBOL': symbol, 'NAME': issuer, 'PRICE': cell_text(float(price)),
+                         'INTEREST_RATE': cell_text(float(rate.replace(',', '.')) * 0.01),
+                         'ISSUE_DATE': issue.strftime('%Y-%m-%d'), 'MATURITY_DATE': f'{last}-12-31'})
+    headers = ['Symbol', 'Name', 'Issue date', 'Volume', 'Price', 'Previous price', 'Change (%)']
+    content = brvm_page('Bonds', table('table table-hover table-striped sticky-enabled', headers, rows))
+    return content, pd.DataFrame(expected)
+
+
+def render_indices(indices):
+    rows = [[escape(name.title().replace('Brvm', 'BRVM')), previous, closing, '0,00 %']
+            for name, previous, closing in indices[['NAME', 'PREVIOUS_CLOSING', 'CLOSING']].itertuples(index=False)]
+    content = brvm_page('Indices', table('table table-hover table-striped sticky-enabled',
+                                         ['Name', 'Previous closing', 'Closing'], rows))
+    return content, indices[['NAME', 'PREVIOUS_CLOSING', 'CLOSING']]
+
+
+def render_capitalizations(shares, rng):
+    caps = pd.DataFrame({'SYMBOL': shares['SYMBOL'], 'NAME': shares['NAME'],
+                         'NUMBER_OF_SHARES': [float(rng.randint(1, 2000) * 100000) for _ in range(len(shares))],
+                         'DAILY_PRICE': shares['CLOSE']})
+    caps['GLOBAL_CAPITALIZATION'] = caps['NUMBER_OF_SHARES'] * caps['DAILY_PRICE']
+    caps['FLOATING_CAPITALIZATION'] = [float(round(c * rng.choice([0.15, 0.2, 0.25, 0.3, 0.49])))
+                                       for c in caps['GLOBAL_CAPITALIZATION']]
+    caps['GLOBAL_CAPITALIZATION_(%)'] = (caps['GLOBAL_CAPITALIZATION'] / caps['GLOBAL_CAPITALIZATION'].sum()
+                                         * 100).round(2)
+    caps = caps[['SYMBOL', 'NAME', 'NUMBER_OF_SHARES', 'DAILY_PRICE', 'FLOATING_CAPITALIZATION',
+                 'GLOBAL_CAPITALIZATION', 'GLOBAL_CAPITALIZATION_(%)']]
+    rows = [[cap.SYMBOL, escape(cap.NAME.title())] + [fr_number(v) for v in cap[3:]]
+            for cap in caps.itertuples()]
+    headers = ['Symbol', 'Name', 'Number of shares', 'Daily price', 'Floating Capitalization',
+               'Global capitalization', 'Global capitalization (%)']
+    content = brvm_page('Capitalizations', table('table table-hover table-striped sticky-enabled', headers, rows))
+    expected = caps.astype({c: object for c in caps.columns[2:]})
+    for column in caps.columns[2:]:
+        expected[column] = caps[column].map(cell_text)
+    return content, expected
+
+
+def render_dividends(dividends):
+    """
+    Pages of the dividends table. The warehouse keeps the payment dates the
+    original scraper read month first from the site's day-first dates, so
+    the page shows them back as the site wrote them; the others were lost
+    and are left blank.
+    """
+    stored = pd.to_datetime(dividends['PAYMENT_DATE'])
+    written = stored.dt.strftime('%m/%d/%Y').fillna('')
+    paid = pd.to_datetime(written, format='%d/%m/%Y', errors='coerce')
+    pages = []
+    for start in range(0, len(dividends), DIVIDENDS_PER_PAGE):
+        rows = [[f'<a href="/common/apprendre/details-societe/{symbol}">{symbol}</a>', fr_number(dividend), date]
+                for symbol, dividend, date in zip(dividends['SYMBOL'][start:start + DIVIDENDS_PER_PAGE],
+                                                  dividends['DIVIDEND'][start:start + DIVIDENDS_PER_PAGE],
+                                                  written[start:start + DIVIDENDS_PER_PAGE])]
+        pages.append(page('Dividendes | Richbourse', 'fr',
+                          menu([('/', 'Accueil'), ('/common/dividende/index', 'Dividendes')]) +
+                          table('table table-striped table-bordered', ['Société', 'Dividende', 'Date paiement'],
+                                rows)))
+    expected = pd.DataFrame({'SYMBOL': dividends['SYMBOL'], 'DIVIDEND': dividends['DIVIDEND'].map(cell_text),
+                             'PAYMENT_DATE': paid.dt.strftime('%Y-%m-%d').fillna('NaT')})
+    return pages, expected
+
+
+def write(name, content):
+    with open(os.path.join(FIXTURES, name), 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def main():
+    with open(os.path.join(HERE, 'config.yml'), 'r') as file:
+        config = yaml.safe_load(file)
+    con = duckdb.connect(os.path.join(HERE, '..', config['duckdb']['database']), read_only=True)
+    shares = con.execute("SELECT * FROM SHARES WHERE DATE = (SELECT max(DATE) FROM SHARES) ORDER BY NAME").df()
+    indices = con.execute("SELECT * FROM INDICES WHERE DATE = (SELECT max(DATE) FROM INDICES) ORDER BY NAME").df()
+    dividends = con.execute("SELECT * FROM DIVIDENDS ORDER BY SYMBOL").df()
+    con.close()
+    rng = random.Random(SEED)
+
+    os.makedirs(EXPECTED, exist_ok=True)
+    urls = config['url']
+    outputs = {'shares': render_shares(shares), 'bonds': render_bonds(rng), 'indices': render_indices(indices),
+               'capitalizations': render_capitalizations(shares, rng)}
+    for name, (content, expected) in outputs.items():
+        write(os.path.basename(helper.recorded_page_path('', urls[name])), content)
+        expected.to_csv(os.path.join(EXPECTED, f'{name}.csv'), index=False, sep="|")
+    pages, expected = render_dividends(dividends)
+    for i, content in enumerate(pages, start=1):
+        write(os.path.basename(helper.recorded_page_path('', f"{urls['dividends']}?page={i}")), content)
+    expected.to_csv(os.path.join(EXPECTED, 'dividends.csv'), index=False, sep="|")
+    print(f"Rendered {len(outputs) + len(pages)} pages in {FIXTURES}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Scraping orchestrator
+Fetches the pages of every configured source concurrently with aiohttp,
+parses them with the scrapers' parse functions in a thread pool and saves each
+table like the individual scrape_* functions do, in a single invocation.
+Returns a per-source timing report.
+
+Usage:
+    python scrape_all.py [shares bonds ...]
+    GET <function url>?sources=shares,dividends
+"""
+
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from datetime import date
+
+import aiohttp
+import functions_framework
+import yaml
+
+import helper
+from helper import (HTTP_HEADERS, HTTP_PARAMS, HTTP_POOL_SIZE, HTTP_RETRIES, HTTP_TIMEOUT, RETRY_STATUSES,
+                    HttpCache, Page, content_type_charset, http_stats_summary, record_http_stat, record_page,
+                    replay_page, reset_http_stats, retry_delay, save_dataframe_as_csv, unchanged_since)
+from scrape_bonds import parse_brvm_bonds
+from scrape_capitalizations import parse_brvm_capitalizations
+from scrape_dividends import dividend_page_urls, parse_dividends
+from scrape_indices import parse_brvm_indices
+from scrape_shares import parse_brvm_shares
+from trading_calendar import is_session
+
+
+def single_page(url, pages):
+    return [] if pages else [url]
+
+
+# Source (key of config['url']) -> (output table, URLs of the next pages to fetch given the configured URL and
+# the pages fetched so far, parser of the page contents). Pages after the first may be missing (None for a 404).
+SOURCES = {
+    'shares': ('SHARES', single_page, lambda pages: parse_brvm_shares(pages[0])),
+    'bonds': ('BONDS', single_page, lambda pages: parse_brvm_bonds(pages[0])),
+    'indices': ('INDICES', single_page, lambda pages: parse_brvm_indices(pages[0])),
+    'capitalizations': ('CAPITALIZATIONS', single_page, lambda pages: parse_brvm_capitalizations(pages[0])),
+    'dividends': ('DIVIDENDS', dividend_page_urls, parse_dividends),
+}
+# Sources published per session, skipped on weekends and confirmed holidays (on an estimated holiday an
+# unchanged table is skipped by unchanged_since instead)
+DAILY_SOURCES = ('shares', 'indices')
+
+
+class RetryableStatus(Exception):
+    pass
+
+
+async def fetch(session, url, cache, missing_ok=False):
+    """Async counterpart of helper.fetch_page, recording or replaying pages like it does"""
+    if helper.HTTP_REPLAY_DIR:
+        return replay_page(url, missing_ok)
+    content = await _fetch(session, url, cache, missing_ok)
+    if helper.HTTP_RECORD_DIR and content is not None:
+        record_page(url, content)
+    return content
+
+
+async def _fetch(session, url, cache, missing_ok=False, conditional=True):
+    """Conditional GET with jittered retries"""
+    for attempt in range(HTTP_RETRIES + 1):
+        try:
+            record_http_stat(requests=1)
+            headers = cache.conditional_headers(url) if conditional else {}
+            async with session.get(url, params=HTTP_PARAMS, headers=headers, ssl=False) as response:
+                if response.status == 304:
+                    content = cache.load(url)
+                    if content is not None:
+                        record_http_stat(not_modified=1, bytes_saved=len(content))
+                        return content
+                    if not conditional:
+                        raise aiohttp.ClientResponseError(response.request_info, response.history, status=304,
+                                                          message="Not Modified to an unconditional request")
+                    break
+                if response.status == 404 and missing_ok:
+                    return None
+                if response.status in RETRY_STATUSES:
+                    raise RetryableStatus(f"HTTP {response.status} for {url}")
+                response.raise_for_status()
+                content = Page(await response.read(), content_type_charset(response.headers.get('Content-Type')))
+                record_http_stat(bytes_downloaded=len(content))
+                cache.store(url, response.headers, content)
+                return content
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError, RetryableStatus):
+            if attempt == HTTP_RETRIES:
+                raise
+            record_http_stat(retries=1)
+            await asyncio.sleep(retry_delay(attempt))
+    # Only reached on a 304 whose cached body went away after the validators were read: fetch the page in
+    # full like helper.fetch_page does, rather than caching the empty body of the 304
+    return await _fetch(session, url, cache, missing_ok, conditional=False)
+
+
+async def run_source(session, pool, cache, name, url, config):
+    """Fetch, parse and save one source; returns its timings (and error, if any)"""
+    table, page_urls, parse = SOURCES[name]
+    loop = asyncio.get_running_loop()
+    result = {'source': name, 'fetch': None, 'parse': None, 'save': None, 'rows': None, 'bytes': None,
+              'quarantined': None, 'unchanged_since': None, 'closed': False, 'error': None}
+    if name in DAILY_SOURCES and not is_session(date.today(), confirmed_only=True):
+        result['closed'] = True
+        return result
+    try:
+        start = time.perf_counter()
+        pages = []
+        while True:
+            urls = page_urls(url, pages)
+            if not urls:
+                break
+            pages.extend(await asyncio.gather(*(fetch(session, page_url, cache, missing_ok=len(pages) + i > 0)
+                                                for i, page_url in enumerate(urls))))
+        result['fetch'] = time.perf_counter() - start
+        result['bytes'] = sum(len(page) for page in pages if page is not None)
+
+        start = time.perf_counter()
+        df = await loop.run_in_executor(pool, parse, pages)
+        result['parse'] = time.perf_counter() - start
+        result['rows'] = len(df)
+        result['quarantined'] = len(df.attrs.get('quarantine', []))
+
+        start = time.perf_counter()
+        result['unchanged_since'] = await loop.run_in_executor(pool, unchanged_since, df, table, config)
+        if not result['unchanged_since']:
+            await loop.run_in_executor(pool, save_dataframe_as_csv, df, table, config, False)
+        result['save'] = time.perf_counter() - start
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+async def scrape_all(config, sources=None):
+    """Run the selected sources (default: every configured one) concurrently"""
+    sources = [name for name in (sources or SOURCES) if name in SOURCES and name in config['url']]
+    timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+    connector = aiohttp.TCPConnector(limit=HTTP_POOL_SIZE)
+    cache = HttpCache()
+    async with aiohttp.ClientSession(headers=HTTP_HEADERS, timeout=timeout, connector=connector) as session:
+        with ThreadPoolExecutor(max_workers=max(1, len(sources))) as pool:
+            return await asyncio.gather(*(run_source(session, pool, cache, name, config['url'][name], config)
+                                          for name in sources))
+
+
+def format_report(results, elapsed):
+    def seconds(value):
+        return f"{value:.2f}" if value is not None else "-"
+
+    lines = [f"{'source':<17}{'fetch s':>9}{'parse s':>9}{'save s':>9}{'rows':>7}{'KB':>8}"]
+    for r in results:
+        kb = f"{r['bytes'] / 1024:.0f}" if r['bytes'] is not None else "-"
+        lines.append(f"{r['source']:<17}{seconds(r['fetch']):>9}{seconds(r['parse']):>9}{seconds(r['save']):>9}"
+                     f"{r['rows'] if r['rows'] is not None else '-':>7}{kb:>8}")
+        if r['error']:
+            lines.append(f"  ERROR {r['error']}")
+        elif r['closed']:
+            lines.append(f"  skipped: {date.today()} is not a BRVM session")
+        elif r['unchanged_since']:
+            lines.append(f"  skipped: same content as the data ingested on {r['unchanged_since']}")
+        if r['quarantined']:
+            lines.append(f"  {r['quarantined']} rows quarantined")
+    lines.append(f"{len(results)} sources in {elapsed:.2f}s")
+    return "\n".join(lines) + "\n" + http_stats_summary()
+
+
+@functions_framework.http
+def entry_point(request=None):
+    reset_http_stats()
+    with open('config.yml', 'r') as file:
+        config = yaml.safe_load(file)
+    sources = None
+    if request is not None and request.args.get('sources'):
+        sources = request.args.get('sources').split(',')
+    elif request is None and len(sys.argv) > 1:
+        sources = sys.argv[1:]
+
+    start = time.perf_counter()
+    results = asyncio.run(scrape_all(config, sources))
+    report = format_report(results, time.perf_counter() - start)
+    # A failed source fails the call so the workflow surfaces it
+    return report, 500 if any(r['error'] for r in results) else 200
+
+env = 'gcp'
+if os.getenv('K_SERVICE') and os.getenv('FUNCTION_TARGET'):
+    pass
+elif __name__ == '__main__':
+    print(entry_point()[0])
@@ -0,0 +1,119 @@
+"""
+Offline scraper benchmark
+Runs every scrape_* function over the pages recorded in fixtures/ (through
+helper's replay mode, so without network access), checks their output
+against the expected tables in fixtures/expected/ and reports the
+throughput of each.
+
+The committed pages are rendered by render_fixtures.py from the warehouse's
+rows, with expected tables built from the same rows. To benchmark the live
+markup, record the sites on a session day (shares and indices are not
+fetched on closing days), check the tables they give, then save them as the
+expected ones:
+    HTTP_RECORD_DIR=fixtures python scrape_all.py
+    python scrape_benchmark.py --update
+
+Usage:
+    python scrape_benchmark.py [--iterations 1000] [--min-rows-per-second N] [--update]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+import yaml
+
+import helper
+from scrape_bonds import scrape_brvm_bonds
+from scrape_capitalizations import scrape_brvm_capitalizations
+from scrape_dividends import scrape_dividends
+from scrape_indices import scrape_brvm_indices
+from scrape_shares import scrape_brvm_shares
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, 'fixtures')
+EXPECTED = os.path.join(FIXTURES, 'expected')
+# Source (key of config['url']) -> scraper
+SCRAPERS = {
+    'shares': scrape_brvm_shares,
+    'bonds': scrape_brvm_bonds,
+    'indices': scrape_brvm_indices,
+    'capitalizations': scrape_brvm_capitalizations,
+    'dividends': scrape_dividends,
+}
+NO_RECORDINGS = f"""No pages in {FIXTURES}. Render them (with their expected tables) with
+    python render_fixtures.py
+or record them from the live sites on a session day with
+    HTTP_RECORD_DIR=fixtures python scrape_all.py
+    python scrape_benchmark.py --update"""
+
+
+def recorded_pages():
+    """File names of the pages recorded in fixtures/"""
+    return sorted(f for f in os.listdir(FIXTURES) if f.endswith('.html')) if os.path.isdir(FIXTURES) else []
+
+
+def normalize(df):
+    """Scraped table as compared with the expected one: without the scrape date, as text"""
+    return df.drop(columns=['DATE']).reset_index(drop=True).astype(str)
+
+
+def check(name, df, update):
+    """Compare with (or with --update, save as) the expected table; returns an error message or None"""
+    path = os.path.join(EXPECTED, f'{name}.csv')
+    actual = normalize(df)
+    if update:
+        os.makedirs(EXPECTED, exist_ok=True)
+        actual.to_csv(path, index=False, sep="|")
+        return None
+    if not os.path.exists(path):
+        return f"no expected table {path}, run with --update"
+    expected = pd.read_csv(path, sep="|", dtype=str, keep_default_na=False)
+    try:
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    except AssertionError as e:
+        return str(e)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--min-rows-per-second", type=float, default=0,
+                        help="fail when a scraper is slower than this")
+    parser.add_argument("--update", action="store_true", help="save the current output as the expected tables")
+    args = parser.parse_args()
+
+    with open(os.path.join(HERE, 'config.yml'), 'r') as file:
+        config = yaml.safe_load(file)
+    if not recorded_pages():
+        print(NO_RECORDINGS)
+        return 1
+    helper.HTTP_REPLAY_DIR = FIXTURES
+
+    failed = False
+    print(f"{'scraper':<17}{'rows':>6}{'ms/call':>10}{'rows/s':>10}")
+    for name, scrape in SCRAPERS.items():
+        url = config['url'][name]
+        error = check(name, scrape(url), args.update)
+        if error:
+            print(f"{name}: output differs from fixtures/expected/{name}.csv\n{error}")
+            failed = True
+            continue
+
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            rows = len(scrape(url))
+        elapsed = time.perf_counter() - start
+        rows_per_second = rows * args.iterations / elapsed
+        print(f"{name:<17}{rows:>6}{elapsed / args.iterations * 1000:>10.2f}{rows_per_second:>10.0f}")
+        if rows_per_second < args.min_rows_per_second:
+            print(f"{name}: {rows_per_second:.0f} rows/s is below {args.min_rows_per_second:.0f}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,74 +1,61 @@
 import yaml
 import pandas as pd
-from helper import save_dataframe_as_csv
-import requests
-from bs4 import BeautifulSoup
+from helper import save_dataframe_as_csv, fetch_page, http_stats_summary, reset_http_stats, extract_table, clean_table
 from datetime import datetime
 import functions_framework
 import os
 
-def scrape(url):
-    params = {
-        "hl": "en"  # language
-    }
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.60 Safari/537.36",
-    }
-    page = requests.get(url=url, params=params, headers=headers, timeout=30, verify=False)
-    soup = BeautifulSoup(page.content, 'html.parser')
-    # Find the table in the HTML (assuming there's only one table)
-    table = soup.find('table', {"class": "table table-hover table-striped sticky-enabled"})
-    # Extract the headers from the table
-    # Extract the header
-    headers = ["SYMBOL","NAME","PRICE","INTEREST_RATE","ISSUE_DATE","MATURITY_DATE"]
-    # header_row = table.find('thead').find_all('th')
-    # for th in header_row:
-    #     headers.append(th.get_text().strip().replace(' ', "_").upper())
-    # Extract the rows from the table
-    rows = []
-    for tr in table.find('tbody').find_all('tr'):
-        cells = tr.find_all(['td', 'th'])
-        t_row = [cell.text.strip() for cell in cells]
-        try:
-            tmp_list = str(t_row[1]).split(" ")
-            name = ' '.join(tmp_list[:-2])
-            interest_rate = float(tmp_list[-2].replace(',', '.').strip('%'))/100
-            maturity_date = "31/12/"+tmp_list[-1].split("-")[1]
-            price = t_row[4]
-            symbol = t_row[0]
-            issue_date = t_row[2]
-            row = [symbol]+[name]+[price]+[interest_rate]+[issue_date]+[maturity_date]
-            rows.append(row)
-        except:
-            print("Issue with row:", t_row)
-            continue
-    return headers, rows
+SCHEMA = {
+    'SYMBOL': {'type': 'string'},
+    'NAME': {'type': 'string'},
+    'PRICE': {'type': 'number', 'format': 'fr', 'min': 0},
+    'INTEREST_RATE': {'type': 'number', 'format': 'fr', 'scale': 0.01, 'min': 0},
+    # As the page writes it; the candidates are tried on the whole column, month first for dates
+    # that read both ways as pandas did for the original scraper
+    'ISSUE_DATE': {'type': 'date', 'format': ['%m/%d/%Y', '%d/%m/%Y', '%Y-%m-%d'], 'required': False},
+    # Built by extract_columns from the last year of the bond's name, not read from the page
+    'MATURITY_DATE': {'type': 'date', 'format': '%d/%m/%Y'},
+}
 
 
-def scrape_brvm_bonds(url):
-    headers, rows = scrape(url)
+def extract_columns(content):
+    table = extract_table(content, "table table-hover table-striped sticky-enabled")
+    # Columns: symbol, name, issue date, volume, price, previous price, change (the price is the
+    # fifth cell, as the original scraper read it).
+    # The name reads "<issuer> <rate>% <first year>-<last year>".
+    terms = pd.Series(table.columns[1], dtype=object).str.extract(
+        r'^(?P<NAME>.*?)\s+(?P<RATE>[\d.,]+)\s*%\s+\d{4}-(?P<LAST_YEAR>\d{4})$')
+    return {
+        'SYMBOL': table.columns[0],
+        'NAME': terms['NAME'],
+        'PRICE': table.columns[4],
+        'INTEREST_RATE': terms['RATE'],
+        'ISSUE_DATE': table.columns[2],
+        'MATURITY_DATE': "31/12/" + terms['LAST_YEAR'],
+    }
 
-    # Convert to a DataFrame
-    df = pd.DataFrame(rows, columns=headers)
-    # df['NAME'] = df['NAME'].str.replace(r'\s+', ' ', regex=True).str.strip().str.upper()
-    df['MATURITY_DATE'] = pd.to_datetime(df['MATURITY_DATE'])
-    df['ISSUE_DATE'] = pd.to_datetime(df['ISSUE_DATE'])
-    df['PRICE'] = df['PRICE'].str.replace(' ', '').astype(float)
-    # df['INTEREST'] = df['INTEREST'].str.replace(' ', '').str.replace(',','.').astype(float)
+
+def parse_brvm_bonds(content):
+    df = clean_table(pd.DataFrame(extract_columns(content)), SCHEMA, 'BONDS')
     df['DATE'] = datetime.now().strftime('%Y-%m-%d')
 
     # Display the DataFrame
     return df
 
+
+def scrape_brvm_bonds(url):
+    return parse_brvm_bonds(fetch_page(url))
+
 @functions_framework.http
 def entry_point(request=None):
+    reset_http_stats()
     with open('config.yml', 'r') as file:
         config = yaml.safe_load(file)
     df = scrape_brvm_bonds(config['url']['bonds'])
-    return save_dataframe_as_csv(df, 'BONDS', config)
+    return save_dataframe_as_csv(df, 'BONDS', config) + http_stats_summary()
 
 env = 'gcp'
 if os.getenv('K_SERVICE') and os.getenv('FUNCTION_TARGET'):
     pass
-else:
-    print(entry_point())
\ No newline at end of file
+elif __name__ == '__main__':
+    print(entry_point())
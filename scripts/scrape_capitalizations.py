@@ -1,64 +1,47 @@
-import requests
 import yaml
 import pandas as pd
-from helper import save_dataframe_as_csv
+from helper import save_dataframe_as_csv, fetch_page, http_stats_summary, reset_http_stats, extract_table, clean_table
 from datetime import datetime
-from bs4 import BeautifulSoup
 import functions_framework
 import os
 
-def scrape_brvm_capitalizations(url):
-    params = {
-        "hl": "en"  # language
-    }
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.60 Safari/537.36",
-    }
-
-    page = requests.get(url=url, params=params, headers=headers,
-                        timeout=30, verify=False)
-    soup = BeautifulSoup(page.content, 'html.parser')
-    # Find the table in the HTML (assuming there's only one table)
-    table = soup.find('table', {"class": "table table-hover table-striped sticky-enabled"})
-    # Extract the headers from the table
-    # Extract the header
-    headers = []
-    header_row = table.find('thead').find_all('th')
-    for th in header_row:
-        headers.append(th.get_text().strip().replace(' ', "_").upper())
+SCHEMA = {
+    'SYMBOL': {'type': 'string'},
+    'NAME': {'type': 'string', 'squeeze': True, 'case': 'upper'},
+    'NUMBER_OF_SHARES': {'type': 'number', 'format': 'fr', 'min': 0},
+    'DAILY_PRICE': {'type': 'number', 'format': 'fr', 'min': 0},
+    'FLOATING_CAPITALIZATION': {'type': 'number', 'format': 'fr', 'min': 0},
+    'GLOBAL_CAPITALIZATION': {'type': 'number', 'format': 'fr', 'min': 0},
+    'GLOBAL_CAPITALIZATION_(%)': {'type': 'number', 'format': 'fr', 'min': 0},
+}
 
 
-    # Extract the rows from the table
-    rows = []
-    for tr in table.find('tbody').find_all('tr'):
-        cells = tr.find_all(['td', 'th'])
-        row = [cell.text.strip() for cell in cells]
-        rows.append(row)
+def parse_brvm_capitalizations(content):
+    table = extract_table(content, "table table-hover table-striped sticky-enabled")
+    headers = [header.replace(' ', "_").upper() for header in table.headers]
 
     # Convert to a DataFrame
-    df = pd.DataFrame(rows, columns=headers)
-    df['NAME'] = df['NAME'].str.replace(r'\s+', ' ', regex=True).str.strip().str.upper()
-    df['NUMBER_OF_SHARES'] = df['NUMBER_OF_SHARES'].str.replace(' ', '').str.replace(',', '.').astype(float)
-    df['DAILY_PRICE'] = df['DAILY_PRICE'].str.replace(' ', '').str.replace(',', '.').astype(float)
-    df['FLOATING_CAPITALIZATION'] = df['FLOATING_CAPITALIZATION'].str.replace(' ', '').str.replace(',', '.').astype(float)
-    df['GLOBAL_CAPITALIZATION'] = df['GLOBAL_CAPITALIZATION'].str.replace(' ', '').str.replace(',', '.').astype(float)
-    df['GLOBAL_CAPITALIZATION_(%)'] = df['GLOBAL_CAPITALIZATION_(%)'].str.replace(' ', '').str.replace(',', '.').astype(float)
+    df = clean_table(pd.DataFrame(dict(zip(headers, table.columns))), SCHEMA, 'CAPITALIZATIONS')
     df['DATE'] = datetime.now().strftime('%Y-%m-%d')
     # Display the DataFrame
     return df
 
+
+def scrape_brvm_capitalizations(url):
+    return parse_brvm_capitalizations(fetch_page(url))
+
 # Load configuration from YAML file
 
 @functions_framework.http
 def entry_point(request=None):
+    reset_http_stats()
     with open('config.yml', 'r') as file:
         config = yaml.safe_load(file)
     df = scrape_brvm_capitalizations(config['url']['capitalizations'])
-    return save_dataframe_as_csv(df, 'CAPITALIZATIONS', config)
+    return save_dataframe_as_csv(df, 'CAPITALIZATIONS', config) + http_stats_summary()
 
 env = 'gcp'
 if os.getenv('K_SERVICE') and os.getenv('FUNCTION_TARGET'):
     pass
-else:
-    print(entry_point())
\ No newline at end of file
+elif __name__ == '__main__':
+    print(entry_point())
@@ -1,71 +1,110 @@
-import requests
 import yaml
 import pandas as pd
-from helper import save_dataframe_as_csv
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from helper import save_dataframe_as_csv, fetch_page, http_stats_summary, reset_http_stats, extract_table, clean_table
 from datetime import datetime
-from bs4 import BeautifulSoup
 import functions_framework
 import os
 
-def scrape_dividends(url):
-    params = {
-        "hl": "en"  # language
-    }
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.60 Safari/537.36",
-    }
-    data = []
-    for i in range(1, 3):
-        page = requests.get(url=f"{url}?page={i}", params=params, headers=headers, timeout=30, verify=False)
-        soup = BeautifulSoup(page.content, 'html.parser')
-        # Find the table in the HTML (assuming there's only one table)
-        table = soup.find('table', {"class": "table table-striped table-bordered"})
-        # Extract the headers from the table
-        # Extract the header
-        table_headers = []
-        header_row = table.find('thead').find_all('th')
-        for th in header_row:
-            table_headers.append(th.get_text().strip().replace(' ', "_").upper())
-
-        # Extract the rows from the table
-        rows = []
-        for tr in table.find('tbody').find_all('tr'):
-            index = tr.find('a', href=True)['href'].split("/")[-1]
-
-            cells = tr.find_all(['td', 'th'])
-            row = [cell.text.strip() for cell in cells]
-            row[0] = index
-            rows.append(row)
-
-        # Convert to a DataFrame
-        table_headers[0] = "SYMBOL"
-        df = pd.DataFrame(rows, columns=table_headers)
-        # df['NAME'] = df['NAME'].str.replace(r'\s+', ' ', regex=True).str.strip().str.upper()
-        # df['PREVIOUS_PRICE'] = df['PREVIOUS_PRICE'].str.replace(' ', '').str.replace(',', '.').astype(float)
-        # df['OPENING_PRICE'] = df['OPENING_PRICE'].str.replace(' ', '').str.replace(',', '.').astype(float)
-        # df['CLOSING_PRICE'] = df['CLOSING_PRICE'].str.replace(' ', '').str.replace(',', '.').astype(float)
-        data.append(df)
-
-    # Display the DataFrame
-    df = pd.concat(data, axis=0)
-    df['DIVIDENDE'] = df['DIVIDENDE'].str.replace(' ', '').str.replace(',', '.').astype(float)
-    df['DATE_PAIEMENT'] = pd.to_datetime(df['DATE_PAIEMENT'], errors='coerce')
+# Pages of the dividends table fetched at once
+DIVIDEND_CONCURRENCY = 8
+# Upper bound on the pages fetched, in case the end of the table is never recognised
+DIVIDEND_MAX_PAGES = 100
+
+SCHEMA = {
+    'SYMBOL': {'type': 'string'},
+    'DIVIDENDE': {'type': 'number', 'format': 'fr', 'min': 0},
+    # Day first: in the DIVIDENDS rows loaded by the original scraper (pandas reading month first,
+    # unreadable values dropped) the only dates left have both fields at most 12
+    'DATE_PAIEMENT': {'type': 'date', 'format': ['%d/%m/%Y', '%Y-%m-%d'], 'required': False},
+}
+
+def table_end(pages):
+    """
+    Number of leading pages that belong to the table, or None if none of the
+    pages fetched so far (in page order, None for a 404) is past its end. A
+    page is past the end when it is missing, has no table or an empty one,
+    or repeats an earlier page, as sites do for page numbers out of range.
+    """
+    seen = set()
+    for i, content in enumerate(pages):
+        if content is None:
+            return i
+        try:
+            columns = parse_dividends_page(content)
+        except ValueError:
+            if not i:
+                raise
+            return i
+        rows = tuple(tuple(column) for column in columns.values())
+        if not columns.get('SYMBOL') or rows in seen:
+            return i
+        seen.add(rows)
+    return None
+
+
+def dividend_page_urls(url, pages=()):
+    """
+    URLs of the next pages to fetch, given the contents of the pages fetched
+    so far; empty once the end of the table is among them. Pages are probed
+    DIVIDEND_CONCURRENCY at a time.
+    """
+    fetched = len(pages)
+    if (fetched and table_end(pages) is not None) or fetched >= DIVIDEND_MAX_PAGES:
+        return []
+    return [f"{url}?page={i}" for i in range(fetched + 1, min(fetched + DIVIDEND_CONCURRENCY, DIVIDEND_MAX_PAGES) + 1)]
+
+
+def parse_dividends_page(content):
+    """Column name -> cells of the dividends table on one page"""
+    table = extract_table(content, "table table-striped table-bordered")
+    table_headers = [header.replace(' ', "_").upper() for header in table.headers]
+
+    # The first column links to the company page, whose last path segment is the symbol
+    table_headers[0] = "SYMBOL"
+    columns = [[link.split("/")[-1] for link in table.links]] + table.columns[1:]
+    return dict(zip(table_headers, columns))
+
+
+def parse_dividends(pages):
+    """Dividends DataFrame from the pages fetched, up to the end of the table"""
+    end = table_end(pages)
+    # Gather the cells of all pages column by column and build a single DataFrame
+    data = defaultdict(list)
+    for content in pages[:end]:
+        for header, column in parse_dividends_page(content).items():
+            data[header].extend(column)
+
+    df = clean_table(pd.DataFrame(data), SCHEMA, 'DIVIDENDS')
     df['DATE'] = datetime.now().strftime('%Y-%m-%d')
 
-    return df[["SYMBOL", "DIVIDENDE", "DATE_PAIEMENT", "DATE"]].rename(
-        columns={'DIVIDENDE': 'DIVIDEND', 'DATE_PAIEMENT': 'PAYMENT_DATE'})
+    return df.rename(columns={'DIVIDENDE': 'DIVIDEND', 'DATE_PAIEMENT': 'PAYMENT_DATE'})
+
+
+def scrape_dividends(url):
+    pages = []
+    with ThreadPoolExecutor(max_workers=DIVIDEND_CONCURRENCY) as pool:
+        while True:
+            page_urls = dividend_page_urls(url, pages)
+            if not page_urls:
+                break
+            first = len(pages)
+            pages.extend(pool.map(lambda i: fetch_page(page_urls[i], missing_ok=first + i > 0),
+                                  range(len(page_urls))))
+    return parse_dividends(pages)
 
 
 @functions_framework.http
 def entry_point(request=None):
+    reset_http_stats()
     with open('config.yml', 'r') as file:
         config = yaml.safe_load(file)
     df = scrape_dividends(config['url']['dividends'])
-    return save_dataframe_as_csv(df, 'DIVIDENDS', config)
+    return save_dataframe_as_csv(df, 'DIVIDENDS', config) + http_stats_summary()
 
 env = 'gcp'
 if os.getenv('K_SERVICE') and os.getenv('FUNCTION_TARGET'):
     pass
-else:
-    print(entry_point())
\ No newline at end of file
+elif __name__ == '__main__':
+    print(entry_point())
@@ -1,58 +1,50 @@
-import requests
 import yaml
 import pandas as pd
-from helper import save_dataframe_as_csv
-from datetime import datetime
+from helper import save_dataframe_as_csv, fetch_page, http_stats_summary, reset_http_stats, extract_table, clean_table
+from datetime import date, datetime
+from trading_calendar import is_session
 import os
-from bs4 import BeautifulSoup
 import functions_framework
 
 
-def scrape_brvm_indices(url):
-    params = {
-        "hl": "en"  # language
-    }
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.60 Safari/537.36",
-    }
-
-    page = requests.get(url=url, params=params, headers=headers, timeout=30, verify=False)
-    soup = BeautifulSoup(page.content, 'html.parser')
-    # Find the table in the HTML (assuming there's only one table)
-    table = soup.find('table', {"class": "table table-hover table-striped sticky-enabled "})
-    # Extract the headers from the table
-    # Extract the header
-    headers = []
-    header_row = table.find('thead').find_all('th')
-    for th in header_row:
-        headers.append(th.get_text().strip().replace(' ', "_").upper())
-
-
-    # Extract the rows from the table
-    rows = []
-    for tr in table.find('tbody').find_all('tr'):
-        cells = tr.find_all(['td', 'th'])
-        row = [cell.text.strip() for cell in cells]
-        rows.append(row[:-1])
-
-    # Convert to a DataFrame
-    df = pd.DataFrame(rows, columns=headers)
-    df['NAME'] = df['NAME'].str.replace(r'\s+', ' ', regex=True).str.strip().str.upper()
+# Closings stay text: the warehouse INDICES columns are strings
+SCHEMA = {
+    'NAME': {'type': 'string', 'squeeze': True, 'case': 'upper'},
+    'PREVIOUS_CLOSING': {'type': 'string'},
+    'CLOSING': {'type': 'string'},
+}
+
+
+def parse_brvm_indices(content):
+    table = extract_table(content, "table table-hover table-striped sticky-enabled")
+    headers = [header.replace(' ', "_").upper() for header in table.headers]
+
+    # Convert to a DataFrame (the rows' extra last cell has no header and is dropped)
+    df = clean_table(pd.DataFrame(dict(zip(headers, table.columns))), SCHEMA, 'INDICES')
     df['DATE'] = datetime.now().strftime('%Y-%m-%d')
     # Display the DataFrame
-    return df[["NAME","PREVIOUS_CLOSING","CLOSING","DATE"]]
+    return df
+
+
+def scrape_brvm_indices(url):
+    return parse_brvm_indices(fetch_page(url))
 
 
 @functions_framework.http
 def entry_point(request=None):
+    reset_http_stats()
     with open('config.yml', 'r') as file:
         config = yaml.safe_load(file)
+    # Prices only change on sessions: on closing days the page repeats the last one. Only confirmed
+    # holidays skip the scrape: on an estimated one an unchanged table is skipped when saving instead.
+    today = date.today()
+    if not is_session(today, confirmed_only=True):
+        return f"Skipped INDICES: {today} is not a BRVM session.\n"
     df = scrape_brvm_indices(config['url']['indices'])
-    return save_dataframe_as_csv(df, 'INDICES', config)
+    return save_dataframe_as_csv(df, 'INDICES', config) + http_stats_summary()
 
 env = 'gcp'
 if os.getenv('K_SERVICE') and os.getenv('FUNCTION_TARGET'):
     pass
-else:
-    print(entry_point())
\ No newline at end of file
+elif __name__ == '__main__':
+    print(entry_point())
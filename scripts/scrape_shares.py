@@ -1,68 +1,64 @@
-import requests
 import yaml
 import pandas as pd
-import re
 import functions_framework
-from bs4 import BeautifulSoup
+from trading_calendar import is_session
 import os
-from helper import save_dataframe_as_csv
-from datetime import datetime
+from helper import save_dataframe_as_csv, fetch_page, http_stats_summary, reset_http_stats, extract_table, clean_table
+from datetime import date, datetime
 from google.auth import default
 
 
-def scrape(url):
-    params = {
-        "hl": "en"  # language
-    }
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.60 Safari/537.36",
-    }
-    page = requests.get(url=url, params=params, headers=headers, timeout=30, verify=False)
-    soup = BeautifulSoup(page.content, 'html.parser')
-    # Find the table in the HTML (assuming there's only one table)
-    table = soup.find('table', {"class": "tablesorter tbl100_6 tbl1"})
-    # Extract the headers from the table
-    # Extract the header
-    headers = ['SYMBOL', 'NAME', 'OPEN', 'HIGH', 'LOW', 'VOLUME', 'CLOSE']
-
-    # Extract the rows from the table
-    rows = []
-    for tr in table.find('tbody').find_all('tr'):
-        cells = tr.find_all(['td', 'th'])
-        del cells[-1]  # remove VARIATION column
-        del cells[-2]  # remove VOLUME_(FCFA)
-        symbol = cells[0].find('a', href=True)['href'].split("_")[1].split(".")[0]
-        row = [symbol] + [cells[0].text.strip().replace('\xa0', ' ')] + [
-            re.sub(r'[^0-9]', '', cell.text.strip()) for cell in cells[1:]]
-        rows.append(row)
+SCHEMA = {
+    'SYMBOL': {'type': 'string'},
+    'NAME': {'type': 'string', 'squeeze': True},
+    'OPEN': {'type': 'number', 'format': 'fr', 'min': 0},
+    'HIGH': {'type': 'number', 'format': 'fr', 'min': 0},
+    'LOW': {'type': 'number', 'format': 'fr', 'min': 0},
+    'VOLUME': {'type': 'number', 'format': 'fr', 'min': 0},
+    'CLOSE': {'type': 'number', 'format': 'fr', 'min': 0},
+}
 
-    return headers, rows
 
+def extract_columns(content):
+    table = extract_table(content, "tablesorter tbl100_6 tbl1")
+    # Columns: name, open, high, low, volume, volume (FCFA), close, variation
+    name, open_, high, low, volume, close = (table.columns[i] for i in (0, 1, 2, 3, 4, -2))
+    return {
+        'SYMBOL': [link.split("_")[1].split(".")[0] if link else None for link in table.links],
+        'NAME': name,
+        'OPEN': open_,
+        'HIGH': high,
+        'LOW': low,
+        'VOLUME': volume,
+        'CLOSE': close,
+    }
 
-def scrape_brvm_shares(url):
-    headers, rows = scrape(url)
-
-    # Convert to a DataFrame
-    df = pd.DataFrame(rows, columns=headers)
 
-    df['OPEN'] = df['OPEN'].str.replace(',', '.').astype(float)
-    df['HIGH'] = df['HIGH'].str.replace(',', '.').astype(float)
-    df['LOW'] = df['LOW'].str.replace(',', '.').astype(float)
-    df['CLOSE'] = df['CLOSE'].str.replace(',', '.').astype(float)
-    df['VOLUME'] = df['VOLUME'].str.replace(',', '.').astype(float)
+def parse_brvm_shares(content):
+    df = clean_table(pd.DataFrame(extract_columns(content)), SCHEMA, 'SHARES')
     df['DATE'] = datetime.now().strftime('%Y-%m-%d')
     # Display the DataFrame
     return df
 
+
+def scrape_brvm_shares(url):
+    return parse_brvm_shares(fetch_page(url))
+
 @functions_framework.http
 def entry_point(request=None):
+    reset_http_stats()
     with open('config.yml', 'r') as file:
         config = yaml.safe_load(file)
+    # Prices only change on sessions: on closing days the page repeats the last one. Only confirmed
+    # holidays skip the scrape: on an estimated one an unchanged table is skipped when saving instead.
+    today = date.today()
+    if not is_session(today, confirmed_only=True):
+        return f"Skipped SHARES: {today} is not a BRVM session.\n"
     df = scrape_brvm_shares(config['url']['shares'])
-    return save_dataframe_as_csv(df, 'SHARES', config)
+    return save_dataframe_as_csv(df, 'SHARES', config) + http_stats_summary()
 
 env = 'gcp'
 if os.getenv('K_SERVICE') and os.getenv('FUNCTION_TARGET'):
     pass
-else:
-    print(entry_point())
\ No newline at end of file
+elif __name__ == '__main__':
+    print(entry_point())
@@ -0,0 +1,146 @@
+"""
+Staging format benchmark
+Compares CSV and Parquet staging files on file size, write time and load
+time into a fresh DuckDB database, through the same helper functions the
+scrape and insert functions use, and checks that both load the same rows:
+the Parquet path (to_arrow, read_staged, upsert_duckdb) must leave the table
+as the CSV path does. The tables are the warehouse's SHARES, INDICES and
+DIVIDENDS (database/financial_assets.db), the BONDS and CAPITALIZATIONS of
+the pages in fixtures/ (see scrape_benchmark.py) parsed by the scrapers, plus
+a synthetic SHARES history of `--rows` rows built from the last session's
+quotes, to show how both formats scale.
+
+Usage (from the scripts directory):
+    python staging_benchmark.py [--rows 250000] [--iterations 5] [--compression zstd]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import duckdb
+import pandas as pd
+import yaml
+
+import helper
+from helper import STAGING_FORMATS, STAGING_SCHEMAS, insert_into_duckdb, read_staged, staged_content
+from scrape_benchmark import FIXTURES, NO_RECORDINGS, SCRAPERS, recorded_pages
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Tables read from the warehouse, and (source -> table) scraped from the pages in fixtures/ for the others
+WAREHOUSE_TABLES = ('SHARES', 'INDICES', 'DIVIDENDS')
+SCRAPED_TABLES = {'bonds': 'BONDS', 'capitalizations': 'CAPITALIZATIONS'}
+
+
+def warehouse_tables(config):
+    """The WAREHOUSE_TABLES of the DuckDB database, with the columns of their staging schema"""
+    tables = {}
+    with duckdb.connect(os.path.join(HERE, '..', config['duckdb']['database']), read_only=True) as con:
+        for table in WAREHOUSE_TABLES:
+            columns = ", ".join(f'"{name}"' for name in STAGING_SCHEMAS[table].names)
+            tables[table] = con.execute(f"SELECT {columns} FROM {table}").df()
+    return tables
+
+
+def shares_history(shares, rows):
+    """`rows` SHARES rows: one session's quotes repeated over consecutive past days, with some noise"""
+    days = -(-rows // len(shares))
+    history = pd.concat([shares] * days, ignore_index=True).iloc[:rows]
+    offsets = history.index // len(shares)
+    history['DATE'] = [(date(2024, 6, 28) - timedelta(days=int(n))).isoformat() for n in offsets]
+    noise = 1 + (history.index % 97 - 48) / 1000
+    for column in ('OPEN', 'HIGH', 'LOW', 'CLOSE'):
+        history[column] = (history[column] * noise).round(0)
+    return history
+
+
+def best_of(iterations, fn):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def measure(df, asset, staging_format, compression, iterations, workdir):
+    path = os.path.join(workdir, f"{asset}.{staging_format}")
+
+    def write():
+        with open(path, 'wb') as f:
+            f.write(staged_content(df, asset, staging_format, compression))
+
+    def load():
+        db_path = os.path.join(workdir, f"{asset}-{staging_format}.db")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        insert_into_duckdb(read_staged(path), os.path.relpath(db_path, os.path.join(HERE, '..')), asset)
+
+    timings = {'write': best_of(iterations, write), 'read': best_of(iterations, lambda: read_staged(path)),
+               'load': best_of(iterations, load)}
+    return {'bytes': os.path.getsize(path), **timings}
+
+
+def loaded_rows(workdir, asset, staging_format):
+    """Rows `measure` loaded from a staging format, as text and in a fixed order"""
+    with duckdb.connect(os.path.join(workdir, f"{asset}-{staging_format}.db"), read_only=True) as con:
+        return con.execute(f"SELECT * FROM (SELECT COLUMNS(*)::VARCHAR FROM {asset}) ORDER BY ALL").fetchall()
+
+
+def round_trip_error(workdir, asset):
+    """None if the Parquet staging file loaded the same rows as the CSV one, else what differs"""
+    csv, parquet = (loaded_rows(workdir, asset, fmt) for fmt in ('csv', 'parquet'))
+    if csv == parquet:
+        return None
+    if len(csv) != len(parquet):
+        return f"{len(csv)} rows loaded from CSV, {len(parquet)} from Parquet"
+    first = next(i for i, (a, b) in enumerate(zip(csv, parquet)) if a != b)
+    return f"row {first} differs: {csv[first]} from CSV, {parquet[first]} from Parquet"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=250000, help="rows of the synthetic SHARES history")
+    parser.add_argument("--iterations", type=int, default=5, help="best of this many runs per measure")
+    parser.add_argument("--compression", default="zstd", help="Parquet codec")
+    args = parser.parse_args()
+
+    with open(os.path.join(HERE, 'config.yml'), 'r') as file:
+        config = yaml.safe_load(file)
+    if not recorded_pages():
+        print(NO_RECORDINGS)
+        return 1
+    helper.HTTP_REPLAY_DIR = FIXTURES
+    tables = warehouse_tables(config)
+    tables.update({table: SCRAPERS[name](config['url'][name]) for name, table in SCRAPED_TABLES.items()})
+    datasets = [(asset, asset, df) for asset, df in tables.items()]
+    last_session = tables['SHARES'][tables['SHARES']['DATE'] == tables['SHARES']['DATE'].max()]
+    datasets.append((f"SHARES x{args.rows}", 'SHARES', shares_history(last_session.reset_index(drop=True),
+                                                                      args.rows)))
+
+    failed = False
+
+    print(f"{'table':<18}{'rows':>8}{'format':>9}{'KB':>9}{'write ms':>10}{'read ms':>9}{'load ms':>9}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for label, asset, df in datasets:
+            results = {fmt: measure(df, asset, fmt, args.compression, args.iterations, workdir)
+                       for fmt in STAGING_FORMATS}
+            for fmt, r in results.items():
+                print(f"{label:<18}{len(df):>8}{fmt:>9}{r['bytes'] / 1024:>9.1f}{r['write'] * 1000:>10.1f}"
+                      f"{r['read'] * 1000:>9.1f}{r['load'] * 1000:>9.1f}")
+            csv, parquet = results['csv'], results['parquet']
+            print(f"{'':<18}{'':>8}{'ratio':>9}{parquet['bytes'] / csv['bytes']:>9.2f}"
+                  f"{parquet['write'] / csv['write']:>10.2f}{parquet['read'] / csv['read']:>9.2f}"
+                  f"{parquet['load'] / csv['load']:>9.2f}")
+            error = round_trip_error(workdir, asset)
+            if error:
+                print(f"{label}: Parquet and CSV staging load different rows: {error}")
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+# trading_calendar.py - BRVM Trading Calendar
+
+"""
+BRVM Trading Calendar
+Sessions are weekdays other than the closing days listed in
+brvm_holidays.csv. Session arithmetic is vectorized over numpy business
+days: every function accepts a single date or an array of dates.
+
+Holidays whose date is ESTIMATED count as closing days unless
+confirmed_only is set: pass it where a wrong guess would throw data away or
+skip a real session. Dates outside the years the file covers are treated as
+if they had no holidays, with a warning printed once per year.
+
+This module and its holiday file live in scripts/ only. The webapp imports
+them from there through webapp/shared_modules.py, and the root Dockerfile
+copies them to scripts/ in the webapp image.
+"""
+
+import os
+from datetime import date
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+HOLIDAYS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brvm_holidays.csv')
+WEEKMASK = '1111100'  # Monday to Friday
+
+
+_warned_years = set()
+
+
+@lru_cache(maxsize=None)
+def _holiday_table() -> pd.DataFrame:
+    return pd.read_csv(HOLIDAYS_PATH, comment='#', parse_dates=['DATE'])
+
+
+@lru_cache(maxsize=None)
+def holidays(confirmed_only=False) -> np.ndarray:
+    """Closing days, as sorted datetime64[D]; with confirmed_only without the ESTIMATED ones"""
+    table = _holiday_table()
+    if confirmed_only:
+        table = table[table['ESTIMATED'] == 0]
+    return np.unique(table['DATE'].values.astype('datetime64[D]'))
+
+
+@lru_cache(maxsize=None)
+def covered_years() -> range:
+    """Years the holiday file lists closing days for"""
+    years = _holiday_table()['DATE'].dt.year
+    return range(int(years.min()), int(years.max()) + 1)
+
+
+@lru_cache(maxsize=None)
+def _busdaycal(confirmed_only=False) -> np.busdaycalendar:
+    return np.busdaycalendar(weekmask=WEEKMASK, holidays=holidays(confirmed_only))
+
+
+def _check_coverage(days):
+    years = np.unique(np.atleast_1d(days).astype('datetime64[Y]').astype(int) + 1970)
+    for year in set(years.tolist()) - set(covered_years()) - _warned_years:
+        _warned_years.add(year)
+        print(f"Warning: {HOLIDAYS_PATH} has no closing days for {year} (it covers "
+              f"{covered_years()[0]}-{covered_years()[-1]}); every weekday of {year} counts as a session")
+
+
+def _days(dates):
+    if np.ndim(dates) == 0:
+        days = np.datetime64(pd.Timestamp(dates).date(), 'D')
+    else:
+        days = pd.DatetimeIndex(pd.to_datetime(dates)).values.astype('datetime64[D]')
+    _check_coverage(days)
+    return days
+
+
+def _result(days):
+    return pd.Timestamp(days) if np.ndim(days) == 0 else pd.DatetimeIndex(days.astype('datetime64[ns]'))
+
+
+def is_session(dates, confirmed_only=False):
+    """Whether the market is open on the date(s); with confirmed_only only confirmed holidays close it"""
+    result = np.is_busday(_days(dates), busdaycal=_busdaycal(confirmed_only))
+    return bool(result) if np.ndim(result) == 0 else result
+
+
+def previous_session(dates):
+    """The date(s) themselves when sessions, else the session before"""
+    return _result(np.busday_offset(_days(dates), 0, roll='backward', busdaycal=_busdaycal()))
+
+
+def next_session(dates):
+    """The date(s) themselves when sessions, else the session after"""
+    return _result(np.busday_offset(_days(dates), 0, roll='forward', busdaycal=_busdaycal()))
+
+
+def sessions_back(dates, n: int):
+    """The session n sessions before the date(s), counted from their previous_session"""
+    return _result(np.busday_offset(_days(dates), -n, roll='backward', busdaycal=_busdaycal()))
+
+
+def session_count(start, end):
+    """Number of sessions in [start, end)"""
+    result = np.busday_count(_days(start), _days(end), busdaycal=_busdaycal())
+    return int(result) if np.ndim(result) == 0 else result
+
+
+def sessions(start, end) -> pd.DatetimeIndex:
+    """Sessions from start to end, both included"""
+    days = np.arange(_days(start), _days(end) + np.timedelta64(1, 'D'), dtype='datetime64[D]')
+    return _result(days[np.is_busday(days, busdaycal=_busdaycal())])
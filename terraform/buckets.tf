@@ -16,6 +16,14 @@ data "archive_file" "assets" {
     content  = file("../scripts/requirements.txt")
     filename = "requirements.txt"
   }
+  source {
+    content  = file("../scripts/trading_calendar.py")
+    filename = "trading_calendar.py"
+  }
+  source {
+    content  = file("../scripts/brvm_holidays.csv")
+    filename = "brvm_holidays.csv"
+  }
   source {
     content  = file("../scripts/${each.key}.py")
     filename = "main.py"
@@ -25,7 +25,8 @@ resource "google_cloudfunctions2_function" "functions" {
 
 
 resource "google_workflows_workflow" "workflows" {
-  depends_on  = [google_cloudfunctions2_function.functions, google_project_service.apis]
+  depends_on  = [google_cloudfunctions2_function.functions, google_project_service.apis,
+                 google_cloud_run_v2_job.digest_job]
   count       = length(var.functions) / 2
   name        = "${split("_", var.functions[count.index])[1]}-wf"
   region      = var.region
@@ -49,6 +50,12 @@ main:
           auth:
             type: OIDC
             audience: ${google_cloudfunctions2_function.functions[var.functions[count.index + 4]].service_config[0].uri}
+%{ if var.functions[count.index] == "scrape_shares" ~}
+    - send_digest:
+        call: googleapis.run.v2.projects.locations.jobs.run
+        args:
+          name: ${google_cloud_run_v2_job.digest_job.id}
+%{ endif ~}
 EOF
 }
 
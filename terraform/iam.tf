@@ -31,6 +31,15 @@ resource "google_secret_manager_secret" "tradvisor_gmail_acc" {
   depends_on = [google_service_account.tradvisor_sa]
 }
 
+# Comma-separated session token signing keys, newest first (SESSION_SECRETS)
+resource "google_secret_manager_secret" "tradvisor_session_secrets" {
+  secret_id = "tradvisor_session_secrets"
+  replication {
+    auto {}
+  }
+  depends_on = [google_service_account.tradvisor_sa]
+}
+
 resource "google_secret_manager_secret_version" "sa_key_secret_version" {
   depends_on = [google_service_account_key.tradvisor_sa_key, google_secret_manager_secret.tradvisor_sa_key_secret]
   secret      = google_secret_manager_secret.tradvisor_sa_key_secret.name
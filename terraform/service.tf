@@ -49,6 +49,16 @@ resource "google_cloud_run_v2_service" "tradvisor_service" {
         }
       }
 
+      env {
+        name = "SESSION_SECRETS"
+        value_source {
+          secret_key_ref {
+            secret  = google_secret_manager_secret.tradvisor_session_secrets.id
+            version = "latest"
+          }
+        }
+      }
+
       # Resource limits
       resources {
         cpu_idle = true
@@ -71,6 +81,55 @@ resource "google_cloud_run_v2_service" "tradvisor_service" {
   }
 
 }
+# Signal digest emails, run by the shares workflow after insert_shares (webapp/digest.py)
+resource "google_cloud_run_v2_job" "digest_job" {
+  name     = "${var.service_name}-digest"
+  location = var.region
+  depends_on = [google_project_service.apis, google_secret_manager_secret.tradvisor_sa_key_secret]
+  deletion_protection = false
+  template {
+    task_count = 1
+    template {
+      service_account = google_service_account.tradvisor_sa.email
+      timeout         = "3600s"
+      # Repeated digests are skipped per user and market date, so a retry only sends what is missing
+      max_retries     = 1
+      containers {
+        image   = var.docker_image
+        command = ["python", "webapp/digest.py"]
+        env {
+          name  = "PROJECT_ID"
+          value = var.project_id
+        }
+        env {
+          name = "GOOGLE_APPLICATION_CREDENTIALS_JSON"
+          value_source {
+            secret_key_ref {
+              secret  = google_secret_manager_secret.tradvisor_sa_key_secret.id
+              version = "latest"
+            }
+          }
+        }
+        env {
+          name = "TRADVISOR_GMAIL_ACC_SECRET"
+          value_source {
+            secret_key_ref {
+              secret  = google_secret_manager_secret.tradvisor_gmail_acc.id
+              version = "latest"
+            }
+          }
+        }
+        resources {
+          limits = {
+            memory = "1Gi"
+            cpu    = "1"
+          }
+        }
+      }
+    }
+  }
+}
+
 data "google_iam_policy" "noauth" {
   binding {
     role = "roles/run.invoker"
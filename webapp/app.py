@@ -10,6 +10,8 @@ from streamlit import sidebar
 from trading import TechnicalIndicatorTrading
 from google.cloud import bigquery
 from helper import create_gauge_chart, create_signal_pie_chart, create_stock_chart
+import shared_modules  # puts scripts/ on the path for trading_calendar
+from trading_calendar import is_session, sessions_back
 import json
 from google.oauth2 import service_account
 
@@ -37,11 +39,16 @@ def load_data():
     # shares = None
     # dividends = None
     trading_system = TechnicalIndicatorTrading()
+    query0 = f"SELECT MAX(CAST(date AS DATE)) AS max_date FROM `{dataset_names[ENVIRONMENT]}SHARES`"
+    if ENVIRONMENT == 'on-premise':
+        latest = pd.Timestamp(conn.execute(query0.replace('`', '')).df()['max_date'].iloc[0])
+    else:
+        latest = pd.Timestamp(client.query(query0).to_dataframe()['max_date'].iloc[0])
+    # 63 sessions, about 3 months
+    start = sessions_back(latest, 63)
     query1 = f"""
-                WITH latest_date AS (SELECT MAX(CAST(date AS DATE)) AS max_date FROM `{dataset_names[ENVIRONMENT]}SHARES`)
                 SELECT * FROM `{dataset_names[ENVIRONMENT]}SHARES`
-                WHERE CAST(date AS DATE) BETWEEN (SELECT max_date FROM latest_date) - INTERVAL '90' DAY
-                    AND (SELECT max_date FROM latest_date)
+                WHERE CAST(date AS DATE) BETWEEN DATE '{start:%Y-%m-%d}' AND DATE '{latest:%Y-%m-%d}'
                 ORDER BY date DESC
             """
 
@@ -57,10 +64,8 @@ def load_data():
 
     if ENVIRONMENT == 'on-premise':
         query1 = f"""
-                    WITH latest_date AS (SELECT MAX(CAST(date AS DATE)) AS max_date FROM {dataset_names[ENVIRONMENT]}SHARES)
                     SELECT * FROM {dataset_names[ENVIRONMENT]}SHARES
-                    WHERE CAST(date AS DATE) BETWEEN (SELECT max_date FROM latest_date) - INTERVAL '90' DAY
-                        AND (SELECT max_date FROM latest_date)
+                    WHERE CAST(date AS DATE) BETWEEN DATE '{start:%Y-%m-%d}' AND DATE '{latest:%Y-%m-%d}'
                     ORDER BY date DESC
                 """
         query4 = f"""
@@ -83,6 +88,9 @@ def load_data():
 
     # capitalizations = conn.execute(query5).df()
 
+    # Snapshots scraped on closing days only repeat the previous session. Only weekends and confirmed
+    # holidays are dropped: a stored row on an estimated holiday may well be a real session.
+    shares = shares[is_session(shares['DATE'], confirmed_only=True)]
     result = shares.merge(dividends[["SYMBOL", "DIVIDEND", "PAYMENT_DATE"]], on='SYMBOL', how='left')
     # result = tr.get_trading_decisions(result)
     result = trading_system.generate_signals(result, adaptive_weights=True)
@@ -119,7 +127,8 @@ def top10_weekly_performers(df):
     # Convert dates once and find date range
     dates = pd.to_datetime(df['DATE'].values)
     latest_date = dates.max()
-    week_ago = latest_date - pd.Timedelta(days=7)
+    # Close of the same session a trading week (5 sessions) earlier
+    week_ago = sessions_back(latest_date, 5)
 
     # Filter for weekly data using boolean indexing
     weekly_mask = dates >= week_ago
@@ -5,19 +5,69 @@ Authentication UI Components for Trading Dashboard
 Handles login, registration, and password reset interfaces
 """
 
+import json
 import streamlit as st
+import streamlit.components.v1 as components
 import time
-from typing import Dict
+import os
+from typing import Dict, Optional
 from database import DatabaseManager
 from email_manager import EmailManager
+from session_tokens import SESSION_COOKIE, SESSION_PARAM, SessionTokens
+from rate_limit import AuthThrottle
+
+
+# Proxies in front of the app that append to X-Forwarded-For: one on Cloud Run
+# (its front end), two behind an external load balancer
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
 
 
 class AuthUI:
     """Authentication user interface components"""
 
-    def __init__(self, db_manager: DatabaseManager, email_manager: EmailManager):
+    def __init__(self, db_manager: DatabaseManager, email_manager: EmailManager,
+                 sessions: Optional[SessionTokens] = None, throttle: Optional[AuthThrottle] = None):
         self.db = db_manager
         self.email = email_manager
+        self.sessions = sessions or SessionTokens()
+        self.throttle = throttle or AuthThrottle()
+
+    @staticmethod
+    def client_id() -> str:
+        """
+        Client address as recorded by our own front end, for per-client rate
+        limits. Entries left of the ones our proxies appended are supplied by
+        the client and can be forged, so only the rightmost trusted hop is used.
+        """
+        forwarded = st.context.headers.get("X-Forwarded-For")
+        if forwarded:
+            hops = [hop.strip() for hop in forwarded.split(",")]
+            return hops[-min(TRUSTED_PROXY_HOPS, len(hops))]
+        return "local"
+
+    @staticmethod
+    def show_throttled(wait: float):
+        st.error(f"Too many attempts. Please try again in {max(1, round(wait / 60))} minute(s).")
+
+    @staticmethod
+    def set_session_cookie(token: Optional[str], max_age: int):
+        """Set (or with max_age 0, clear) the session cookie from the browser"""
+        cookie = f"{SESSION_COOKIE}={token or ''}; Max-Age={max_age}; Path=/; SameSite=Strict; Secure"
+        components.html(f"<script>parent.document.cookie = {json.dumps(cookie)};</script>", height=0)
+
+    def restore_session(self) -> bool:
+        """Authenticate from the signed session cookie, checking its session version (cached, see database.py)"""
+        # Tokens were carried in the URL by earlier releases; don't leave them in history
+        if SESSION_PARAM in st.query_params:
+            del st.query_params[SESSION_PARAM]
+        token = st.context.cookies.get(SESSION_COOKIE)
+        user = self.sessions.verify(token, self.db.session_version)
+        if user is None:
+            return False
+        st.session_state.authenticated = True
+        st.session_state.user = user
+        st.session_state.session_token = token
+        return True
 
     def show_login_page(self):
         """Display login page"""
@@ -49,11 +99,18 @@ class AuthUI:
                 forgot_submitted = st.form_submit_button("Forgot Password?", use_container_width=True)
 
                 if login_submitted and email and password:
+                    client = self.client_id()
+                    wait = self.throttle.login(email, client)
+                    if wait:
+                        self.show_throttled(wait)
+                        return
                     with st.spinner("Authenticating..."):
                         user = self.db.authenticate_user(email, password)
                         if user:
+                            self.throttle.login_succeeded(email, client)
                             st.session_state.authenticated = True
                             st.session_state.user = user
+                            st.session_state.session_token = self.sessions.issue(user)
                             st.success("Login successful!")
                             # st.balloons()
                             time.sleep(1)
@@ -179,6 +236,11 @@ class AuthUI:
             st.error(f"{message}")
             return
 
+        wait = self.throttle.registration(self.client_id())
+        if wait:
+            self.show_throttled(wait)
+            return
+
         with st.spinner("Creating your account..."):
             if self.db.create_user(email, password):
                 st.success("Account created successfully! You can now login.")
@@ -195,6 +257,11 @@ class AuthUI:
             st.error("Please enter a valid email address")
             return
 
+        wait = self.throttle.password_reset(email, self.client_id())
+        if wait:
+            self.show_throttled(wait)
+            return
+
         with st.spinner("Processing password reset..."):
             user = self.db.get_user_by_email(email)
             if not user:
@@ -230,8 +297,15 @@ class AuthUI:
             st.markdown(f"Email:** {user['email']}")
             st.markdown(f"Member since:** {user['created_at'].strftime('%B %Y')}")
 
+            # Written on every rerun: a cookie set just before st.rerun() may not reach the browser
+            if st.session_state.get('session_token'):
+                self.set_session_cookie(st.session_state.session_token, self.sessions.ttl)
+
             # Logout button
             if st.button("Logout", use_container_width=True, type="primary"):
+                # Signs out every session of the user; other instances see it within USER_CACHE_TTL
+                self.db.revoke_sessions(user['email'])
+                self.set_session_cookie(None, 0)
                 # Clear all session state
                 for key in list(st.session_state.keys()):
                     del st.session_state[key]
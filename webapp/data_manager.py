@@ -8,9 +8,14 @@ Handles stock data fetching and technical indicator calculations
 import os
 import pandas as pd
 import streamlit as st
-from trading import TechnicalIndicatorTrading
 from helper import getBigQueryClient
-import duckdb
+import shared_modules  # puts scripts/ on the path for trading_calendar
+from trading_calendar import is_session, sessions_back
+import metrics
+from signal_refresher import SignalRefresher, SignalSnapshot
+
+QUERY_SECONDS = metrics.histogram("tradvisor_market_query_seconds", "Latency of market data queries")
+SIGNALS_SECONDS = metrics.histogram("tradvisor_generate_signals_seconds", "Duration of generate_signals")
 
 
 project_id = os.environ.get('PROJECT_ID')
@@ -20,62 +25,118 @@ if project_id:
 else:
     ENVIRONMENT = "on-premise"
 
-class DataManager:
-    """Manages stock data fetching and technical indicator calculations"""
+# Number of trading sessions of daily bars loaded for signal generation
+# (about a year). A 50-period MA and a 26/9 MACD need well over 60 sessions
+# of warm-up.
+HISTORY_SESSIONS = int(os.environ.get('HISTORY_SESSIONS', '250'))
 
-    @staticmethod
-    @st.cache_data(ttl=86400)
-    def load_data():
-        shares = None
-        dividends = None
-        trading_system = TechnicalIndicatorTrading()
-        if ENVIRONMENT == 'gcp':
-            query1 = f"""
-                        WITH latest_date AS (SELECT MAX(CAST(date AS DATE)) AS max_date FROM `{project_id}.stocks.SHARES`)
-                        SELECT * FROM `{project_id}.stocks.SHARES`
-                        WHERE CAST(date AS DATE) BETWEEN (SELECT max_date FROM latest_date) - INTERVAL '90' DAY
-                            AND (SELECT max_date FROM latest_date)
-                        ORDER BY date DESC
-                    """
+# Chart views: (table, lookback in days). Older periods are read from the
+# weekly/monthly aggregates precomputed at ingestion time (see scripts/helper.py).
+HISTORY_VIEWS = {
+    '1Y': ('SHARES', 365),
+    '5Y': ('SHARES_WEEKLY', 5 * 365),
+    'Max': ('SHARES_MONTHLY', None),
+}
 
-            query2 = f"SELECT * FROM bonds"
-            query3 = f"SELECT * FROM indices"
-            query4 = f"""
-                        SELECT * FROM `{project_id}.stocks.DIVIDENDS`
-                        WHERE DATE(date) = (SELECT MAX(DATE(date)) FROM `{project_id}.stocks.DIVIDENDS`)
-                    """
-            query5 = f"SELECT * FROM capitalizations"
+
+def table_name(table):
+    """Fully qualified table name for the current environment"""
+    if ENVIRONMENT == 'gcp':
+        return f"`{project_id}.stocks.{table}`"
+    return table
+
+
+def run_query(query):
+    """Run a query against the market data warehouse and return a DataFrame"""
+    if ENVIRONMENT == 'gcp':
+        with QUERY_SECONDS.time(backend='bigquery'):
             client = getBigQueryClient()
+            return client.query(query).to_dataframe()
 
-            shares = client.query(query1).to_dataframe()
-            dividends = client.query(query4).to_dataframe()
+    import duckdb
+    with QUERY_SECONDS.time(backend='duckdb'):
+        conn = duckdb.connect('database/financial_assets.db')
+        try:
+            return conn.execute(query).df()
+        finally:
+            conn.close()
 
-        if ENVIRONMENT == 'on-premise':
-            query1 = f"""
-                        WITH latest_date AS (SELECT MAX(CAST(date AS DATE)) AS max_date FROM SHARES)
-                        SELECT * FROM SHARES
-                        WHERE CAST(date AS DATE) BETWEEN (SELECT max_date FROM latest_date) - INTERVAL '90' DAY
-                            AND (SELECT max_date FROM latest_date)
-                        ORDER BY date DESC
-                    """
-            query4 = f"""
-                            SELECT * FROM DIVIDENDS
-                            WHERE CAST(date as DATE) = (SELECT MAX(CAST(date as DATE)) FROM DIVIDENDS)
-                        """
 
-            conn = duckdb.connect('database/financial_assets.db')
-            shares = conn.execute(query1).df()
-            dividends = conn.execute(query4).df()
+def build_signals(history_sessions: int = HISTORY_SESSIONS) -> pd.DataFrame:
+    """Query the daily bars and dividends, then run the full signal generation"""
+    from trading import TechnicalIndicatorTrading
+
+    trading_system = TechnicalIndicatorTrading()
+    shares_table = table_name('SHARES')
+    dividends_table = table_name('DIVIDENDS')
 
-        # bonds = conn.execute(query2).df()
-        # indices = conn.execute(query3).df()
+    latest_query = f"SELECT MAX(CAST(date AS DATE)) AS max_date FROM {shares_table}"
+    latest = pd.Timestamp(run_query(latest_query)['max_date'].iloc[0])
+    start = sessions_back(latest, int(history_sessions))
+    query1 = f"""
+                SELECT * FROM {shares_table}
+                WHERE CAST(date AS DATE) BETWEEN DATE '{start:%Y-%m-%d}' AND DATE '{latest:%Y-%m-%d}'
+                ORDER BY date DESC
+            """
+    query4 = f"""
+                SELECT * FROM {dividends_table}
+                WHERE CAST(date AS DATE) = (SELECT MAX(CAST(date AS DATE)) FROM {dividends_table})
+            """
 
-        # capitalizations = conn.execute(query5).df()
+    shares = run_query(query1)
+    dividends = run_query(query4)
+    # Snapshots scraped on closing days only repeat the previous session. Only weekends and confirmed
+    # holidays are dropped: a stored row on an estimated holiday may well be a real session.
+    shares = shares[is_session(shares['DATE'], confirmed_only=True)]
 
-        result = shares.merge(dividends[["SYMBOL", "DIVIDEND", "PAYMENT_DATE"]], on='SYMBOL', how='left')
-        # result = tr.get_trading_decisions(result)
+    result = shares.merge(dividends[["SYMBOL", "DIVIDEND", "PAYMENT_DATE"]], on='SYMBOL', how='left')
+    with SIGNALS_SECONDS.time():
         result = trading_system.generate_signals(result, adaptive_weights=True)
-        result['ROI'] = result['DIVIDEND'] / result['CLOSE']
+    result['ROI'] = result['DIVIDEND'] / result['CLOSE']
+
+    return result
 
-        # return shares, bonds, indices, dividends, capitalizations
-        return result
\ No newline at end of file
+
+@st.cache_resource
+def get_signal_refresher(history_sessions: int = HISTORY_SESSIONS) -> SignalRefresher:
+    """Process-wide refresher shared by all sessions"""
+    return SignalRefresher(lambda: build_signals(history_sessions))
+
+
+class DataManager:
+    """Manages stock data fetching and technical indicator calculations"""
+
+    @staticmethod
+    def load_data(history_sessions: int = HISTORY_SESSIONS) -> pd.DataFrame:
+        return DataManager.load_snapshot(history_sessions).frame
+
+    @staticmethod
+    def load_snapshot(history_sessions: int = HISTORY_SESSIONS) -> SignalSnapshot:
+        """Current signal frame with its age and build duration"""
+        return get_signal_refresher(history_sessions).get()
+
+    @staticmethod
+    @st.cache_data(ttl=86400)
+    def load_history(view: str = '1Y'):
+        """
+        Load closing prices for the price chart at the resolution of the view:
+        daily bars for the recent window, weekly/monthly aggregates beyond it.
+        Only the columns needed for charting are kept to bound memory.
+        """
+        table, days = HISTORY_VIEWS[view]
+        source = table_name(table)
+        window = ""
+        if days is not None:
+            window = f"""
+                    WHERE CAST(date AS DATE) >= (SELECT MAX(CAST(date AS DATE)) FROM {source}) - INTERVAL '{days}' DAY
+                    """
+        query = f"""
+                    SELECT SYMBOL, CAST(date AS DATE) AS DATE, CLOSE
+                    FROM {source}
+                    {window}
+                    ORDER BY SYMBOL, DATE
+                """
+        history = run_query(query)
+        history['SYMBOL'] = history['SYMBOL'].astype('category')
+        history['CLOSE'] = history['CLOSE'].astype('float32')
+        return history
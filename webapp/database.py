@@ -1,468 +1,332 @@
-# database.py - BigQuery Database Manager
+# database.py - User Database Manager
 
 """
 Database Manager for Trading Dashboard Authentication
-Handles BigQuery operations for user management
-"""
-
-import hashlib
-import secrets
-import pandas as pd
-from datetime import datetime, timedelta
-from typing import Dict, Optional
-from google.cloud import bigquery
-from google.oauth2 import service_account
-import streamlit as st
-import os
-import json
-import re
-from helper import create_gauge_chart, create_signal_pie_chart, create_stock_chart, getBigQueryClient
-import duckdb as db
-
-DB_BACKEND = os.getenv("DB_BACKEND", "duckdb").lower()
-
-"""
-Database Manager for Trading Dashboard Authentication
-Adaptive backend: DuckDB (on-premise) or BigQuery (cloud) depending on environment variable DB_BACKEND
+Handles user management on top of a pluggable user store (see user_store.py)
 """
 
+import logging
 import os
-import json
 import re
 import hashlib
 import secrets
-import pandas as pd
 from datetime import datetime, timedelta
 from typing import Dict, Optional
+import atexit
+import threading
 import streamlit as st
-
-# DB_BACKEND = os.getenv("DB_BACKEND", "duckdb").lower()
-ENVIRONMENT = None
-# DuckDB Implementation (local/on-premise)
-if os.environ.get('PROJECT_ID'):
-    ENVIRONMENT = 'gcp'
-else:
-    ENVIRONMENT = "on-premise"
-if ENVIRONMENT == "on-premise":
-    import duckdb
-
-    class DatabaseManager:
-        def __init__(self):
-            self.db_path = os.getenv("DUCKDB_PATH", "trading_dashboard.db")
-            self.conn = duckdb.connect("database/users.db")
-            self._ensure_tables()
-
-        def _ensure_tables(self):
-            create_table_sql = '''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id VARCHAR,
-                email VARCHAR UNIQUE,
-                password_hash VARCHAR,
-                salt VARCHAR,
-                created_at TIMESTAMP,
-                last_login TIMESTAMP,
-                reset_token VARCHAR,
-                reset_token_expires TIMESTAMP,
-                preferences VARCHAR
-            );
-            '''
-            self.conn.execute(create_table_sql)
-
-        def create_user(self, email: str, password: str) -> bool:
-            if self.get_user_by_email(email):
-                return False
-            salt = secrets.token_hex(32)
-            password_hash = self._hash_password(password, salt)
-            user_id = secrets.token_hex(16)
-            created_at = datetime.utcnow()
+from cachetools import TTLCache
+import metrics
+from user_store import UserStore, create_user_store
+
+logger = logging.getLogger(__name__)
+
+USER_DB_SECONDS = metrics.histogram("tradvisor_user_db_seconds", "Latency of user store operations")
+AUTH_ATTEMPTS = metrics.counter("tradvisor_auth_attempts_total", "Login attempts by result")
+USER_CACHE_LOOKUPS = metrics.counter("tradvisor_user_cache_total", "User cache lookups by result")
+SESSION_VERSION_LOOKUPS = metrics.counter("tradvisor_session_version_cache_total",
+                                          "Session version cache lookups by result")
+
+LAST_LOGIN_PENDING = metrics.counter("tradvisor_last_login_recorded_total", "Login events queued for write-behind")
+LAST_LOGIN_FLUSHED = metrics.counter("tradvisor_last_login_flushed_total", "Login events written by result")
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))
+# How long a session version is trusted without reading the store: the most a
+# revocation can take to reach the other processes
+SESSION_VERSION_TTL = int(os.getenv("SESSION_VERSION_TTL", "30"))
+
+LAST_LOGIN_FLUSH_INTERVAL = int(os.getenv("LAST_LOGIN_FLUSH_INTERVAL", "30"))
+
+
+def normalize_email(email: str) -> str:
+    """Canonical form of an email, used for every cache, queue and store key"""
+    return email.strip().lower()
+
+
+class LoginRecorder:
+    """
+    Write-behind queue for last_login timestamps.
+
+    Logins are recorded in memory (latest timestamp per email) and written by
+    `flush_fn` in one batch every `interval` seconds from a daemon thread, and
+    once more at interpreter exit. A failed batch is re-queued.
+    """
+
+    def __init__(self, flush_fn, interval: int = LAST_LOGIN_FLUSH_INTERVAL):
+        self._flush_fn = flush_fn
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="last-login-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, email: str, when: Optional[datetime] = None):
+        with self._lock:
+            self._pending[email] = when or datetime.utcnow()
+        LAST_LOGIN_PENDING.inc()
+
+    def flush(self):
+        """Write all pending logins in one batch"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
             try:
-                self.conn.execute(
-                    '''INSERT INTO users (user_id, email, password_hash, salt, created_at) VALUES (?, ?, ?, ?, ?)''',
-                    [user_id, email.lower(), password_hash, salt, created_at]
-                )
-                return True
+                self._flush_fn(batch)
+                LAST_LOGIN_FLUSHED.inc(len(batch), result='ok')
             except Exception as e:
-                st.error(f"Error creating user (DuckDB): {str(e)}")
+                LAST_LOGIN_FLUSHED.inc(len(batch), result='error')
+                logger.warning("Error flushing %d last logins, kept for the next flush: %s", len(batch), e)
+                with self._lock:
+                    for email, when in batch.items():
+                        if email not in self._pending or self._pending[email] < when:
+                            self._pending[email] = when
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            self.flush()
+
+
+class UserCache:
+    """Bounded, TTL-based cache of user records (or other per-user values) keyed by normalized email"""
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: int = USER_CACHE_TTL, lookups=USER_CACHE_LOOKUPS):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._lookups = lookups
+
+    def get(self, email: str):
+        with self._lock:
+            user = self._cache.get(email)
+        self._lookups.inc(result='hit' if user is not None else 'miss')
+        return user
+
+    def put(self, email: str, user):
+        with self._lock:
+            self._cache[email] = user
+
+    def invalidate(self, email: str):
+        with self._lock:
+            self._cache.pop(email, None)
+
+
+class DatabaseManager:
+    """
+    User management (hashing, validation, caching) on top of a UserStore.
+    Emails are normalized once, on entry to the public methods; the cache,
+    the last-login queue and the store only ever see the normalized form.
+    """
+
+    def __init__(self, store: Optional[UserStore] = None):
+        try:
+            self.store = store or create_user_store()
+        except Exception as e:
+            st.error(f"Database connection error: {str(e)}")
+            self.store = None
+        self.user_cache = UserCache()
+        self.session_versions = UserCache(ttl=SESSION_VERSION_TTL, lookups=SESSION_VERSION_LOOKUPS)
+        self.login_recorder = LoginRecorder(self._flush_last_logins)
+
+    def _timed(self, operation: str):
+        return USER_DB_SECONDS.time(backend=self.store.name if self.store else 'none', operation=operation)
+
+    def create_user(self, email: str, password: str) -> bool:
+        """Create a new user account"""
+        email = normalize_email(email)
+        try:
+            # Check if user already exists
+            if self.get_user_by_email(email):
                 return False
 
-        def authenticate_user(self, email: str, password: str) -> Optional[Dict]:
+            # Generate salt and hash password
+            salt = secrets.token_hex(32)
+            record = {
+                'user_id': secrets.token_hex(16),
+                'email': email,
+                'password_hash': self._hash_password(password, salt),
+                'salt': salt,
+                'created_at': datetime.utcnow(),
+                'session_version': 0,
+            }
+            with self._timed('create_user'):
+                self.store.insert_user(record)
+            self.user_cache.invalidate(email)
+            return True
+
+        except Exception as e:
+            st.error(f"Error creating user: {str(e)}")
+            return False
+
+    def authenticate_user(self, email: str, password: str) -> Optional[Dict]:
+        """Authenticate user login"""
+        email = normalize_email(email)
+        try:
             user = self.get_user_by_email(email)
             if not user:
+                AUTH_ATTEMPTS.inc(result='unknown_user')
                 return None
+
+            # Verify password
             password_hash = self._hash_password(password, user['salt'])
             if password_hash == user['password_hash']:
-                self.conn.execute(
-                    'UPDATE users SET last_login=? WHERE email=?',
-                    [datetime.utcnow(), email.lower()]
-                )
+                # Update last login (written behind in batches)
+                self.login_recorder.record(email)
+                AUTH_ATTEMPTS.inc(result='success')
                 return {
                     'user_id': user['user_id'],
                     'email': user['email'],
-                    'created_at': user['created_at']
+                    'created_at': user['created_at'],
+                    'session_version': user.get('session_version') or 0,
                 }
+            AUTH_ATTEMPTS.inc(result='bad_password')
             return None
 
-        def get_user_by_email(self, email: str) -> Optional[Dict]:
-            try:
-                result = self.conn.execute(
-                    'SELECT * FROM users WHERE email=? LIMIT 1', [email.lower()]
-                ).fetchone()
-                if result:
-                    columns = [x[0] for x in self.conn.description]
-                    return dict(zip(columns, result))
-                return None
-            except Exception as e:
-                st.error(f"Error retrieving user from DuckDB: {str(e)}")
-                return None
-
-        def _update_last_login(self, email: str):
-            self.conn.execute(
-                'UPDATE users SET last_login=? WHERE email=?',
-                [datetime.utcnow(), email.lower()]
-            )
+        except Exception as e:
+            AUTH_ATTEMPTS.inc(result='error')
+            st.error(f"Authentication error: {str(e)}")
+            return None
 
-        def create_reset_token(self, email: str) -> Optional[str]:
+    def get_user_by_email(self, email: str) -> Optional[Dict]:
+        """Get user by email address, reading through the user cache"""
+        email = normalize_email(email)
+        user = self.user_cache.get(email)
+        if user is not None:
+            return user
+        try:
+            with self._timed('get_user'):
+                user = self.store.get_user(email)
+        except Exception as e:
+            st.error(f"Error getting user: {str(e)}")
+            return None
+        if user is not None:
+            self.user_cache.put(email, user)
+        return user
+
+    def session_version(self, email: str) -> Optional[int]:
+        """
+        Current session version of a user, or None for an unknown user,
+        cached for SESSION_VERSION_TTL seconds. Restoring a session therefore
+        costs no I/O while the user's version is cached, and one store read
+        per SESSION_VERSION_TTL otherwise. A revocation applies at once in
+        the process that made it and within SESSION_VERSION_TTL seconds in
+        the others.
+        """
+        email = normalize_email(email)
+        version = self.session_versions.get(email)
+        if version is not None:
+            return version
+        try:
+            with self._timed('get_session_version'):
+                user = self.store.get_user(email)
+        except Exception as e:
+            st.error(f"Error getting user: {str(e)}")
+            return None
+        if user is None:
+            return None
+        version = user.get('session_version') or 0
+        self.session_versions.put(email, version)
+        return version
+
+    def _invalidate(self, email: str):
+        self.user_cache.invalidate(email)
+        self.session_versions.invalidate(email)
+
+    def revoke_sessions(self, email: str) -> bool:
+        """Revoke every session token issued to a user so far"""
+        email = normalize_email(email)
+        try:
+            with self._timed('revoke_sessions'):
+                updated = self.store.increment_session_version(email)
+            self._invalidate(email)
+            return updated
+        except Exception as e:
+            st.error(f"Error signing out: {str(e)}")
+            return False
+
+    def _flush_last_logins(self, logins: Dict[str, datetime]):
+        with self._timed('update_last_logins'):
+            self.store.update_last_logins(logins)
+
+    def create_reset_token(self, email: str) -> Optional[str]:
+        """Create password reset token"""
+        email = normalize_email(email)
+        try:
             token = secrets.token_urlsafe(32)
             expires = datetime.utcnow() + timedelta(hours=1)
-            self.conn.execute(
-                'UPDATE users SET reset_token=?, reset_token_expires=? WHERE email=?',
-                [token, expires, email.lower()]
-            )
-            user = self.get_user_by_email(email)
-            return token if user and user.get("reset_token") == token else None
 
-        def reset_password_with_token(self, token: str, new_password: str) -> bool:
-            user = self.conn.execute(
-                'SELECT email, reset_token_expires FROM users WHERE reset_token=? LIMIT 1', [token]
-            ).fetchone()
-            if not user:
+            with self._timed('create_reset_token'):
+                updated = self.store.update_user(email, {'reset_token': token, 'reset_token_expires': expires})
+            self.user_cache.invalidate(email)
+            return token if updated else None
+
+        except Exception as e:
+            st.error(f"Error creating reset token: {str(e)}")
+            return None
+
+    def reset_password_with_token(self, token: str, new_password: str) -> bool:
+        """Reset password using valid token"""
+        try:
+            with self._timed('get_user_by_reset_token'):
+                user = self.store.get_user_by_reset_token(token)
+            if not user or not user['reset_token_expires']:
                 return False
-            email, expires = user
+            expires = user['reset_token_expires']
+            if expires.tzinfo is not None:
+                expires = expires.replace(tzinfo=None)
             if expires < datetime.utcnow():
                 return False
+
+            # Update password, clear reset token and revoke existing sessions
             salt = secrets.token_hex(32)
-            password_hash = self._hash_password(new_password, salt)
-            self.conn.execute(
-                'UPDATE users SET password_hash=?, salt=?, reset_token=NULL, reset_token_expires=NULL WHERE email=?',
-                [password_hash, salt, email]
-            )
+            with self._timed('reset_password'):
+                self.store.increment_session_version(user['email'], {
+                    'password_hash': self._hash_password(new_password, salt),
+                    'salt': salt,
+                    'reset_token': None,
+                    'reset_token_expires': None,
+                })
+            self._invalidate(user['email'])
             return True
 
-        @staticmethod
-        def _hash_password(password: str, salt: str) -> str:
-            return hashlib.sha256((password + salt).encode()).hexdigest()
-
-        @staticmethod
-        def validate_email(email: str) -> bool:
-            pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-            return re.match(pattern, email) is not None
-
-        @staticmethod
-        def validate_password(password: str) -> tuple:
-            if len(password) < 8:
-                return False, "Password must be at least 8 characters"
-            if not re.search(r"[A-Z]", password):
-                return False, "Password must contain at least one uppercase letter"
-            if not re.search(r"[a-z]", password):
-                return False, "Password must contain at least one lowercase letter"
-            if not re.search(r"\d", password):
-                return False, "Password must contain at least one number"
-            if not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
-                return False, "Password must contain at least one special character"
-            return True, "Password is strong"
-
-else:
-
-    class DatabaseManager:
-        """BigQuery database manager for user authentication"""
-
-        def __init__(self):
-            try:
-                # Load BigQuery credentials
-                self.project_id = os.environ.get('PROJECT_ID')
-                self.environment = 'gcp'
-                self.client = getBigQueryClient()
-                self.project_id = os.environ.get('PROJECT_ID')
-                self.dataset_id = "trading_dashboard"
-                self.table_id = "users"
-
-                # Ensure dataset and table exist
-                self._create_dataset_if_not_exists()
-                self._create_users_table_if_not_exists()
-
-            except Exception as e:
-                st.error(f"Database connection error1: {str(e)}")
-                self.client = None
-
-        def _create_dataset_if_not_exists(self):
-            """Create BigQuery dataset if it doesn't exist"""
-            try:
-                dataset_ref = self.client.dataset(self.dataset_id)
-                try:
-                    self.client.get_dataset(dataset_ref)
-                except:
-                    dataset = bigquery.Dataset(dataset_ref)
-                    dataset.location = "EU"
-                    dataset.description = "Tradvisor user authentication data"
-                    self.client.create_dataset(dataset, timeout=30)
-            except Exception as e:
-                st.error(f"Error creating dataset: {str(e)}")
-
-        def _create_users_table_if_not_exists(self):
-            """Create users table if it doesn't exist"""
-            try:
-                table_ref = self.client.dataset(self.dataset_id).table(self.table_id)
-                try:
-                    self.client.get_table(table_ref)
-                except:
-                    schema = [
-                        bigquery.SchemaField("user_id", "STRING", mode="REQUIRED"),
-                        bigquery.SchemaField("email", "STRING", mode="REQUIRED"),
-                        bigquery.SchemaField("password_hash", "STRING", mode="REQUIRED"),
-                        bigquery.SchemaField("salt", "STRING", mode="REQUIRED"),
-                        bigquery.SchemaField("created_at", "TIMESTAMP", mode="REQUIRED"),
-                        bigquery.SchemaField("last_login", "TIMESTAMP", mode="NULLABLE"),
-                        bigquery.SchemaField("reset_token", "STRING", mode="NULLABLE"),
-                        bigquery.SchemaField("reset_token_expires", "TIMESTAMP", mode="NULLABLE"),
-                        bigquery.SchemaField("preferences", "JSON", mode="NULLABLE"),
-                    ]
-
-                    table = bigquery.Table(table_ref, schema=schema)
-                    table = self.client.create_table(table)
-            except Exception as e:
-                st.error(f"Error creating users table: {str(e)}")
-
-        def create_user(self, email: str, password: str) -> bool:
-            """Create a new user account"""
-            try:
-                # Check if user already exists
-                if self.get_user_by_email(email):
-                    return False
-
-                # Generate salt and hash password
-                salt = secrets.token_hex(32)
-                password_hash = self._hash_password(password, salt)
-                user_id = secrets.token_hex(16)
-
-                # Insert user into BigQuery
-                query = f"""
-                INSERT INTO `{self.project_id}.{self.dataset_id}.{self.table_id}` 
-                (user_id, email, password_hash, salt, created_at)
-                VALUES (@user_id, @email, @password_hash, @salt, @created_at)
-                """
-
-                job_config = bigquery.QueryJobConfig(
-                    query_parameters=[
-                        bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
-                        bigquery.ScalarQueryParameter("email", "STRING", email.lower()),
-                        bigquery.ScalarQueryParameter("password_hash", "STRING", password_hash),
-                        bigquery.ScalarQueryParameter("salt", "STRING", salt),
-                        bigquery.ScalarQueryParameter("created_at", "TIMESTAMP", datetime.utcnow()),
-                    ]
-                )
-
-                query_job = self.client.query(query, job_config=job_config)
-                query_job.result()
-                return True
-
-            except Exception as e:
-                st.error(f"Error creating user: {str(e)}")
-                return False
-
-        def authenticate_user(self, email: str, password: str) -> Optional[Dict]:
-            """Authenticate user login"""
-            try:
-                user = self.get_user_by_email(email)
-                if not user:
-                    return None
-
-                # Verify password
-                password_hash = self._hash_password(password, user['salt'])
-                if password_hash == user['password_hash']:
-                    # Update last login
-                    self._update_last_login(email)
-                    return {
-                        'user_id': user['user_id'],
-                        'email': user['email'],
-                        'created_at': user['created_at']
-                    }
-                return None
-
-            except Exception as e:
-                st.error(f"Authentication error: {str(e)}")
-                return None
-
-        def get_user_by_email(self, email: str) -> Optional[Dict]:
-            """Get user by email address"""
-            try:
-                query = f"""
-                SELECT user_id, email, password_hash, salt, created_at, preferences
-                FROM `{self.project_id}.{self.dataset_id}.{self.table_id}` 
-                WHERE email = @email
-                LIMIT 1
-                """
-
-                job_config = bigquery.QueryJobConfig(
-                    query_parameters=[
-                        bigquery.ScalarQueryParameter("email", "STRING", email.lower())
-                    ]
-                )
-
-                query_job = self.client.query(query, job_config=job_config)
-                results = query_job.result()
-
-                for row in results:
-                    return {
-                        'user_id': row.user_id,
-                        'email': row.email,
-                        'password_hash': row.password_hash,
-                        'salt': row.salt,
-                        'created_at': row.created_at,
-                        'preferences': row.preferences
-                    }
-                return None
-
-            except Exception as e:
-                st.error(f"Error getting user: {str(e)}")
-                return None
-
-        def _update_last_login(self, email: str):
-            """Update user's last login timestamp"""
-            try:
-                query = f"""
-                UPDATE `{self.project_id}.{self.dataset_id}.{self.table_id}` 
-                SET last_login = @last_login
-                WHERE email = @email
-                """
-
-                job_config = bigquery.QueryJobConfig(
-                    query_parameters=[
-                        bigquery.ScalarQueryParameter("last_login", "TIMESTAMP", datetime.utcnow()),
-                        bigquery.ScalarQueryParameter("email", "STRING", email.lower())
-                    ]
-                )
-
-                query_job = self.client.query(query, job_config=job_config)
-                query_job.result()
-
-            except Exception as e:
-                st.error(f"Error updating last login: {str(e)}")
-
-        def create_reset_token(self, email: str) -> Optional[str]:
-            """Create password reset token"""
-            try:
-                token = secrets.token_urlsafe(32)
-                expires = datetime.utcnow() + timedelta(hours=1)
-
-                query = f"""
-                UPDATE `{self.project_id}.{self.dataset_id}.{self.table_id}` 
-                SET reset_token = @token, reset_token_expires = @expires
-                WHERE email = @email
-                """
-
-                job_config = bigquery.QueryJobConfig(
-                    query_parameters=[
-                        bigquery.ScalarQueryParameter("token", "STRING", token),
-                        bigquery.ScalarQueryParameter("expires", "TIMESTAMP", expires),
-                        bigquery.ScalarQueryParameter("email", "STRING", email.lower())
-                    ]
-                )
-
-                query_job = self.client.query(query, job_config=job_config)
-                result = query_job.result()
-
-                if query_job.num_dml_affected_rows > 0:
-                    return token
-                return None
-
-            except Exception as e:
-                st.error(f"Error creating reset token: {str(e)}")
-                return None
-
-        def reset_password_with_token(self, token: str, new_password: str) -> bool:
-            """Reset password using valid token"""
-            try:
-                # Find user with valid token
-                utc_now = datetime.utcnow()
-                query = f"""
-                SELECT email
-                FROM `{self.project_id}.{self.dataset_id}.{self.table_id}` 
-                WHERE reset_token = @token AND reset_token_expires > @utc_now
-                LIMIT 1
-                """
-
-                job_config = bigquery.QueryJobConfig(
-                    query_parameters=[
-                        bigquery.ScalarQueryParameter("token", "STRING", token),
-                        bigquery.ScalarQueryParameter("now", "TIMESTAMP", datetime.utcnow())
-                    ]
-                )
-
-                query_job = self.client.query(query, job_config=job_config)
-                results = query_job.result()
-
-                user_email = None
-                for row in results:
-                    user_email = row.email
-                    break
-
-                if not user_email:
-                    return False
-
-                # Update password and clear reset token
-                salt = secrets.token_hex(32)
-                password_hash = self._hash_password(new_password, salt)
-
-                update_query = f"""
-                UPDATE `{self.project_id}.{self.dataset_id}.{self.table_id}` 
-                SET password_hash = @password_hash, salt = @salt, 
-                    reset_token = NULL, reset_token_expires = NULL
-                WHERE email = @email
-                """
-
-                job_config = bigquery.QueryJobConfig(
-                    query_parameters=[
-                        bigquery.ScalarQueryParameter("password_hash", "STRING", password_hash),
-                        bigquery.ScalarQueryParameter("salt", "STRING", salt),
-                        bigquery.ScalarQueryParameter("email", "STRING", user_email)
-                    ]
-                )
-
-                query_job = self.client.query(update_query, job_config=job_config)
-                query_job.result()
-                return True
-
-            except Exception as e:
-                st.error(f"Error resetting password: {str(e)}")
-                return False
+        except Exception as e:
+            st.error(f"Error resetting password: {str(e)}")
+            return False
 
-        @staticmethod
-        def _hash_password(password: str, salt: str) -> str:
-            """Hash password with salt using SHA-256"""
-            return hashlib.sha256((password + salt).encode()).hexdigest()
+    @staticmethod
+    def _hash_password(password: str, salt: str) -> str:
+        """Hash password with salt using SHA-256"""
+        return hashlib.sha256((password + salt).encode()).hexdigest()
 
-        @staticmethod
-        def validate_email(email: str) -> bool:
-            """Validate email format"""
-            pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-            return re.match(pattern, email) is not None
+    @staticmethod
+    def validate_email(email: str) -> bool:
+        """Validate email format"""
+        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+        return re.match(pattern, email) is not None
 
-        @staticmethod
-        def validate_password(password: str) -> tuple[bool, str]:
-            """Validate password strength"""
-            if len(password) < 8:
-                return False, "Password must be at least 8 characters long"
+    @staticmethod
+    def validate_password(password: str) -> tuple[bool, str]:
+        """Validate password strength"""
+        if len(password) < 8:
+            return False, "Password must be at least 8 characters long"
 
-            if not re.search(r"[A-Z]", password):
-                return False, "Password must contain at least one uppercase letter"
+        if not re.search(r"[A-Z]", password):
+            return False, "Password must contain at least one uppercase letter"
 
-            if not re.search(r"[a-z]", password):
-                return False, "Password must contain at least one lowercase letter"
+        if not re.search(r"[a-z]", password):
+            return False, "Password must contain at least one lowercase letter"
 
-            if not re.search(r"\d", password):
-                return False, "Password must contain at least one number"
+        if not re.search(r"\d", password):
+            return False, "Password must contain at least one number"
 
-            if not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
-                return False, "Password must contain at least one special character"
+        if not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
+            return False, "Password must contain at least one special character"
 
-            return True, "Password is strong"
\ No newline at end of file
+        return True, "Password is strong"
@@ -0,0 +1,191 @@
+# digest.py - Signal Digest Emails
+
+"""
+Signal Digest Emails for Trading Dashboard
+Emails every subscribed user the recommendation changes (BUY/SELL/HOLD) on
+their watchlist after an ingest. Changes are computed once from the signal
+frame, each distinct digest is rendered once and shared by every user whose
+watchlist yields the same changes, and delivery goes through the email
+queue's pooled SMTP workers.
+
+Users subscribe through their preferences:
+    {"digest": true, "watchlist": ["SNTS", "ORAC"]}
+A missing or empty watchlist means every symbol.
+
+Each digest is keyed per user and market date (digest:<date>:<email>), so a
+run that is repeated, or overlaps another, sends it at most once: the outbox
+ignores a key it already holds, and the date is recorded in the user's
+last_digest once delivered, which survives the outbox of an ephemeral
+container. In the cloud the shares workflow runs this as the digest Cloud Run
+job after insert_shares (terraform/service.tf).
+
+Usage (from the repository root, after ingestion):
+    python webapp/digest.py [--workers 8]
+"""
+
+import argparse
+import html
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import pandas as pd
+
+import metrics
+
+DIGESTS_RENDERED = metrics.counter("tradvisor_digests_rendered_total", "Distinct digest bodies rendered")
+DIGESTS_QUEUED = metrics.counter("tradvisor_digests_queued_total", "Digest emails queued")
+
+
+def recommendation_changes(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Symbols whose recommendation on the latest market date differs from the
+    previous session, indexed by SYMBOL with PREVIOUS and RECOMMENDATION.
+    """
+    columns = [c for c in ('SYMBOL', 'NAME', 'DATE', 'RECOMMENDATION', 'CONFIDENCE', 'CLOSE') if c in frame.columns]
+    bars = frame[columns].sort_values(['SYMBOL', 'DATE'])
+    bars['PREVIOUS'] = bars.groupby('SYMBOL', observed=True)['RECOMMENDATION'].shift()
+    latest = bars.groupby('SYMBOL', observed=True).tail(1)
+    # Symbols that did not trade on the latest date keep their old signal
+    latest = latest[latest['DATE'] == bars['DATE'].max()]
+    changed = latest[latest['PREVIOUS'].notna() & (latest['RECOMMENDATION'] != latest['PREVIOUS'])]
+    return changed.set_index('SYMBOL')
+
+
+def digest_subscribers(preferences: Dict[str, Dict]) -> Dict[str, Optional[FrozenSet[str]]]:
+    """Email -> watchlist (None for every symbol) of users subscribed to the digest"""
+    return {
+        email: frozenset(prefs['watchlist']) if prefs.get('watchlist') else None
+        for email, prefs in preferences.items() if prefs.get('digest')
+    }
+
+
+def digest_key(day: str, email: str) -> str:
+    """Idempotency key of one user's digest for a market date"""
+    return f"digest:{day}:{email}"
+
+
+def plan_digests(changes: pd.DataFrame, subscribers: Dict[str, Optional[FrozenSet[str]]]) -> Dict[Tuple, List[str]]:
+    """Group recipients by the exact set of changed symbols they should receive"""
+    changed = frozenset(changes.index)
+    everything = tuple(sorted(changed))
+    plan = defaultdict(list)
+    if not changed:
+        return plan
+    for email, watchlist in subscribers.items():
+        symbols = everything if watchlist is None else tuple(sorted(changed & watchlist))
+        if symbols:
+            plan[symbols].append(email)
+    return plan
+
+
+def render_digest(changes: pd.DataFrame, symbols: Tuple[str, ...]) -> Tuple[str, str]:
+    """Subject and HTML body for one digest content"""
+    date = pd.to_datetime(changes['DATE'].iloc[0]).strftime('%d %B %Y')
+    subject = f"Tradvisor signals for {date}: {len(symbols)} change{'s' if len(symbols) > 1 else ''}"
+
+    colors = {'BUY': '#4CAF50', 'SELL': '#E53935', 'HOLD': '#757575'}
+    rows = []
+    for symbol in symbols:
+        change = changes.loc[symbol]
+        name = html.escape(str(change['NAME'])) if 'NAME' in change.index else ''
+        close = f"{change['CLOSE']:,.0f}" if 'CLOSE' in change.index else ''
+        rows.append(f"""
+                    <tr>
+                        <td style="padding: 8px; border-bottom: 1px solid #eee;"><strong>{html.escape(symbol)}</strong><br>
+                            <span style="color: #999; font-size: 12px;">{name}</span></td>
+                        <td style="padding: 8px; border-bottom: 1px solid #eee; color: {colors.get(change['PREVIOUS'], '#333')};">{change['PREVIOUS']}</td>
+                        <td style="padding: 8px; border-bottom: 1px solid #eee; color: {colors.get(change['RECOMMENDATION'], '#333')};"><strong>{change['RECOMMENDATION']}</strong></td>
+                        <td style="padding: 8px; border-bottom: 1px solid #eee; text-align: right;">{close}</td>
+                    </tr>""")
+
+    html_body = f"""
+            <html>
+            <body style="font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5;">
+                <div style="max-width: 600px; margin: 0 auto; background-color: white; padding: 40px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
+                    <div style="text-align: center; margin-bottom: 30px;">
+                        <h1 style="color: #2E86AB; margin: 0; font-size: 28px;">Tradvisor</h1>
+                        <p style="color: #666; margin-top: 10px;">Signal changes on your watchlist - {date}</p>
+                    </div>
+
+                    <table style="width: 100%; border-collapse: collapse; color: #555;">
+                        <tr style="text-align: left; color: #333;">
+                            <th style="padding: 8px;">Symbol</th><th style="padding: 8px;">Was</th>
+                            <th style="padding: 8px;">Now</th><th style="padding: 8px; text-align: right;">Close</th>
+                        </tr>{''.join(rows)}
+                    </table>
+
+                    <p style="color: #999; font-size: 12px; line-height: 1.6; margin-top: 30px;">
+                        Signals are generated automatically from technical indicators and are not investment advice.
+                        To stop receiving this digest, turn it off in your account preferences.
+                    </p>
+                </div>
+            </body>
+            </html>
+            """
+    return subject, html_body
+
+
+def send_digests(frame: pd.DataFrame, preferences: Dict[str, Dict], queue,
+                 last_digests: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Compute, render and queue the digests of the latest market date, skipping
+    users whose last_digests entry is already that date. Returns counts for
+    reporting, the date, and the idempotency key -> email of each digest.
+    """
+    day = pd.Timestamp(frame['DATE'].max()).date().isoformat()
+    changes = recommendation_changes(frame)
+    subscribers = digest_subscribers(preferences)
+    pending = {email: watchlist for email, watchlist in subscribers.items()
+               if (last_digests or {}).get(email) != day}
+    plan = plan_digests(changes, pending)
+
+    messages, keys = [], []
+    for symbols, recipients in plan.items():
+        subject, html_body = render_digest(changes, symbols)
+        DIGESTS_RENDERED.inc()
+        messages.extend((email, subject, html_body) for email in recipients)
+        keys.extend(digest_key(day, email) for email in recipients)
+    queued = queue.enqueue_many(messages, keys) if messages else 0
+    DIGESTS_QUEUED.inc(queued)
+    return {'day': day, 'changes': len(changes), 'subscribers': len(subscribers),
+            'already_sent': len(subscribers) - len(pending), 'rendered': len(plan), 'queued': queued,
+            'recipients': dict(zip(keys, (email for email, _, _ in messages)))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8, help="concurrent SMTP connections")
+    parser.add_argument("--timeout", type=float, default=1800, help="seconds to wait for delivery")
+    args = parser.parse_args()
+
+    from data_manager import build_signals
+    from email_manager import EmailManager
+    from user_store import create_user_store
+
+    email = EmailManager(workers=args.workers)
+    if not email.queue:
+        print("Email service not configured (SMTP_USERNAME / SMTP_PASSWORD)")
+        return 1
+
+    start = time.perf_counter()
+    store = create_user_store()
+    stats = send_digests(build_signals(), store.list_preferences(), email.queue, store.last_digests())
+    print(f"{stats['day']}: {stats['changes']} signal changes, {stats['subscribers']} subscribers "
+          f"({stats['already_sent']} already sent): {stats['queued']} digests queued "
+          f"from {stats['rendered']} distinct renders")
+
+    drained = email.queue.drain(args.timeout)
+    email.queue.close()
+    recipients = stats['recipients']
+    delivered = [recipients[key] for key in email.queue.outbox.sent_keys(list(recipients))]
+    if delivered:
+        store.update_last_digests(delivered, stats['day'])
+    print(f"Delivery {'finished' if drained else 'still pending'} after {time.perf_counter() - start:.1f}s: "
+          f"{len(delivered)} of {len(recipients)} digests delivered")
+    return 0 if drained else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
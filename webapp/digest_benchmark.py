@@ -0,0 +1,94 @@
+"""
+Digest throughput benchmark
+Sends the signal digest to a population of synthetic subscribers through the
+email queue against an in-process SMTP sink (the load test's), and checks the
+end-to-end time against a budget.
+
+Usage (from the webapp directory):
+    python digest_benchmark.py [--users 10000] [--symbols 45] [--workers 8] [--budget-seconds 180]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from digest import send_digests
+from email_queue import EmailQueue, Outbox, SMTPConnection
+from load_test import start_smtp_sink
+
+
+def synthetic_frame(symbols, rng):
+    """Two sessions of recommendations, roughly a third of them changing"""
+    rows = []
+    for i in range(symbols):
+        symbol = f"SYM{i:02d}"
+        previous = rng.choice(['BUY', 'SELL', 'HOLD'])
+        current = rng.choice(['BUY', 'SELL', 'HOLD']) if rng.random() < 0.35 else previous
+        for date, recommendation in (('2024-06-03', previous), ('2024-06-04', current)):
+            rows.append({'SYMBOL': symbol, 'NAME': f"Company {i}", 'DATE': pd.Timestamp(date),
+                         'RECOMMENDATION': recommendation, 'CONFIDENCE': rng.random(),
+                         'CLOSE': rng.uniform(500, 20000)})
+    return pd.DataFrame(rows)
+
+
+def synthetic_preferences(users, symbols, rng):
+    """Mostly subscribed users, each watching a handful of symbols (some everything)"""
+    universe = [f"SYM{i:02d}" for i in range(symbols)]
+    preferences = {}
+    for i in range(users):
+        if rng.random() < 0.1:
+            continue
+        watchlist = [] if rng.random() < 0.2 else rng.sample(universe, rng.randint(1, 5))
+        preferences[f"user{i}@example.com"] = {'digest': True, 'watchlist': watchlist}
+    return preferences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--symbols", type=int, default=45)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--budget-seconds", type=float, default=180)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    frame = synthetic_frame(args.symbols, rng)
+    preferences = synthetic_preferences(args.users, args.symbols, rng)
+
+    sink = start_smtp_sink()
+    port = sink.server_address[1]
+    with tempfile.TemporaryDirectory() as workdir:
+        queue = EmailQueue(Outbox(os.path.join(workdir, "outbox.sqlite")),
+                           lambda: SMTPConnection("127.0.0.1", port, starttls=False),
+                           "tradvisor@example.com", workers=args.workers, poll_interval=0.05).start()
+
+        start = time.perf_counter()
+        stats = send_digests(frame, preferences, queue)
+        queued = time.perf_counter() - start
+        drained = queue.drain(args.budget_seconds * 2)
+        elapsed = time.perf_counter() - start
+        queue.close()
+    sink.shutdown()
+
+    print(f"{stats['changes']} changes, {stats['subscribers']} subscribers, "
+          f"{stats['rendered']} distinct digests rendered for {stats['queued']} emails")
+    print(f"queued in {queued:.2f}s, delivered {sink.messages} in {elapsed:.1f}s "
+          f"({sink.messages / elapsed:.0f} emails/s over {sink.connections} connections)")
+
+    if not drained or sink.messages != stats['queued']:
+        print(f"FAILED: {sink.messages} of {stats['queued']} digests delivered")
+        return 1
+    if elapsed > args.budget_seconds:
+        print(f"FAILED: {elapsed:.1f}s exceeds the {args.budget_seconds}s budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,33 +2,69 @@
 
 """
 Email Manager for Trading Dashboard
-Handles password reset email notifications
+Handles password reset email notifications. Messages are queued in the
+outbox and sent in the background (see email_queue.py). Where the outbox
+would not be durable (a Cloud Run service without EMAIL_OUTBOX_PATH) they
+are sent directly instead, while the user waits, so none is lost queued.
 """
 
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import os, json
+from typing import Optional
 import streamlit as st
+from email_queue import EMAIL_POOL_SIZE, EmailQueue, Outbox, OutboxNotDurable, SMTPConnection, build_message
 
-secrets_json_str = json.loads(os.getenv('TRADVISOR_GMAIL_ACC_SECRET'))
-os.environ['SMTP_USERNAME'] = secrets_json_str['SMTP_USERNAME']
-os.environ['SMTP_PASSWORD'] = secrets_json_str['SMTP_PASSWORD']
+
+def load_smtp_secret():
+    """Export SMTP credentials from the TRADVISOR_GMAIL_ACC_SECRET JSON, if set"""
+    secret = os.getenv('TRADVISOR_GMAIL_ACC_SECRET')
+    if not secret:
+        return
+    secrets_json_str = json.loads(secret)
+    os.environ['SMTP_USERNAME'] = secrets_json_str['SMTP_USERNAME']
+    os.environ['SMTP_PASSWORD'] = secrets_json_str['SMTP_PASSWORD']
 
 class EmailManager:
     """Email manager for password reset functionality"""
 
-    def __init__(self):
+    def __init__(self, queue: Optional[EmailQueue] = None, workers: int = EMAIL_POOL_SIZE):
+        load_smtp_secret()
         self.smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
         self.smtp_port = int(os.getenv("SMTP_PORT", "587"))
         self.smtp_username = os.getenv("SMTP_USERNAME")
         self.smtp_password = os.getenv("SMTP_PASSWORD")
+        self.smtp_starttls = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
         self.from_email = os.getenv("FROM_EMAIL", self.smtp_username)
+        self.queue = queue
+        self.send_directly = False
+        if self.queue is None and self.smtp_username and self.smtp_password:
+            try:
+                self.queue = EmailQueue(Outbox(), self.connect, self.from_email, workers=workers).start()
+            except OutboxNotDurable as e:
+                print(f"{e}; sending emails directly")
+                self.send_directly = True
+            except Exception as e:
+                st.error(f"Email queue error: {str(e)}")
+
+    def connect(self) -> SMTPConnection:
+        """New persistent SMTP connection with the configured settings"""
+        return SMTPConnection(self.smtp_server, self.smtp_port, self.smtp_username, self.smtp_password,
+                              starttls=self.smtp_starttls)
+
+    def send(self, to_email: str, subject: str, html_body: str):
+        """Queue a message, or send it before returning when there is no durable outbox"""
+        if self.queue:
+            self.queue.enqueue(to_email, subject, html_body)
+            return
+        connection = self.connect()
+        try:
+            connection.send(build_message(self.from_email, to_email, subject, html_body))
+        finally:
+            connection.close()
 
     def send_reset_email(self, to_email: str, reset_token: str, base_url: str = "http://localhost:8501") -> bool:
-        """Send password reset email"""
+        """Queue password reset email; True once it is safely in the outbox, or sent"""
         try:
-            if not self.smtp_username or not self.smtp_password:
+            if not self.queue and not self.send_directly:
                 st.error("Email service not configured. Please contact administrator.")
                 return False
 
@@ -82,19 +118,7 @@ class EmailManager:
             </html>
             """
 
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = self.from_email
-            msg['To'] = to_email
-
-            html_part = MIMEText(html_body, 'html')
-            msg.attach(html_part)
-
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
-
+            self.send(to_email, subject, html_body)
             return True
 
         except Exception as e:
@@ -0,0 +1,386 @@
+# email_queue.py - Background Email Dispatch
+
+"""
+Email Dispatch Queue for Trading Dashboard
+Messages are written to a SQLite outbox and delivered by background workers,
+each holding a persistent SMTP connection that is reopened when the server
+drops it. Failed sends are retried with exponential backoff.
+
+Several processes may share one outbox file. A worker claims messages under a
+lease (owner + lease_until) that its queue renews by heartbeat while they are
+being sent; messages whose lease expired, because their process died or
+stalled, are claimed again by any queue. Delivered and abandoned messages,
+which hold reset links, are deleted after EMAIL_RETENTION seconds. Messages
+may carry a dedup key, such as one per digest recipient and day: queueing a
+key already in the outbox is a no-op.
+
+The outbox is only as durable as the disk under EMAIL_OUTBOX_PATH. On a
+Cloud Run service (K_SERVICE set) the container filesystem is in memory and
+private to each instance, so an outbox there would lose queued and leased
+mail on restart and keep dedup keys per instance: Outbox refuses to open on
+a service unless EMAIL_OUTBOX_PATH is set, to a mounted volume that supports
+SQLite locking and is shared by the instances. Cloud Run jobs (the digest)
+drain their outbox before they exit and may keep it local.
+"""
+
+import atexit
+import os
+import secrets
+import smtplib
+import socket
+import sqlite3
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Callable, Dict, List, Optional
+
+import metrics
+
+EMAIL_OUTBOX_PATH = os.getenv("EMAIL_OUTBOX_PATH", "database/email_outbox.sqlite")
+EMAIL_POOL_SIZE = int(os.getenv("EMAIL_POOL_SIZE", "2"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+EMAIL_RETRY_BACKOFF = float(os.getenv("EMAIL_RETRY_BACKOFF", "5"))
+# A claimed message is handed to another worker if its lease isn't renewed for this long
+EMAIL_LEASE_SECONDS = float(os.getenv("EMAIL_LEASE_SECONDS", "120"))
+# Sent and failed messages are deleted this long after their last attempt
+EMAIL_RETENTION = float(os.getenv("EMAIL_RETENTION", str(24 * 3600)))
+# Connections idle for longer are closed before reuse rather than tripping
+# over a server-side timeout mid-send
+SMTP_MAX_IDLE = float(os.getenv("SMTP_MAX_IDLE", "60"))
+
+EMAILS_SENT = metrics.counter("tradvisor_emails_total", "Outbox deliveries by result")
+EMAIL_SEND_SECONDS = metrics.histogram("tradvisor_email_send_seconds", "Latency of one SMTP delivery")
+SMTP_CONNECTS = metrics.counter("tradvisor_smtp_connects_total", "SMTP connections opened")
+
+
+def build_message(from_email: str, to_email: str, subject: str, html_body: str) -> MIMEMultipart:
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = from_email
+    msg['To'] = to_email
+    msg.attach(MIMEText(html_body, 'html'))
+    return msg
+
+
+class OutboxNotDurable(RuntimeError):
+    """The outbox would be on a Cloud Run service's in-memory, per-instance filesystem"""
+
+
+class SMTPConnection:
+    """One persistent SMTP session, opened on first use and reopened after a disconnect"""
+
+    def __init__(self, server: str, port: int, username: Optional[str] = None, password: Optional[str] = None,
+                 starttls: bool = True, timeout: float = 30, max_idle: float = SMTP_MAX_IDLE):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._smtp = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        if self.starttls:
+            smtp.starttls()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        SMTP_CONNECTS.inc()
+        return smtp
+
+    def send(self, msg):
+        if self._smtp is not None and time.monotonic() - self._last_used > self.max_idle:
+            self.close()
+        if self._smtp is None:
+            self._smtp = self._connect()
+        try:
+            self._smtp.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # Stale connection: reconnect once, further errors go to the retry logic
+            self.close()
+            self._smtp = self._connect()
+            self._smtp.send_message(msg)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._smtp = None
+
+
+class Outbox:
+    """SQLite table of messages to send, with their delivery state and lease"""
+
+    def __init__(self, path: str = EMAIL_OUTBOX_PATH):
+        if os.getenv("K_SERVICE") and not os.getenv("EMAIL_OUTBOX_PATH"):
+            raise OutboxNotDurable(f"Email outbox {path} would be on the Cloud Run instance filesystem: "
+                                   "set EMAIL_OUTBOX_PATH to a shared volume")
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                to_email TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                html_body TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                sent_at REAL,
+                owner TEXT,
+                lease_until REAL,
+                dedup_key TEXT
+            )
+        ''')
+        # Outboxes created before leases and dedup keys
+        columns = {row['name'] for row in self._conn().execute("PRAGMA table_info(outbox)")}
+        if 'lease_until' not in columns:
+            self._conn().execute("ALTER TABLE outbox ADD COLUMN owner TEXT")
+            self._conn().execute("ALTER TABLE outbox ADD COLUMN lease_until REAL")
+            # Messages left in flight without a lease count as expired
+            self._conn().execute("UPDATE outbox SET lease_until = 0 WHERE status = 'sending'")
+        if 'dedup_key' not in columns:
+            self._conn().execute("ALTER TABLE outbox ADD COLUMN dedup_key TEXT")
+        self._conn().execute("CREATE INDEX IF NOT EXISTS outbox_due_idx ON outbox (status, next_attempt_at)")
+        self._conn().execute("CREATE UNIQUE INDEX IF NOT EXISTS outbox_dedup_idx ON outbox (dedup_key)")
+        self._conn().execute("CREATE INDEX IF NOT EXISTS outbox_lease_idx ON outbox (status, lease_until)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, to_email: str, subject: str, html_body: str) -> int:
+        now = time.time()
+        cursor = self._conn().execute(
+            "INSERT INTO outbox (to_email, subject, html_body, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)",
+            (to_email, subject, html_body, now, now))
+        return cursor.lastrowid
+
+    def add_many(self, messages: List[tuple], keys: Optional[List[str]] = None) -> int:
+        """
+        Insert (to_email, subject, html_body) tuples in one transaction and
+        return how many were added. A message whose dedup key (from `keys`, in
+        the same order) is already in the outbox is skipped.
+        """
+        now = time.time()
+        keys = keys or [None] * len(messages)
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO outbox (to_email, subject, html_body, next_attempt_at, created_at, dedup_key) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(to_email, subject, html_body, now, now, key)
+                 for (to_email, subject, html_body), key in zip(messages, keys)])
+        return cursor.rowcount
+
+    def sent_keys(self, keys: List[str]) -> set:
+        """The dedup keys among `keys` whose message has been delivered"""
+        sent = set()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            sent.update(key for key, in self._conn().execute(
+                f"SELECT dedup_key FROM outbox WHERE status = 'sent' AND dedup_key IN ({', '.join('?' * len(chunk))})",
+                chunk))
+        return sent
+
+    def claim(self, owner: str, limit: int = 1, lease: float = EMAIL_LEASE_SECONDS) -> List[Dict]:
+        """Lease up to `limit` due messages, or messages whose lease expired, to `owner` and return them"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT * FROM outbox WHERE (status = 'pending' AND next_attempt_at <= ?) "
+                "OR (status = 'sending' AND lease_until <= ?) ORDER BY id LIMIT ?",
+                (now, now, limit)).fetchall()
+            conn.executemany("UPDATE outbox SET status = 'sending', owner = ?, lease_until = ? WHERE id = ?",
+                             [(owner, now + lease, row['id']) for row in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [dict(row) for row in rows]
+
+    def renew(self, owner: str, lease: float = EMAIL_LEASE_SECONDS) -> int:
+        """Extend the lease of the messages `owner` is sending"""
+        return self._conn().execute(
+            "UPDATE outbox SET lease_until = ? WHERE status = 'sending' AND owner = ?",
+            (time.time() + lease, owner)).rowcount
+
+    def mark_sent(self, message_id: int, owner: str):
+        self._conn().execute(
+            "UPDATE outbox SET status = 'sent', attempts = attempts + 1, sent_at = ?, owner = NULL, lease_until = NULL "
+            "WHERE id = ? AND owner = ?", (time.time(), message_id, owner))
+
+    def mark_failed(self, message_id: int, owner: str, error: str, retry_in: Optional[float]):
+        """Record a failed attempt; reschedule it, or give up when retry_in is None"""
+        if retry_in is None:
+            self._conn().execute(
+                "UPDATE outbox SET status = 'failed', attempts = attempts + 1, last_error = ?, "
+                "owner = NULL, lease_until = NULL WHERE id = ? AND owner = ?",
+                (error, message_id, owner))
+        else:
+            self._conn().execute(
+                "UPDATE outbox SET status = 'pending', attempts = attempts + 1, last_error = ?, next_attempt_at = ?, "
+                "owner = NULL, lease_until = NULL WHERE id = ? AND owner = ?",
+                (error, time.time() + retry_in, message_id, owner))
+
+    def release(self, owner: str) -> int:
+        """Return the messages `owner` had claimed but not attempted to the queue"""
+        return self._conn().execute(
+            "UPDATE outbox SET status = 'pending', owner = NULL, lease_until = NULL "
+            "WHERE status = 'sending' AND owner = ?", (owner,)).rowcount
+
+    def prune(self, retention: float = EMAIL_RETENTION) -> int:
+        """Delete messages sent, or given up on, more than `retention` seconds ago"""
+        cutoff = time.time() - retention
+        # Retries give up within minutes, so a failed message's creation time stands in for its last attempt
+        return self._conn().execute(
+            "DELETE FROM outbox WHERE (status = 'sent' AND sent_at < ?) OR (status = 'failed' AND created_at < ?)",
+            (cutoff, cutoff)).rowcount
+
+    def count(self, status: str) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM outbox WHERE status = ?", (status,)).fetchone()[0]
+
+
+class EmailQueue:
+    """Deliver outbox messages from a pool of worker threads, under leases renewed by a heartbeat thread"""
+
+    def __init__(self, outbox: Outbox, connect: Callable[[], SMTPConnection], from_email: str,
+                 workers: int = EMAIL_POOL_SIZE, max_attempts: int = EMAIL_MAX_ATTEMPTS,
+                 backoff: float = EMAIL_RETRY_BACKOFF, poll_interval: float = 1.0, batch_size: int = 10,
+                 lease: float = EMAIL_LEASE_SECONDS, retention: float = EMAIL_RETENTION):
+        self.outbox = outbox
+        # Leases are held per queue: one owner per process and queue instance
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self.lease = lease
+        self.retention = retention
+        self.connect = connect
+        self.from_email = from_email
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._wakeup = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"email-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._heartbeat, name="email-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        atexit.register(self.close)
+        return self
+
+    def enqueue(self, to_email: str, subject: str, html_body: str) -> int:
+        """Persist a message and wake a worker; returns the outbox id"""
+        message_id = self.outbox.add(to_email, subject, html_body)
+        with self._wakeup:
+            self._wakeup.notify()
+        return message_id
+
+    def enqueue_many(self, messages: List[tuple], keys: Optional[List[str]] = None) -> int:
+        """Persist (to_email, subject, html_body) tuples in bulk, skipping already queued keys, and wake all workers"""
+        count = self.outbox.add_many(messages, keys)
+        with self._wakeup:
+            self._wakeup.notify_all()
+        return count
+
+    def _message(self, row: Dict):
+        return build_message(self.from_email, row['to_email'], row['subject'], row['html_body'])
+
+    def _deliver(self, connection: SMTPConnection, row: Dict):
+        try:
+            with EMAIL_SEND_SECONDS.time():
+                connection.send(self._message(row))
+        except Exception as e:
+            connection.close()
+            attempts = row['attempts'] + 1
+            if attempts >= self.max_attempts:
+                self.outbox.mark_failed(row['id'], self.owner, str(e), None)
+                EMAILS_SENT.inc(result='failed')
+                print(f"Giving up on email {row['id']} to {row['to_email']} after {attempts} attempts: {e}")
+            else:
+                self.outbox.mark_failed(row['id'], self.owner, str(e), self.backoff * 2 ** (attempts - 1))
+                EMAILS_SENT.inc(result='retry')
+            return
+        self.outbox.mark_sent(row['id'], self.owner)
+        EMAILS_SENT.inc(result='sent')
+
+    def _run(self):
+        connection = self.connect()
+        try:
+            while not self._stop.is_set():
+                try:
+                    rows = self.outbox.claim(self.owner, self.batch_size, self.lease)
+                except sqlite3.Error as e:
+                    print(f"Error reading email outbox: {e}")
+                    rows = []
+                if not rows:
+                    # Also wakes up periodically to pick up scheduled retries
+                    with self._wakeup:
+                        self._wakeup.wait(self.poll_interval)
+                    continue
+                for row in rows:
+                    if self._stop.is_set():
+                        break
+                    self._deliver(connection, row)
+        finally:
+            connection.close()
+
+    def _heartbeat(self):
+        """Renew this queue's leases well before they expire, and prune old messages about hourly"""
+        interval = self.lease / 3
+        next_prune = 0.0
+        while not self._stop.wait(interval):
+            try:
+                self.outbox.renew(self.owner, self.lease)
+                if time.monotonic() >= next_prune:
+                    pruned = self.outbox.prune(self.retention)
+                    if pruned:
+                        print(f"Pruned {pruned} delivered or abandoned emails from the outbox")
+                    next_prune = time.monotonic() + 3600
+            except sqlite3.Error as e:
+                print(f"Error renewing email leases: {e}")
+
+    def drain(self, timeout: float = 30) -> bool:
+        """Wait until nothing is pending or in flight; True if the outbox drained"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self.outbox.count('pending') and not self.outbox.count('sending'):
+                return True
+            time.sleep(0.05)
+        return False
+
+    def close(self, timeout: float = 5):
+        """Stop the workers; undelivered messages stay in the outbox for the next start"""
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        if not any(thread.is_alive() for thread in self._threads):
+            # Claimed but not attempted: hand them back now rather than when the lease expires
+            self.outbox.release(self.owner)
+        self._threads = []
@@ -0,0 +1,189 @@
+"""
+End-to-end check of the email dispatch queue
+Delivers messages through EmailQueue to an in-process SMTP stand-in (the
+load test's sink) and exercises connection reuse, reconnects, retries, the
+give-up path, recovery of undelivered mail from the outbox after a restart,
+leases shared between queues, dedup keys and pruning of delivered mail,
+and that a Cloud Run service refuses an outbox on its own filesystem.
+
+Usage (from the webapp directory):
+    python email_queue_check.py [--messages 50]
+"""
+
+import argparse
+import os
+import socket
+import sys
+import tempfile
+import time
+
+from email_queue import EmailQueue, Outbox, OutboxNotDurable, SMTPConnection
+from load_test import start_smtp_sink
+
+FROM_EMAIL = "tradvisor@example.com"
+
+
+def closed_port():
+    """A local port nothing listens on"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_queue(outbox, port, **kwargs):
+    return EmailQueue(outbox, lambda: SMTPConnection("127.0.0.1", port, starttls=False), FROM_EMAIL,
+                      poll_interval=0.05, **kwargs).start()
+
+
+def check_delivery(sink, outbox, messages, workers):
+    queue = make_queue(outbox, sink.server_address[1], workers=workers)
+    start = time.perf_counter()
+    for i in range(messages):
+        queue.enqueue(f"user{i}@example.com", "Check", f"<p>message {i}</p>")
+    enqueue_seconds = time.perf_counter() - start
+    assert queue.drain(), "outbox did not drain"
+    queue.close()
+    assert sink.messages == messages, f"sink received {sink.messages} of {messages} messages"
+    assert sink.connections <= workers, f"{sink.connections} connections for {workers} workers"
+    print(f"delivery: {messages} messages over {sink.connections} connections, "
+          f"enqueue {enqueue_seconds / messages * 1000:.2f} ms/message")
+
+
+def check_reconnect(sink):
+    connection = SMTPConnection("127.0.0.1", sink.server_address[1], starttls=False)
+    queue = EmailQueue(None, None, FROM_EMAIL)
+    row = {'to_email': "reconnect@example.com", 'subject': "Check", 'html_body': "<p>reconnect</p>"}
+    before, connections = sink.messages, sink.connections
+    connection.send(queue._message(row))
+    connection._smtp.close()  # connection dropped under us
+    connection.send(queue._message(row))
+    connection.close()
+    assert sink.messages == before + 2, "message lost across a reconnect"
+    assert sink.connections == connections + 2, "expected exactly one reconnect"
+    print("reconnect: OK")
+
+
+def check_retry_and_restart(sink, outbox, messages):
+    queue = make_queue(outbox, closed_port(), backoff=0.05, max_attempts=1000)
+    for i in range(messages):
+        queue.enqueue(f"retry{i}@example.com", "Check", f"<p>retry {i}</p>")
+    time.sleep(0.5)
+    queue.close()
+    pending = outbox.count('pending') + outbox.count('sending')
+    assert pending == messages, f"{pending} of {messages} undelivered messages kept in the outbox"
+
+    # A new process (here: a new queue) delivers what the old one could not
+    before = sink.messages
+    queue = make_queue(outbox, sink.server_address[1])
+    assert queue.drain(), "outbox did not drain after restart"
+    queue.close()
+    assert sink.messages == before + messages, "messages lost across a restart"
+    print(f"retry/restart: {messages} messages delivered after restart")
+
+
+def check_give_up(outbox):
+    queue = make_queue(outbox, closed_port(), backoff=0.01, max_attempts=3)
+    queue.enqueue("failed@example.com", "Check", "<p>never delivered</p>")
+    assert queue.drain(), "message was not given up"
+    queue.close()
+    assert outbox.count('failed') == 1, "message not marked failed"
+    print("give up: OK")
+
+
+def check_leases(sink, outbox):
+    # A message leased by a live queue elsewhere is left alone until released
+    outbox.add("leased@example.com", "Check", "<p>leased</p>")
+    outbox.claim("other-process", 1, lease=60)
+    before = sink.messages
+    queue = make_queue(outbox, sink.server_address[1])
+    time.sleep(0.3)
+    assert sink.messages == before, "a live lease was taken over"
+    outbox.release("other-process")
+    assert queue.drain(), "released message was not delivered"
+
+    # A message leased by a process that died is claimed again once its lease expires
+    outbox.add("orphan@example.com", "Check", "<p>orphan</p>")
+    outbox.claim("dead-process", 1, lease=0.2)
+    assert queue.drain(), "message with an expired lease was not delivered"
+    queue.close()
+    assert sink.messages == before + 2, f"{sink.messages - before} of 2 leased messages delivered once"
+
+    # The dead process finishing late doesn't overwrite the new owner's outcome
+    failed = outbox.count('failed')
+    outbox.mark_failed(outbox.add("late@example.com", "Check", "<p>late</p>"), "dead-process", "late", None)
+    assert outbox.count('failed') == failed, "a worker without the lease changed a message"
+    print("leases: OK")
+
+
+def check_dedup(sink, outbox):
+    messages = [(f"dedup{i}@example.com", "Check", f"<p>dedup {i}</p>") for i in range(3)]
+    keys = [f"check:{i}" for i in range(3)]
+    queue = make_queue(outbox, sink.server_address[1])
+    assert queue.drain(), "outbox did not drain"
+    before = sink.messages
+    assert queue.enqueue_many(messages, keys) == 3, "new keys must be queued"
+    assert queue.drain(), "keyed messages were not delivered"
+    assert queue.enqueue_many(messages, keys) == 0, "delivered keys must not be queued again"
+    assert queue.drain()
+    queue.close()
+    assert sink.messages == before + 3, f"{sink.messages - before} deliveries for 3 keyed messages"
+    assert outbox.sent_keys(keys + ["check:unknown"]) == set(keys), "sent keys must be reported"
+    print("dedup: OK")
+
+
+def check_prune(outbox):
+    sent = outbox.count('sent')
+    assert outbox.prune(3600) == 0, "recent messages were pruned"
+    assert outbox.prune(0) >= sent and outbox.count('sent') == 0, "delivered messages were not pruned"
+    print(f"prune: {sent} delivered messages deleted, with the abandoned ones")
+
+
+def check_cloud_run(workdir):
+    saved = {name: os.environ.pop(name, None) for name in ("K_SERVICE", "EMAIL_OUTBOX_PATH")}
+    path = os.path.join(workdir, "service-outbox.sqlite")
+    try:
+        os.environ["K_SERVICE"] = "tradvisor"
+        try:
+            Outbox(path)
+            raise AssertionError("a Cloud Run service opened an outbox without EMAIL_OUTBOX_PATH")
+        except OutboxNotDurable:
+            pass
+        assert not os.path.exists(path), "the refused outbox was created"
+        os.environ["EMAIL_OUTBOX_PATH"] = path
+        Outbox(path)
+    finally:
+        for name, value in saved.items():
+            os.environ.pop(name, None)
+            if value is not None:
+                os.environ[name] = value
+    print("cloud run: OK")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    sink = start_smtp_sink()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            outbox = Outbox(os.path.join(workdir, "outbox.sqlite"))
+            check_delivery(sink, outbox, args.messages, args.workers)
+            check_reconnect(sink)
+            check_retry_and_restart(sink, outbox, 5)
+            check_give_up(outbox)
+            check_leases(sink, outbox)
+            check_dedup(sink, outbox)
+            check_prune(outbox)
+            check_cloud_run(workdir)
+    except AssertionError as e:
+        print(f"FAILED: {e}")
+        return 1
+    finally:
+        sink.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
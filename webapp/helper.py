@@ -1,9 +1,11 @@
-import plotly.graph_objects as go
 import json, os
-from google.cloud import bigquery
+
+# plotly and google-cloud-bigquery are slow to import; they are only loaded
+# when a chart or a BigQuery client is actually requested.
 
 def create_gauge_chart(value, title, max_val=100):
     """Create a gauge chart for confidence"""
+    import plotly.graph_objects as go
 
     value_pct = value *100
     # Determine color based on value
@@ -49,6 +51,7 @@ def create_gauge_chart(value, title, max_val=100):
 
 def create_signal_pie_chart(probabilities):
     """Create pie chart for signal probabilities"""
+    import plotly.graph_objects as go
 
     # Create pie chart data
     labels = ['Buy', 'Hold', 'Sell']
@@ -112,6 +115,8 @@ def create_signal_pie_chart(probabilities):
 
 def create_stock_chart(data, symbol):
     """Create an interactive stock price chart using Plotly"""
+    import plotly.graph_objects as go
+
     fig = go.Figure()
     fig.add_trace(
         go.Scatter(
@@ -134,6 +139,8 @@ def create_stock_chart(data, symbol):
 
 def getBigQueryClient():
     """Initialize BigQuery client with credentials"""
+    from google.cloud import bigquery
+
     # credentials = service_account.Credentials.from_service_account_info(
     #     st.secrets["gcp_service_account"]
     # )
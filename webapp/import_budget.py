@@ -0,0 +1,71 @@
+"""
+Import-time budget for the login page
+Runs `python -X importtime` over the modules main.py loads before the login
+page renders and exits non-zero if the graph regresses.
+
+Usage (from the webapp directory):
+    python import_budget.py [--budget-ms 2000]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Modules that must only be loaded after login (charts, signals, market data)
+DEFERRED_MODULES = ['talib', 'plotly', 'trading', 'data_manager', 'pyarrow']
+
+# The BigQuery client is only allowed when it is the user-store backend
+if not os.environ.get('PROJECT_ID'):
+    DEFERRED_MODULES.append('google.cloud.bigquery')
+
+LOGIN_MODULES = ['main']
+
+
+def measure_imports(modules):
+    """Return {module: cumulative import time in microseconds} for a fresh interpreter"""
+    code = "; ".join(f"import {module}" for module in modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=os.path.dirname(os.path.abspath(__file__)),
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings[name[1:].rstrip()] = int(cumulative)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("IMPORT_BUDGET_MS", "2000")))
+    args = parser.parse_args()
+
+    timings = measure_imports(LOGIN_MODULES)
+    # The cumulative time of each login module covers everything it pulls in
+    total_ms = sum(timings.get(module, 0) for module in LOGIN_MODULES) / 1000
+    loaded = {name.strip() for name in timings}
+
+    errors = []
+    for module in DEFERRED_MODULES:
+        if module in loaded:
+            errors.append(f"{module} is imported by the login page")
+    if total_ms > args.budget_ms:
+        errors.append(f"login page imports take {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+
+    slowest = sorted(((us, name.strip()) for name, us in timings.items()), reverse=True)[:10]
+    print(f"Login page import time: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    for us, name in slowest:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    for error in errors:
+        print(f"FAIL: {error}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+Concurrent-session load test for the Trading Dashboard
+Drives N simultaneous Streamlit sessions (streamlit.testing AppTest) through
+login, dashboard render and symbol switching, in one process like a single
+container. Runs offline: the app works on a scratch copy of the local DuckDB
+databases and points its SMTP settings at an in-process sink.
+
+Usage (from the repository root):
+    python webapp/load_test.py --sessions 20 --switches 5 [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socketserver
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+WEBAPP_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(WEBAPP_DIR)
+MAIN_SCRIPT = os.path.join(WEBAPP_DIR, "main.py")
+PASSWORD = "LoadTest#2024"
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP conversation that accepts and discards every message"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 localhost SMTP sink")
+        in_data = False
+        for raw in self.rfile:
+            line = raw.decode(errors="replace").rstrip("\r\n")
+            if in_data:
+                if line == ".":
+                    in_data = False
+                    self.server.messages += 1
+                    self.reply("250 OK")
+                continue
+            command = line[:4].upper()
+            if command == "EHLO":
+                self.reply("250-localhost")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif command == "AUTH":
+                self.reply("235 Authentication successful")
+            elif command == "DATA":
+                in_data = True
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+def start_smtp_sink():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPSinkHandler)
+    server.daemon_threads = True
+    server.messages = 0
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, name="smtp-sink", daemon=True).start()
+    return server
+
+
+def prepare_workspace(smtp_port):
+    """Scratch working directory with a copy of the market database"""
+    workspace = tempfile.mkdtemp(prefix="tradvisor-load-")
+    os.makedirs(os.path.join(workspace, "database"))
+    shutil.copy(os.path.join(REPO_DIR, "database", "financial_assets.db"), os.path.join(workspace, "database"))
+
+    os.environ.pop("PROJECT_ID", None)
+    os.environ.pop("TRADVISOR_GMAIL_ACC_SECRET", None)
+    os.environ.update({
+        "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": str(smtp_port),
+        "SMTP_USERNAME": "loadtest",
+        "SMTP_PASSWORD": "loadtest",
+        "SMTP_STARTTLS": "false",
+        # Every session logs in from the same client address
+        "LOGIN_LIMIT_CLIENT": "100000/1",
+        "EMAIL_OUTBOX_PATH": os.path.join(workspace, "database", "email_outbox.sqlite"),
+        "METRICS_PORT": "0",
+        "METRICS_SUMMARY_PATH": "",
+    })
+    os.chdir(workspace)
+    if WEBAPP_DIR not in sys.path:
+        sys.path.insert(0, WEBAPP_DIR)
+    return workspace
+
+
+def create_users(count):
+    from database import DatabaseManager
+    from migrations import migrate
+
+    db = DatabaseManager()
+    migrate(db.store)
+    emails = [f"loadtest+{i}@example.com" for i in range(count)]
+    for email in emails:
+        db.create_user(email, PASSWORD)
+    return emails
+
+
+def rss_mb():
+    """Resident set size of this process in MB"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+
+
+def timed_run(timings, step, action):
+    start = time.perf_counter()
+    at = action()
+    timings.setdefault(step, []).append(time.perf_counter() - start)
+    if at.exception:
+        raise RuntimeError(f"{step}: {at.exception[0].message}")
+    return at
+
+
+def run_session(email, switches, timeout, timings, rng):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(MAIN_SCRIPT, default_timeout=timeout)
+    timed_run(timings, "login_page", at.run)
+
+    at.text_input[0].input(email)
+    at.text_input[1].input(PASSWORD)
+    sign_in = next(button for button in at.button if button.label == "Sign In")
+    timed_run(timings, "login", sign_in.click().run)
+    if not at.session_state["authenticated"]:
+        raise RuntimeError(f"login failed for {email}")
+
+    timed_run(timings, "dashboard", at.run)
+
+    symbols = list(at.sidebar.selectbox[0].options)
+    for _ in range(switches):
+        timed_run(timings, "switch_symbol", at.sidebar.selectbox[0].select(rng.choice(symbols)).run)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10, help="number of concurrent sessions")
+    parser.add_argument("--switches", type=int, default=5, help="symbol switches per session")
+    parser.add_argument("--timeout", type=float, default=120, help="per-run timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--keep-workspace", action="store_true")
+    args = parser.parse_args()
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    smtp = start_smtp_sink()
+    workspace = prepare_workspace(smtp.server_address[1])
+    emails = create_users(args.sessions)
+
+    timings, errors = {}, []
+    baseline_mb = rss_mb()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        futures = [pool.submit(run_session, email, args.switches, args.timeout, timings,
+                               random.Random(args.seed + i))
+                   for i, email in enumerate(emails)]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(str(e))
+    wall = time.perf_counter() - start
+    peak_mb = rss_mb()
+
+    report = {
+        "sessions": args.sessions,
+        "errors": errors,
+        "wall_seconds": wall,
+        "rss_baseline_mb": baseline_mb,
+        "rss_after_mb": peak_mb,
+        "rss_per_session_mb": (peak_mb - baseline_mb) / args.sessions,
+        "emails_sent": smtp.messages,
+        "steps": {
+            step: {
+                "count": len(values),
+                "mean": statistics.mean(values),
+                "p50": percentile(values, 0.50),
+                "p95": percentile(values, 0.95),
+                "p99": percentile(values, 0.99),
+            } for step, values in timings.items()
+        },
+    }
+
+    print(f"{args.sessions} sessions in {wall:.1f}s, {len(errors)} errors")
+    print(f"RSS {baseline_mb:.0f} MB -> {peak_mb:.0f} MB ({report['rss_per_session_mb']:.1f} MB/session)")
+    print(f"{'step':<15}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for step, stats in report["steps"].items():
+        print(f"{step:<15}{stats['count']:>7}{stats['p50'] * 1000:>10.0f}"
+              f"{stats['p95'] * 1000:>10.0f}{stats['p99'] * 1000:>10.0f}")
+    for error in errors[:10]:
+        print(f"ERROR: {error}")
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    smtp.shutdown()
+    if not args.keep_workspace:
+        shutil.rmtree(workspace, ignore_errors=True)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
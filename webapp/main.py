@@ -7,20 +7,21 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import time
-from datetime import datetime
-from trading import TechnicalIndicatorTrading
-from helper import create_gauge_chart, create_signal_pie_chart, create_stock_chart, getBigQueryClient
-import os
-import duckdb as db
-import plotly.express as px
-from data_manager import DataManager
 
-from google.cloud import bigquery
-
-# Import custom modules
+# Import custom modules. Only what the login page needs is imported here:
+# charting (plotly), signal generation (talib) and market data (duckdb /
+# BigQuery) are imported on first use in show_main_dashboard.
 from database import DatabaseManager
 from email_manager import EmailManager
 from auth_ui import AuthUI
+from session_tokens import SessionTokens
+from rate_limit import AuthThrottle
+from migrations import MIGRATE_ON_STARTUP, migrate
+import shared_modules  # puts scripts/ on the path for trading_calendar
+from trading_calendar import sessions_back
+import metrics
+
+RERUN_SECONDS = metrics.histogram("tradvisor_rerun_seconds", "Duration of a full script rerun")
 
 # from data_manager import DataManager
 # from tech_analysis import TechnicalAnalyzer
@@ -34,28 +35,22 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-ENVIRONMENT = 'gcp'
-project_id = os.environ.get('PROJECT_ID')
-# project_id = "dev-tradvisor"
-
-client = None
-if project_id:
-    client = getBigQueryClient()
-else:
-    ENVIRONMENT = 'on-premise'
-    conn = db.connect('database/financial_assets.db')
-
-dataset_names = {"on-premise": "", "gcp": f"{project_id}.stocks."}
-
 
 
 # Initialize components
 @st.cache_resource
 def init_components():
     """Initialize all dashboard components"""
+    metrics.start()
     db_manager = DatabaseManager()
+    if MIGRATE_ON_STARTUP and db_manager.store:
+        try:
+            migrate(db_manager.store)
+        except Exception as e:
+            st.error(f"Database migration error: {str(e)}")
     email_manager = EmailManager()
-    auth_ui = AuthUI(db_manager, email_manager)
+    sessions = SessionTokens()
+    auth_ui = AuthUI(db_manager, email_manager, sessions, AuthThrottle())
     # data_manager = DataManager()
     # tech_analyzer = TechnicalAnalyzer()
     # chart_components = ChartComponents()
@@ -63,6 +58,7 @@ def init_components():
     return {
         'db': db_manager,
         'email': email_manager,
+        'sessions': sessions,
         'auth_ui': auth_ui,
         # 'data': data_manager,
         # 'analyzer': tech_analyzer,
@@ -96,7 +92,8 @@ def top10_weekly_performers(df):
     # Convert dates once and find date range
     dates = pd.to_datetime(df['DATE'].values)
     latest_date = dates.max()
-    week_ago = latest_date - pd.Timedelta(days=7)
+    # Close of the same session a trading week (5 sessions) earlier
+    week_ago = sessions_back(latest_date, 5)
 
     # Filter for weekly data using boolean indexing
     weekly_mask = dates >= week_ago
@@ -207,8 +204,24 @@ def show_authentication_flow(components):
     else:
         auth_ui.show_login_page()
 
+def show_data_freshness(snapshot):
+    """Show the age of the signal frame and how long it took to build"""
+    from data_manager import get_signal_refresher
+
+    age_minutes = int(snapshot.age // 60)
+    if age_minutes < 60:
+        age = f"{age_minutes} min"
+    else:
+        age = f"{age_minutes // 60} h {age_minutes % 60} min"
+    status = " (refreshing...)" if get_signal_refresher().refreshing else ""
+    st.sidebar.caption(f"Signals updated {age} ago{status} · built in {snapshot.duration:.1f}s")
+
 def show_main_dashboard(components, user):
     """Show the main trading dashboard"""
+    import plotly.express as px
+    from data_manager import DataManager, HISTORY_VIEWS
+    from helper import create_gauge_chart, create_signal_pie_chart
+
     auth_ui = components['auth_ui']
     # data_manager = components['data']
     # analyzer = components['analyzer']
@@ -229,7 +242,8 @@ def show_main_dashboard(components, user):
 
     # Load and display stock data
     dm = DataManager()
-    shares = dm.load_data()
+    snapshot = dm.load_snapshot()
+    shares = snapshot.frame
 
     main_container = st.container()
 
@@ -248,6 +262,7 @@ def show_main_dashboard(components, user):
                                 <h4>ROI: {latest_data['ROI']:.2%}</h4>
                             </div>
                         """, unsafe_allow_html=True)
+    show_data_freshness(snapshot)
 
     with (main_container):
         # Component - Stock chart
@@ -255,8 +270,12 @@ def show_main_dashboard(components, user):
         st.markdown(f"""<h3 style='text-align: center; color: black;'>{selected_symbol} Price </h4>""",
                     unsafe_allow_html=True)
 
+        view = st.radio("History", options=list(HISTORY_VIEWS), horizontal=True, label_visibility="collapsed")
+        price_history = dm.load_history(view)
+        price_history = price_history[price_history['SYMBOL'] == selected_symbol]
+
         fig_price = px.line(
-            historical_data,
+            price_history,
             x='DATE',
             y='CLOSE',
             title=f' ',
@@ -350,10 +369,17 @@ def main():
     if 'user' not in st.session_state:
         st.session_state.user = None
 
+    # New tabs and reconnects carry a signed session cookie; restoring from it
+    # needs no password, only the session version from the user cache
+    if not st.session_state.authenticated:
+        components['auth_ui'].restore_session()
+
     if st.session_state.authenticated and st.session_state.user:
-        show_main_dashboard(components, st.session_state.user)
+        with RERUN_SECONDS.time(page='dashboard'):
+            show_main_dashboard(components, st.session_state.user)
     else:
-        show_authentication_flow(components)
+        with RERUN_SECONDS.time(page='login'):
+            show_authentication_flow(components)
 
     if st.session_state.authenticated:
         st.markdown("---")
@@ -0,0 +1,263 @@
+# metrics.py - In-process Metrics
+
+"""
+Metrics for Trading Dashboard
+Counters and histograms recorded in process memory, exposed in Prometheus text
+format by a small sidecar HTTP server and summarised periodically to a JSON
+lines file for offline analysis.
+"""
+
+import json
+import os
+import threading
+import time
+from functools import wraps
+from typing import Dict, Optional, Tuple
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+METRICS_SUMMARY_PATH = os.getenv("METRICS_SUMMARY_PATH", "metrics_summary.jsonl")
+METRICS_SUMMARY_INTERVAL = int(os.getenv("METRICS_SUMMARY_INTERVAL", "300"))
+
+# Latency buckets in seconds, from sub-millisecond lookups to slow warehouse jobs
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: Tuple, extra: Optional[Tuple] = None) -> str:
+    pairs = list(key) + list(extra or ())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    """Monotonic counter, one value per label set"""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+    def summary(self):
+        with self._lock:
+            return [{"labels": dict(key), "value": value} for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label set"""
+
+    def __init__(self, name: str, help: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0, "max": 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+            series["max"] = max(series["max"], value)
+
+    def time(self, **labels):
+        """Context manager recording the duration of the block"""
+        return _Timer(self, labels)
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Quantile estimated as the upper bound of the bucket holding it (or the max past the last bucket)"""
+        series = self._series.get(_label_key(labels))
+        return self._quantile(series, q) if series else None
+
+    def _quantile(self, series, q):
+        rank = q * series["count"]
+        seen = 0
+        for bound, count in zip(self.buckets, series["counts"]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return series["max"]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, (('le', bound),))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+    def summary(self):
+        with self._lock:
+            return [{
+                "labels": dict(key),
+                "count": series["count"],
+                "sum": series["sum"],
+                "mean": series["sum"] / series["count"] if series["count"] else None,
+                "p50": self._quantile(series, 0.50),
+                "p95": self._quantile(series, 0.95),
+                "p99": self._quantile(series, 0.99),
+                "max": series["max"],
+            } for key, series in sorted(self._series.items())]
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Registry:
+    """Process-wide collection of metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get_or_create(Counter, name, help)
+
+    def histogram(self, name: str, help: str = "", buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, buckets=buckets)
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict:
+        return {
+            "timestamp": time.time(),
+            "metrics": {name: metric.summary() for name, metric in list(self._metrics.items())},
+        }
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str = "") -> Counter:
+    return REGISTRY.counter(name, help)
+
+
+def histogram(name: str, help: str = "", buckets=DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.histogram(name, help, buckets)
+
+
+def timed(metric: Histogram, **labels):
+    """Decorator recording the duration of each call in the histogram"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with metric.time(**labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+_started = False
+_start_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = METRICS_PORT):
+    """Serve /metrics in Prometheus text format from a daemon thread"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = REGISTRY.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+def write_summary(path: str = METRICS_SUMMARY_PATH):
+    """Append the current summary as one JSON line"""
+    with open(path, "a") as f:
+        f.write(json.dumps(REGISTRY.summary(), default=str) + "\n")
+
+
+def start_summary_writer(path: str = METRICS_SUMMARY_PATH, interval: int = METRICS_SUMMARY_INTERVAL):
+    """Write a JSON summary every `interval` seconds from a daemon thread"""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                write_summary(path)
+            except OSError as e:
+                print(f"Error writing metrics summary: {e}")
+
+    threading.Thread(target=loop, name="metrics-summary", daemon=True).start()
+
+
+def start():
+    """Start the metrics endpoint and summary writer once per process"""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    if METRICS_PORT:
+        try:
+            start_metrics_server(METRICS_PORT)
+        except OSError as e:
+            print(f"Metrics endpoint not started on port {METRICS_PORT}: {e}")
+    if METRICS_SUMMARY_PATH and METRICS_SUMMARY_INTERVAL > 0:
+        start_summary_writer(METRICS_SUMMARY_PATH, METRICS_SUMMARY_INTERVAL)
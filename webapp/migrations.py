@@ -0,0 +1,149 @@
+# migrations.py - User Store Schema Migrations
+
+"""
+Schema Migrations for the User Store
+Versioned schema changes applied once, at deploy time or process startup, and
+recorded in a schema_migrations table (a document for Firestore). Stores do
+no DDL or metadata calls when they are constructed.
+
+Usage (from the repository root, before starting the app):
+    python webapp/migrations.py [--store sqlite]
+
+Append new migrations to the end of a store's list; never edit applied ones.
+"""
+
+import argparse
+import os
+import sys
+
+from user_store import USER_STORE, UserStore, create_user_store
+
+# Apply pending migrations from main.py when the process starts. Deployments
+# that run this script before launching the app can disable it.
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+
+def sqlite_create_users(store):
+    store._conn().executescript('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT NOT NULL,
+            email TEXT NOT NULL,
+            password_hash TEXT NOT NULL,
+            salt TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            last_login TEXT,
+            reset_token TEXT,
+            reset_token_expires TEXT,
+            preferences TEXT
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS users_email_idx ON users (email);
+        CREATE INDEX IF NOT EXISTS users_reset_token_idx ON users (reset_token);
+    ''')
+
+
+def duckdb_create_users(store):
+    store._cursor().execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id VARCHAR,
+            email VARCHAR UNIQUE,
+            password_hash VARCHAR,
+            salt VARCHAR,
+            created_at TIMESTAMP,
+            last_login TIMESTAMP,
+            reset_token VARCHAR,
+            reset_token_expires TIMESTAMP,
+            preferences VARCHAR
+        );
+    ''')
+
+
+def bigquery_create_users(store):
+    bigquery = store._bigquery
+    schema = [
+        bigquery.SchemaField("user_id", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("email", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("password_hash", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("salt", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("created_at", "TIMESTAMP", mode="REQUIRED"),
+        bigquery.SchemaField("last_login", "TIMESTAMP", mode="NULLABLE"),
+        bigquery.SchemaField("reset_token", "STRING", mode="NULLABLE"),
+        bigquery.SchemaField("reset_token_expires", "TIMESTAMP", mode="NULLABLE"),
+        bigquery.SchemaField("preferences", "JSON", mode="NULLABLE"),
+    ]
+    table = bigquery.Table(f"{store.project_id}.{store.dataset_id}.{store.table_id}", schema=schema)
+    store.client.create_table(table, exists_ok=True)
+
+
+def sqlite_add_session_version(store):
+    store._conn().execute("ALTER TABLE users ADD COLUMN session_version INTEGER NOT NULL DEFAULT 0")
+
+
+def duckdb_add_session_version(store):
+    store._cursor().execute("ALTER TABLE users ADD COLUMN session_version INTEGER DEFAULT 0")
+
+
+def bigquery_add_session_version(store):
+    # Existing rows read NULL, which DatabaseManager treats as version 0
+    store.client.query(f"ALTER TABLE {store.table} ADD COLUMN IF NOT EXISTS session_version INT64").result()
+
+
+def sqlite_add_last_digest(store):
+    store._conn().execute("ALTER TABLE users ADD COLUMN last_digest TEXT")
+
+
+def duckdb_add_last_digest(store):
+    store._cursor().execute("ALTER TABLE users ADD COLUMN last_digest VARCHAR")
+
+
+def bigquery_add_last_digest(store):
+    store.client.query(f"ALTER TABLE {store.table} ADD COLUMN IF NOT EXISTS last_digest STRING").result()
+
+
+# (version, description, apply) per store, in order
+MIGRATIONS = {
+    'sqlite': [
+        (1, "create users table", sqlite_create_users),
+        (2, "add session_version", sqlite_add_session_version),
+        (3, "add last_digest", sqlite_add_last_digest),
+    ],
+    'duckdb': [
+        (1, "create users table", duckdb_create_users),
+        (2, "add session_version", duckdb_add_session_version),
+        (3, "add last_digest", duckdb_add_last_digest),
+    ],
+    'bigquery': [
+        (1, "create users table", bigquery_create_users),
+        (2, "add session_version", bigquery_add_session_version),
+        (3, "add last_digest", bigquery_add_last_digest),
+    ],
+    # Firestore is schemaless and indexes single fields automatically
+    'firestore': [],
+}
+
+
+def migrate(store: UserStore) -> int:
+    """Apply pending migrations to the store and return its schema version"""
+    current = store.schema_version()
+    for version, description, apply in MIGRATIONS[store.name]:
+        if version <= current:
+            continue
+        print(f"Applying {store.name} migration {version}: {description}")
+        apply(store)
+        store.record_schema_version(version, description)
+        current = version
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default=USER_STORE, help="user store to migrate (default: USER_STORE)")
+    args = parser.parse_args()
+
+    store = create_user_store(args.store)
+    version = migrate(store)
+    print(f"{store.name} user store at schema version {version}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+# rate_limit.py - Login Throttling
+
+"""
+Rate Limiting for Trading Dashboard Authentication
+Token buckets per email and per client guard login, registration and
+password reset before they reach the user store or SMTP. Once a bucket runs
+dry the key is locked out for an exponentially growing period. Login attempts
+on an email are counted per client, so a user is rarely locked out of their
+account by someone else, and also per account across all clients under a
+looser limit, so guesses spread over many clients are still limited; reset
+emails are limited per email whatever the client. Buckets live in process
+memory, or in a SQLite file shared by several processes when
+RATE_LIMIT_STATE_PATH is set.
+
+Limits are "<burst>/<seconds>": up to `burst` attempts at once, refilled at
+burst/seconds attempts per second.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from cachetools import TTLCache
+
+import metrics
+
+LOGIN_LIMIT_EMAIL = os.getenv("LOGIN_LIMIT_EMAIL", "5/300")
+LOGIN_LIMIT_CLIENT = os.getenv("LOGIN_LIMIT_CLIENT", "20/60")
+# Attempts on one account from all clients together; looser than LOGIN_LIMIT_EMAIL
+LOGIN_LIMIT_ACCOUNT = os.getenv("LOGIN_LIMIT_ACCOUNT", "20/300")
+RESET_LIMIT_EMAIL = os.getenv("RESET_LIMIT_EMAIL", "3/3600")
+RESET_LIMIT_CLIENT = os.getenv("RESET_LIMIT_CLIENT", "10/3600")
+REGISTER_LIMIT_CLIENT = os.getenv("REGISTER_LIMIT_CLIENT", "5/3600")
+# First lockout in seconds, doubled on each further violation up to the maximum
+RATE_LIMIT_LOCKOUT = float(os.getenv("RATE_LIMIT_LOCKOUT", "30"))
+RATE_LIMIT_MAX_LOCKOUT = float(os.getenv("RATE_LIMIT_MAX_LOCKOUT", "3600"))
+RATE_LIMIT_STATE_PATH = os.getenv("RATE_LIMIT_STATE_PATH")
+
+RATE_LIMITED = metrics.counter("tradvisor_rate_limited_total", "Attempts rejected by the rate limiter")
+RATE_LIMIT_LOCKOUTS = metrics.counter("tradvisor_rate_limit_lockouts_total", "Lockouts started by the rate limiter")
+
+# Bucket state: (tokens, updated_at, violations, locked_until)
+Bucket = Tuple[float, float, int, float]
+
+
+def parse_limit(limit: str) -> Tuple[float, float]:
+    """'5/300' -> (capacity 5, refill 5/300 tokens per second)"""
+    burst, seconds = limit.split("/")
+    return float(burst), float(burst) / float(seconds)
+
+
+class MemoryState:
+    """Buckets in process memory, forgotten after `ttl` seconds without attempts"""
+
+    def __init__(self, maxsize: int = 100000, ttl: float = RATE_LIMIT_MAX_LOCKOUT * 2):
+        self._buckets = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def update(self, key: str, fn: Callable[[Optional[Bucket]], Bucket]) -> Bucket:
+        with self._lock:
+            bucket = self._buckets[key] = fn(self._buckets.get(key))
+            return bucket
+
+    def delete(self, key: str):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+
+class SQLiteState:
+    """Buckets in a SQLite file, shared by every process that opens it"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits "
+            "(key TEXT PRIMARY KEY, tokens REAL, updated_at REAL, violations INTEGER, locked_until REAL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def update(self, key: str, fn: Callable[[Optional[Bucket]], Bucket]) -> Bucket:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at, violations, locked_until FROM rate_limits WHERE key = ?", (key,)
+            ).fetchone()
+            bucket = fn(tuple(row) if row else None)
+            conn.execute("INSERT OR REPLACE INTO rate_limits VALUES (?, ?, ?, ?, ?)", (key, *bucket))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return bucket
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+
+class RateLimiter:
+    """Token bucket with exponential lockout, one bucket per key"""
+
+    def __init__(self, name: str, limit: str, state, lockout: float = RATE_LIMIT_LOCKOUT,
+                 max_lockout: float = RATE_LIMIT_MAX_LOCKOUT):
+        self.name = name
+        self.capacity, self.rate = parse_limit(limit)
+        self.state = state
+        self.lockout = lockout
+        self.max_lockout = max_lockout
+
+    def acquire(self, key: str, now: Optional[float] = None) -> float:
+        """Take one token; returns 0 if allowed, else the seconds until the next attempt"""
+        now = time.time() if now is None else now
+        wait = [0.0]
+
+        def take(bucket: Optional[Bucket]) -> Bucket:
+            if bucket is None:
+                return self.capacity - 1, now, 0, 0.0
+            tokens, updated_at, violations, locked_until = bucket
+            if locked_until > now:
+                wait[0] = locked_until - now
+                return bucket
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.rate)
+            if tokens >= self.capacity:
+                violations = 0  # a full bucket means the key has behaved for a while
+            if tokens >= 1:
+                return tokens - 1, now, violations, 0.0
+            violations += 1
+            wait[0] = min(self.max_lockout, self.lockout * 2 ** (violations - 1))
+            RATE_LIMIT_LOCKOUTS.inc(limiter=self.name)
+            return tokens, now, violations, now + wait[0]
+
+        self.state.update(f"{self.name}:{key}", take)
+        if wait[0]:
+            RATE_LIMITED.inc(limiter=self.name)
+        return wait[0]
+
+    def reset(self, key: str):
+        self.state.delete(f"{self.name}:{key}")
+
+
+class AuthThrottle:
+    """Rate limits for the authentication flows, checked per client first, then per email, then per account"""
+
+    def __init__(self, state=None):
+        if state is None:
+            state = SQLiteState(RATE_LIMIT_STATE_PATH) if RATE_LIMIT_STATE_PATH else MemoryState()
+        self.limiters: Dict[str, RateLimiter] = {
+            'login_email': RateLimiter('login_email', LOGIN_LIMIT_EMAIL, state),
+            'login_client': RateLimiter('login_client', LOGIN_LIMIT_CLIENT, state),
+            'login_account': RateLimiter('login_account', LOGIN_LIMIT_ACCOUNT, state),
+            'reset_email': RateLimiter('reset_email', RESET_LIMIT_EMAIL, state),
+            'reset_client': RateLimiter('reset_client', RESET_LIMIT_CLIENT, state),
+            'register_client': RateLimiter('register_client', REGISTER_LIMIT_CLIENT, state),
+        }
+
+    def _check(self, action: str, client: str, email_key: Optional[str] = None) -> float:
+        wait = self.limiters[f"{action}_client"].acquire(client)
+        if wait or email_key is None:
+            return wait
+        return self.limiters[f"{action}_email"].acquire(email_key)
+
+    @staticmethod
+    def _login_key(email: str, client: str) -> str:
+        return f"{client}|{email.strip().lower()}"
+
+    def login(self, email: str, client: str) -> float:
+        wait = self._check('login', client, self._login_key(email, client))
+        if wait:
+            return wait
+        return self.limiters['login_account'].acquire(email.strip().lower())
+
+    def login_succeeded(self, email: str, client: str):
+        self.limiters['login_email'].reset(self._login_key(email, client))
+        self.limiters['login_account'].reset(email.strip().lower())
+
+    def password_reset(self, email: str, client: str) -> float:
+        return self._check('reset', client, email.strip().lower())
+
+    def registration(self, client: str) -> float:
+        return self._check('register', client)
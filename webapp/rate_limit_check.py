@@ -0,0 +1,80 @@
+"""
+Check of the login throttling
+Drives AuthThrottle with many client ids against one account and checks
+that guesses are limited per client and email, that guesses spread across
+clients are limited per account under the looser account limit, that other
+accounts are not affected, that a successful login clears the account's
+count, and that two throttles sharing a state file count together.
+
+Usage (from the webapp directory):
+    python rate_limit_check.py
+"""
+
+import os
+import sys
+import tempfile
+
+from rate_limit import LOGIN_LIMIT_ACCOUNT, LOGIN_LIMIT_EMAIL, AuthThrottle, MemoryState, SQLiteState, parse_limit
+
+VICTIM = "victim@example.com"
+PER_EMAIL = int(parse_limit(LOGIN_LIMIT_EMAIL)[0])
+PER_ACCOUNT = int(parse_limit(LOGIN_LIMIT_ACCOUNT)[0])
+
+
+def allowed(throttle, email, clients):
+    """Number of login attempts let through, one per client id in `clients`"""
+    return sum(not throttle.login(email, client) for client in clients)
+
+
+def check_per_client():
+    throttle = AuthThrottle(MemoryState())
+    let_through = allowed(throttle, VICTIM, ["10.0.0.1"] * (PER_EMAIL + 3))
+    assert let_through == PER_EMAIL, f"{let_through} attempts from one client, limit {PER_EMAIL}"
+    assert not throttle.login(VICTIM, "10.0.0.2"), "another client must still be let through"
+    print(f"per client: {PER_EMAIL} attempts, then locked out")
+
+
+def check_spread():
+    throttle = AuthThrottle(MemoryState())
+    clients = [f"10.1.{i // 256}.{i % 256}" for i in range(PER_ACCOUNT * 3)]
+    let_through = allowed(throttle, VICTIM, clients)
+    assert let_through == PER_ACCOUNT, f"{let_through} attempts from {len(clients)} clients, limit {PER_ACCOUNT}"
+    assert not throttle.login("other@example.com", clients[-1]), "other accounts must not be affected"
+    print(f"spread: {len(clients)} clients, {let_through} attempts let through")
+
+
+def check_success_resets():
+    throttle = AuthThrottle(MemoryState())
+    clients = [f"10.2.0.{i}" for i in range(PER_ACCOUNT - 1)]
+    assert allowed(throttle, VICTIM, clients) == len(clients)
+    throttle.login_succeeded(VICTIM, clients[0])
+    more = [f"10.2.1.{i}" for i in range(PER_ACCOUNT)]
+    assert allowed(throttle, VICTIM, more) == PER_ACCOUNT, "a successful login must clear the account's count"
+    print("success resets: OK")
+
+
+def check_shared_state(workdir):
+    path = os.path.join(workdir, "rate_limits.sqlite")
+    first, second = AuthThrottle(SQLiteState(path)), AuthThrottle(SQLiteState(path))
+    clients = [f"10.3.0.{i}" for i in range(PER_ACCOUNT)]
+    let_through = allowed(first, VICTIM, clients[::2]) + allowed(second, VICTIM, clients[1::2])
+    assert let_through == PER_ACCOUNT, f"{let_through} attempts through two throttles, limit {PER_ACCOUNT}"
+    assert second.login(VICTIM, "10.3.1.1"), "the account limit must be shared through the state file"
+    print("shared state: OK")
+
+
+def main():
+    try:
+        check_per_client()
+        check_spread()
+        check_success_resets()
+        with tempfile.TemporaryDirectory() as workdir:
+            check_shared_state(workdir)
+    except AssertionError as e:
+        print(f"FAILED: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
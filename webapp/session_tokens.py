@@ -0,0 +1,125 @@
+# session_tokens.py - Signed Session Tokens
+
+"""
+Session Tokens for Trading Dashboard
+HMAC-signed tokens carrying the authenticated user, so a new tab or reconnect
+restores the session without a password. Keys rotate through SESSION_SECRETS.
+Each token also carries the user's session version; a password reset or a
+logout increments the version in the user store, which revokes every token
+issued before it (checked by AuthUI.restore_session through
+DatabaseManager.session_version, cached for SESSION_VERSION_TTL seconds).
+The token travels in a cookie, never in the URL.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import metrics
+
+# Comma-separated signing keys, newest first. The first key signs new tokens;
+# all of them verify, so a key can be rotated out once its tokens expire.
+SESSION_SECRETS = os.getenv("SESSION_SECRETS", "")
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))
+# Cookie carrying the token between page loads
+SESSION_COOKIE = "tradvisor_session"
+# Query parameter that carried the token in earlier releases, removed from URLs
+SESSION_PARAM = "session"
+
+TOKEN_VERSION = "v1"
+
+SESSION_TOKENS = metrics.counter("tradvisor_session_tokens_total", "Session token verifications by result")
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _key_id(key: bytes) -> str:
+    return hashlib.sha256(key).hexdigest()[:8]
+
+
+class SessionTokens:
+    """Issue and verify signed session tokens"""
+
+    def __init__(self, keys: Optional[List[str]] = None, ttl: int = SESSION_TTL):
+        if keys is None:
+            keys = [k.strip() for k in SESSION_SECRETS.split(",") if k.strip()]
+        if not keys:
+            # Tokens survive reconnects but not a restart of this process
+            print("SESSION_SECRETS is not set; using a per-process session key")
+            keys = [secrets.token_hex(32)]
+        self.keys = {_key_id(k.encode()): k.encode() for k in keys}
+        self.signing_kid = _key_id(keys[0].encode())
+        self.ttl = ttl
+
+    def _sign(self, kid: str, payload: str) -> str:
+        message = f"{TOKEN_VERSION}.{kid}.{payload}".encode()
+        return _b64encode(hmac.new(self.keys[kid], message, hashlib.sha256).digest())
+
+    def issue(self, user: Dict) -> str:
+        """Token for an authenticated user as returned by DatabaseManager.authenticate_user"""
+        now = int(time.time())
+        created_at = user.get('created_at')
+        claims = {
+            'uid': user['user_id'],
+            'sub': user['email'],
+            'ca': created_at.replace(tzinfo=timezone.utc).timestamp() if created_at else None,
+            'sv': user.get('session_version') or 0,
+            'iat': now,
+            'exp': now + self.ttl,
+            'jti': secrets.token_urlsafe(12),
+        }
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+        return f"{TOKEN_VERSION}.{self.signing_kid}.{payload}.{self._sign(self.signing_kid, payload)}"
+
+    def _claims(self, token: str) -> Optional[Dict]:
+        try:
+            version, kid, payload, signature = token.split(".")
+        except (AttributeError, ValueError):
+            return None
+        if version != TOKEN_VERSION or kid not in self.keys:
+            return None
+        if not hmac.compare_digest(signature, self._sign(kid, payload)):
+            return None
+        try:
+            return json.loads(_b64decode(payload))
+        except ValueError:
+            return None
+
+    def verify(self, token: Optional[str],
+               session_version: Optional[Callable[[str], Optional[int]]] = None) -> Optional[Dict]:
+        """
+        User dict for a valid token, or None. `session_version` returns the
+        current session version of an email (None for an unknown user); tokens
+        issued for another version have been revoked.
+        """
+        if not token:
+            return None
+        claims = self._claims(token)
+        if claims is None:
+            SESSION_TOKENS.inc(result='invalid')
+            return None
+        if claims['exp'] <= time.time():
+            SESSION_TOKENS.inc(result='expired')
+            return None
+        if session_version is not None and session_version(claims['sub']) != claims.get('sv', 0):
+            SESSION_TOKENS.inc(result='revoked')
+            return None
+        SESSION_TOKENS.inc(result='valid')
+        created_at = claims.get('ca')
+        return {
+            'user_id': claims['uid'],
+            'email': claims['sub'],
+            'created_at': datetime.utcfromtimestamp(created_at) if created_at is not None else None,
+        }
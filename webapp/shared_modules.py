@@ -0,0 +1,18 @@
+# shared_modules.py - Modules Shared with the Cloud Functions
+
+"""
+Shared Modules for Trading Dashboard
+The BRVM trading calendar (trading_calendar.py and brvm_holidays.csv) is
+shared with the cloud functions and has a single copy, in scripts/.
+Importing this module appends that directory to sys.path, so the webapp
+imports the calendar from there while its own modules, found first, keep
+precedence over same-named ones in scripts/ (e.g. helper.py).
+"""
+
+import os
+import sys
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts')
+
+if SCRIPTS_DIR not in sys.path:
+    sys.path.append(SCRIPTS_DIR)
@@ -0,0 +1,112 @@
+# signal_refresher.py - Signal Frame Refresher
+
+"""
+Signal Frame Refresher for Trading Dashboard
+Holds the signal frame built by data_manager.build_signals and rebuilds it
+in the background once it is older than DATA_REFRESH_TTL, serving the
+previous version meanwhile. A failed rebuild is retried only after
+DATA_REFRESH_RETRY seconds, so an unavailable warehouse is not hit with a
+full rebuild on every read.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import pandas as pd
+
+import metrics
+
+# Age (seconds) after which the signal frame is rebuilt in the background
+REFRESH_TTL = int(os.environ.get('DATA_REFRESH_TTL', '86400'))
+# Wait (seconds) after a failed rebuild before the next one
+REFRESH_RETRY = float(os.environ.get('DATA_REFRESH_RETRY', '300'))
+
+REFRESH_SECONDS = metrics.histogram("tradvisor_signal_refresh_seconds", "Duration of a full signal frame build")
+REFRESHES = metrics.counter("tradvisor_signal_refreshes_total", "Background signal frame rebuilds by result")
+SIGNAL_CACHE = metrics.counter("tradvisor_signal_cache_total", "Signal frame reads by cache result")
+
+logger = logging.getLogger(__name__)
+
+
+class SignalSnapshot(NamedTuple):
+    """An immutable version of the signal frame"""
+    frame: pd.DataFrame
+    built_at: float
+    duration: float
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.built_at
+
+
+class SignalRefresher:
+    """
+    Stale-while-revalidate holder for the signal frame.
+
+    The first call builds the frame synchronously. Afterwards, once the frame
+    is older than the TTL, a background thread rebuilds it while readers keep
+    getting the previous snapshot; the new one is swapped in with a single
+    reference assignment when ready. After a failed rebuild the next one
+    waits `retry` seconds.
+    """
+
+    def __init__(self, loader, ttl: int = REFRESH_TTL, retry: float = REFRESH_RETRY):
+        self._loader = loader
+        self.ttl = ttl
+        self.retry = retry
+        self._snapshot = None
+        self._initial_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.refreshing = False
+        self.last_error = None
+        self.failed_at: Optional[float] = None
+
+    def get(self) -> SignalSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            SIGNAL_CACHE.inc(result='miss')
+            with self._initial_lock:
+                if self._snapshot is None:
+                    self._snapshot = self._build()
+            return self._snapshot
+
+        if snapshot.age > self.ttl:
+            SIGNAL_CACHE.inc(result='stale')
+            self.refresh_async()
+        else:
+            SIGNAL_CACHE.inc(result='hit')
+        return snapshot
+
+    def refresh_async(self):
+        """Start a background rebuild unless one is already running or the last one failed recently"""
+        with self._refresh_lock:
+            if self.refreshing:
+                return
+            if self.failed_at is not None and time.monotonic() - self.failed_at < self.retry:
+                return
+            self.refreshing = True
+        threading.Thread(target=self._refresh, name="signal-refresher", daemon=True).start()
+
+    def _refresh(self):
+        try:
+            self._snapshot = self._build()
+            self.last_error = self.failed_at = None
+            REFRESHES.inc(result='ok')
+        except Exception as e:
+            # Keep serving the previous version; retried after self.retry seconds
+            self.last_error = e
+            self.failed_at = time.monotonic()
+            REFRESHES.inc(result='error')
+            logger.warning("Error refreshing signals, retrying in %g s: %s", self.retry, e)
+        finally:
+            self.refreshing = False
+
+    def _build(self) -> SignalSnapshot:
+        start = time.perf_counter()
+        frame = self._loader()
+        duration = time.perf_counter() - start
+        REFRESH_SECONDS.observe(duration)
+        return SignalSnapshot(frame, time.time(), duration)
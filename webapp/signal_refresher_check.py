@@ -0,0 +1,81 @@
+"""
+Check of the signal frame refresher
+Drives SignalRefresher with a loader that fails on demand and checks that
+stale reads keep serving the previous frame, that after a failed rebuild
+further stale reads start no rebuild until the retry delay has passed, and
+that a successful rebuild afterwards swaps in the new frame.
+
+Usage (from the webapp directory):
+    python signal_refresher_check.py
+"""
+
+import sys
+import time
+
+import pandas as pd
+
+from signal_refresher import SignalRefresher
+
+TTL = 0.05
+RETRY = 0.5
+
+
+class Loader:
+    """Counts builds; fails while `failing` is set"""
+
+    def __init__(self):
+        self.calls = 0
+        self.failing = False
+
+    def __call__(self):
+        self.calls += 1
+        if self.failing:
+            raise RuntimeError("warehouse unavailable")
+        return pd.DataFrame({'build': [self.calls]})
+
+
+def stale_read(refresher):
+    """Read past the TTL and wait for any rebuild it starts to finish"""
+    time.sleep(TTL * 2)
+    frame = refresher.get().frame
+    while refresher.refreshing:
+        time.sleep(0.01)
+    return frame
+
+
+def check_backoff():
+    loader = Loader()
+    refresher = SignalRefresher(loader, ttl=TTL, retry=RETRY)
+    first = refresher.get().frame
+    assert loader.calls == 1
+
+    loader.failing = True
+    frame = stale_read(refresher)
+    assert frame is first, "a stale read must serve the previous frame"
+    assert loader.calls == 2 and refresher.last_error is not None, "the stale read must start one rebuild"
+
+    for _ in range(3):
+        assert stale_read(refresher) is first
+    assert loader.calls == 2, f"{loader.calls - 2} rebuilds started within {RETRY} s of a failure"
+    print(f"backoff: no rebuild within {RETRY} s of a failure")
+
+    loader.failing = False
+    time.sleep(RETRY)
+    stale_read(refresher)
+    assert loader.calls == 3, "a rebuild must be retried once the delay has passed"
+    assert refresher.last_error is None and refresher.failed_at is None
+    assert refresher.get().frame['build'].iloc[0] == 3, "a successful rebuild must swap in the new frame"
+    print("retry after backoff: OK")
+
+
+def main():
+    try:
+        check_backoff()
+    except AssertionError as e:
+        print(f"FAILED: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
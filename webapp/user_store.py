@@ -0,0 +1,552 @@
+# user_store.py - Pluggable User Stores
+
+"""
+User Stores for Trading Dashboard Authentication
+Point lookups and updates of user records behind one interface, with
+interchangeable backends selected by the USER_STORE environment variable:
+
+- sqlite:    local file with WAL and a unique index on email
+- duckdb:    local embedded database (database/users.db)
+- firestore: Google Cloud Firestore key-value documents keyed by email
+- bigquery:  the analytical warehouse (previous cloud default)
+
+When USER_STORE is unset the store follows the deployment: bigquery when
+PROJECT_ID is set, duckdb otherwise. Client libraries are imported by the
+store that needs them. Constructing a store issues no DDL or metadata calls:
+schemas are created by migrations.py.
+"""
+
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Optional
+
+USER_STORE = os.getenv("USER_STORE", "bigquery" if os.environ.get("PROJECT_ID") else "duckdb").lower()
+USER_STORE_PATH = os.getenv("USER_STORE_PATH")
+USER_STORE_COLLECTION = os.getenv("USER_STORE_COLLECTION", "users")
+
+# Fields returned by get_user
+USER_FIELDS = ['user_id', 'email', 'password_hash', 'salt', 'created_at', 'preferences', 'session_version']
+TIMESTAMP_FIELDS = ('created_at', 'last_login', 'reset_token_expires')
+
+
+def parse_preferences(value) -> Dict:
+    """Preferences as a dict, whether stored as a JSON string or natively"""
+    if not value:
+        return {}
+    return json.loads(value) if isinstance(value, str) else dict(value)
+
+
+class UserStore(ABC):
+    """
+    Interface of a user store. Emails are passed already normalized
+    (lower case) and are unique.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def get_user(self, email: str) -> Optional[Dict]:
+        """User record (USER_FIELDS) for an email, or None"""
+
+    @abstractmethod
+    def get_user_by_reset_token(self, token: str) -> Optional[Dict]:
+        """{'email', 'reset_token_expires'} of the user holding a reset token, or None"""
+
+    @abstractmethod
+    def insert_user(self, record: Dict):
+        """Insert a new user record; raises if the email already exists"""
+
+    @abstractmethod
+    def update_user(self, email: str, fields: Dict) -> bool:
+        """Update fields of a user; returns False if no user has this email"""
+
+    @abstractmethod
+    def increment_session_version(self, email: str, fields: Optional[Dict] = None) -> bool:
+        """
+        Add one to session_version atomically in the store (concurrent calls
+        never write the same version), setting `fields` in the same write;
+        returns False if no user has this email
+        """
+
+    @abstractmethod
+    def update_last_logins(self, logins: Dict[str, datetime]):
+        """Set last_login for a batch of users in one write"""
+
+    @abstractmethod
+    def list_preferences(self) -> Dict[str, Dict]:
+        """Preferences of every user that has any, keyed by email (one scan)"""
+
+    @abstractmethod
+    def last_digests(self) -> Dict[str, str]:
+        """Market date (ISO) of the last digest sent to each user that received one (one scan)"""
+
+    @abstractmethod
+    def update_last_digests(self, emails: List[str], day: str):
+        """Record in one write that a batch of users received the digest of a market date"""
+
+    @abstractmethod
+    def schema_version(self) -> int:
+        """Latest applied migration version (0 when none); used by migrations.py"""
+
+    @abstractmethod
+    def record_schema_version(self, version: int, description: str):
+        """Record a migration as applied; used by migrations.py"""
+
+
+class SQLiteUserStore(UserStore):
+    """SQLite store in WAL mode with one connection per thread"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = None):
+        import sqlite3
+
+        self._sqlite3 = sqlite3
+        self.path = path or USER_STORE_PATH or "database/users.sqlite"
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._sqlite3.connect(self.path, isolation_level=None)
+            conn.row_factory = self._sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_db(value):
+        return value.isoformat(sep=" ") if isinstance(value, datetime) else value
+
+    @staticmethod
+    def _from_row(row) -> Dict:
+        record = dict(row)
+        for field in TIMESTAMP_FIELDS:
+            if record.get(field):
+                record[field] = datetime.fromisoformat(record[field])
+        return record
+
+    def get_user(self, email: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            f"SELECT {', '.join(USER_FIELDS)} FROM users WHERE email = ?", (email,)
+        ).fetchone()
+        return self._from_row(row) if row else None
+
+    def get_user_by_reset_token(self, token: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT email, reset_token_expires FROM users WHERE reset_token = ?", (token,)
+        ).fetchone()
+        return self._from_row(row) if row else None
+
+    def insert_user(self, record: Dict):
+        columns = list(record)
+        self._conn().execute(
+            f"INSERT INTO users ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [self._to_db(record[c]) for c in columns]
+        )
+
+    def update_user(self, email: str, fields: Dict) -> bool:
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        cursor = self._conn().execute(
+            f"UPDATE users SET {assignments} WHERE email = ?",
+            [self._to_db(value) for value in fields.values()] + [email]
+        )
+        return cursor.rowcount > 0
+
+    def increment_session_version(self, email: str, fields: Optional[Dict] = None) -> bool:
+        fields = fields or {}
+        assignments = "".join(f"{column} = ?, " for column in fields)
+        cursor = self._conn().execute(
+            f"UPDATE users SET {assignments}session_version = COALESCE(session_version, 0) + 1 WHERE email = ?",
+            [self._to_db(value) for value in fields.values()] + [email]
+        )
+        return cursor.rowcount > 0
+
+    def update_last_logins(self, logins: Dict[str, datetime]):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "UPDATE users SET last_login = ? WHERE email = ?",
+                [(self._to_db(when), email) for email, when in logins.items()]
+            )
+
+    def list_preferences(self) -> Dict[str, Dict]:
+        rows = self._conn().execute("SELECT email, preferences FROM users WHERE preferences IS NOT NULL")
+        return {email: parse_preferences(preferences) for email, preferences in rows}
+
+    def last_digests(self) -> Dict[str, str]:
+        return dict(self._conn().execute("SELECT email, last_digest FROM users WHERE last_digest IS NOT NULL"))
+
+    def update_last_digests(self, emails: List[str], day: str):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany("UPDATE users SET last_digest = ? WHERE email = ?", [(day, email) for email in emails])
+
+    def schema_version(self) -> int:
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS schema_migrations "
+            "(version INTEGER PRIMARY KEY, description TEXT, applied_at TEXT)"
+        )
+        return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations").fetchone()[0]
+
+    def record_schema_version(self, version: int, description: str):
+        self._conn().execute(
+            "INSERT INTO schema_migrations VALUES (?, ?, ?)",
+            (version, description, self._to_db(datetime.utcnow()))
+        )
+
+
+class DuckDBUserStore(UserStore):
+    """DuckDB store with a unique index on email and one cursor per thread"""
+
+    name = "duckdb"
+
+    def __init__(self, path: str = None):
+        import duckdb
+
+        self.path = path or USER_STORE_PATH or "database/users.db"
+        self.conn = duckdb.connect(self.path)
+        self._local = threading.local()
+
+    def _cursor(self):
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._local.cursor = self.conn.cursor()
+        return cursor
+
+    def get_user(self, email: str) -> Optional[Dict]:
+        row = self._cursor().execute(
+            f"SELECT {', '.join(USER_FIELDS)} FROM users WHERE email = ? LIMIT 1", [email]
+        ).fetchone()
+        return dict(zip(USER_FIELDS, row)) if row else None
+
+    def get_user_by_reset_token(self, token: str) -> Optional[Dict]:
+        row = self._cursor().execute(
+            "SELECT email, reset_token_expires FROM users WHERE reset_token = ? LIMIT 1", [token]
+        ).fetchone()
+        return {'email': row[0], 'reset_token_expires': row[1]} if row else None
+
+    def insert_user(self, record: Dict):
+        columns = list(record)
+        self._cursor().execute(
+            f"INSERT INTO users ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [record[c] for c in columns]
+        )
+
+    def update_user(self, email: str, fields: Dict) -> bool:
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        updated = self._cursor().execute(
+            f"UPDATE users SET {assignments} WHERE email = ?", list(fields.values()) + [email]
+        ).fetchone()
+        return bool(updated and updated[0])
+
+    def increment_session_version(self, email: str, fields: Optional[Dict] = None) -> bool:
+        fields = fields or {}
+        assignments = "".join(f"{column} = ?, " for column in fields)
+        updated = self._cursor().execute(
+            f"UPDATE users SET {assignments}session_version = COALESCE(session_version, 0) + 1 WHERE email = ?",
+            list(fields.values()) + [email]
+        ).fetchone()
+        return bool(updated and updated[0])
+
+    def update_last_logins(self, logins: Dict[str, datetime]):
+        cursor = self._cursor()
+        try:
+            cursor.execute("BEGIN TRANSACTION")
+            cursor.executemany(
+                "UPDATE users SET last_login = ? WHERE email = ?",
+                [[when, email] for email, when in logins.items()]
+            )
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+
+    def list_preferences(self) -> Dict[str, Dict]:
+        rows = self._cursor().execute(
+            "SELECT email, preferences FROM users WHERE preferences IS NOT NULL"
+        ).fetchall()
+        return {email: parse_preferences(preferences) for email, preferences in rows}
+
+    def last_digests(self) -> Dict[str, str]:
+        return dict(self._cursor().execute(
+            "SELECT email, last_digest FROM users WHERE last_digest IS NOT NULL"
+        ).fetchall())
+
+    def update_last_digests(self, emails: List[str], day: str):
+        cursor = self._cursor()
+        try:
+            cursor.execute("BEGIN TRANSACTION")
+            cursor.executemany("UPDATE users SET last_digest = ? WHERE email = ?", [[day, email] for email in emails])
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+
+    def schema_version(self) -> int:
+        cursor = self._cursor()
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS schema_migrations "
+            "(version INTEGER PRIMARY KEY, description VARCHAR, applied_at TIMESTAMP)"
+        )
+        return cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations").fetchone()[0]
+
+    def record_schema_version(self, version: int, description: str):
+        self._cursor().execute(
+            "INSERT INTO schema_migrations VALUES (?, ?, ?)", [version, description, datetime.utcnow()]
+        )
+
+
+class FirestoreUserStore(UserStore):
+    """Key-value store: one Firestore document per user, keyed by email"""
+
+    name = "firestore"
+
+    # Firestore accepts at most 500 writes per batch
+    BATCH_SIZE = 500
+
+    def __init__(self, collection: str = USER_STORE_COLLECTION):
+        from google.cloud import firestore
+        from google.cloud.firestore_v1.base_query import FieldFilter
+        from google.api_core.exceptions import NotFound
+
+        self._field_filter = FieldFilter
+        self._increment = firestore.Increment
+        self._not_found = NotFound
+        self.client = firestore.Client(project=os.environ.get('PROJECT_ID'))
+        self.collection = self.client.collection(collection)
+
+    def get_user(self, email: str) -> Optional[Dict]:
+        doc = self.collection.document(email).get(field_paths=USER_FIELDS)
+        return doc.to_dict() if doc.exists else None
+
+    def get_user_by_reset_token(self, token: str) -> Optional[Dict]:
+        query = self.collection.where(filter=self._field_filter("reset_token", "==", token)).limit(1)
+        for doc in query.stream():
+            record = doc.to_dict()
+            return {'email': record['email'], 'reset_token_expires': record.get('reset_token_expires')}
+        return None
+
+    def insert_user(self, record: Dict):
+        self.collection.document(record['email']).create(record)
+
+    def update_user(self, email: str, fields: Dict) -> bool:
+        try:
+            self.collection.document(email).update(fields)
+            return True
+        except self._not_found:
+            return False
+
+    def increment_session_version(self, email: str, fields: Optional[Dict] = None) -> bool:
+        return self.update_user(email, {**(fields or {}), 'session_version': self._increment(1)})
+
+    def update_last_logins(self, logins: Dict[str, datetime]):
+        items = list(logins.items())
+        for start in range(0, len(items), self.BATCH_SIZE):
+            batch = self.client.batch()
+            for email, when in items[start:start + self.BATCH_SIZE]:
+                batch.update(self.collection.document(email), {'last_login': when})
+            batch.commit()
+
+    def list_preferences(self) -> Dict[str, Dict]:
+        preferences = {}
+        for doc in self.collection.select(['preferences']).stream():
+            value = doc.to_dict().get('preferences')
+            if value:
+                preferences[doc.id] = parse_preferences(value)
+        return preferences
+
+    def last_digests(self) -> Dict[str, str]:
+        digests = {}
+        for doc in self.collection.select(['last_digest']).stream():
+            value = doc.to_dict().get('last_digest')
+            if value:
+                digests[doc.id] = value
+        return digests
+
+    def update_last_digests(self, emails: List[str], day: str):
+        for start in range(0, len(emails), self.BATCH_SIZE):
+            batch = self.client.batch()
+            for email in emails[start:start + self.BATCH_SIZE]:
+                batch.update(self.collection.document(email), {'last_digest': day})
+            batch.commit()
+
+    def _schema_doc(self):
+        return self.client.collection("schema_migrations").document(self.collection.id)
+
+    def schema_version(self) -> int:
+        doc = self._schema_doc().get()
+        return doc.to_dict().get('version', 0) if doc.exists else 0
+
+    def record_schema_version(self, version: int, description: str):
+        self._schema_doc().set({'version': version, 'description': description, 'applied_at': datetime.utcnow()})
+
+
+class BigQueryUserStore(UserStore):
+    """Users table in the BigQuery warehouse"""
+
+    name = "bigquery"
+
+    def __init__(self, dataset_id: str = "trading_dashboard", table_id: str = "users"):
+        from google.cloud import bigquery
+        from helper import getBigQueryClient
+
+        self._bigquery = bigquery
+        self.client = getBigQueryClient()
+        self.project_id = os.environ.get('PROJECT_ID')
+        self.dataset_id = dataset_id
+        self.table_id = table_id
+
+    @property
+    def table(self) -> str:
+        return f"`{self.project_id}.{self.dataset_id}.{self.table_id}`"
+
+    @property
+    def migrations_table(self) -> str:
+        return f"{self.project_id}.{self.dataset_id}.schema_migrations"
+
+    def _param(self, name, value):
+        kind = ("TIMESTAMP" if name in TIMESTAMP_FIELDS else "JSON" if name == 'preferences'
+                else "INT64" if name == 'session_version' else "STRING")
+        return self._bigquery.ScalarQueryParameter(name, kind, value)
+
+    def _run(self, query: str, params: Dict):
+        job_config = self._bigquery.QueryJobConfig(
+            query_parameters=[self._param(name, value) for name, value in params.items()]
+        )
+        query_job = self.client.query(query, job_config=job_config)
+        return query_job, query_job.result()
+
+    def get_user(self, email: str) -> Optional[Dict]:
+        _, rows = self._run(
+            f"SELECT {', '.join(USER_FIELDS)} FROM {self.table} WHERE email = @email LIMIT 1",
+            {'email': email}
+        )
+        for row in rows:
+            return {field: row[field] for field in USER_FIELDS}
+        return None
+
+    def get_user_by_reset_token(self, token: str) -> Optional[Dict]:
+        _, rows = self._run(
+            f"SELECT email, reset_token_expires FROM {self.table} WHERE reset_token = @reset_token LIMIT 1",
+            {'reset_token': token}
+        )
+        for row in rows:
+            return {'email': row.email, 'reset_token_expires': row.reset_token_expires}
+        return None
+
+    def insert_user(self, record: Dict):
+        columns = list(record)
+        self._run(
+            f"INSERT INTO {self.table} ({', '.join(columns)}) VALUES ({', '.join('@' + c for c in columns)})",
+            record
+        )
+
+    def update_user(self, email: str, fields: Dict) -> bool:
+        assignments = ", ".join(f"{column} = @{column}" for column in fields)
+        query_job, _ = self._run(
+            f"UPDATE {self.table} SET {assignments} WHERE email = @email",
+            {**fields, 'email': email}
+        )
+        return bool(query_job.num_dml_affected_rows)
+
+    def increment_session_version(self, email: str, fields: Optional[Dict] = None) -> bool:
+        fields = fields or {}
+        assignments = "".join(f"{column} = @{column}, " for column in fields)
+        query_job, _ = self._run(
+            f"UPDATE {self.table} SET {assignments}session_version = IFNULL(session_version, 0) + 1 "
+            f"WHERE email = @email",
+            {**fields, 'email': email}
+        )
+        return bool(query_job.num_dml_affected_rows)
+
+    def update_last_logins(self, logins: Dict[str, datetime]):
+        """Update the last login timestamps of a batch of users in one MERGE job"""
+        bigquery = self._bigquery
+        query = f"""
+        MERGE {self.table} T
+        USING (SELECT * FROM UNNEST(@logins)) S
+        ON T.email = S.email
+        WHEN MATCHED THEN UPDATE SET last_login = S.last_login
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ArrayQueryParameter("logins", "STRUCT", [
+                    bigquery.StructQueryParameter(
+                        None,
+                        bigquery.ScalarQueryParameter("email", "STRING", email),
+                        bigquery.ScalarQueryParameter("last_login", "TIMESTAMP", when),
+                    ) for email, when in logins.items()
+                ])
+            ]
+        )
+        self.client.query(query, job_config=job_config).result()
+
+    def list_preferences(self) -> Dict[str, Dict]:
+        _, rows = self._run(f"SELECT email, preferences FROM {self.table} WHERE preferences IS NOT NULL", {})
+        return {row.email: parse_preferences(row.preferences) for row in rows}
+
+    def last_digests(self) -> Dict[str, str]:
+        _, rows = self._run(f"SELECT email, last_digest FROM {self.table} WHERE last_digest IS NOT NULL", {})
+        return {row.email: row.last_digest for row in rows}
+
+    def update_last_digests(self, emails: List[str], day: str):
+        """Update the last digest date of a batch of users in one DML job"""
+        bigquery = self._bigquery
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ArrayQueryParameter("emails", "STRING", emails),
+            bigquery.ScalarQueryParameter("last_digest", "STRING", day),
+        ])
+        self.client.query(
+            f"UPDATE {self.table} SET last_digest = @last_digest WHERE email IN UNNEST(@emails)",
+            job_config=job_config
+        ).result()
+
+    def schema_version(self) -> int:
+        bigquery = self._bigquery
+        dataset = bigquery.Dataset(f"{self.project_id}.{self.dataset_id}")
+        dataset.location = "EU"
+        dataset.description = "Tradvisor user authentication data"
+        self.client.create_dataset(dataset, exists_ok=True, timeout=30)
+        self.client.create_table(bigquery.Table(self.migrations_table, schema=[
+            bigquery.SchemaField("version", "INTEGER", mode="REQUIRED"),
+            bigquery.SchemaField("description", "STRING", mode="NULLABLE"),
+            bigquery.SchemaField("applied_at", "TIMESTAMP", mode="REQUIRED"),
+        ]), exists_ok=True)
+        _, rows = self._run(f"SELECT COALESCE(MAX(version), 0) AS version FROM `{self.migrations_table}`", {})
+        for row in rows:
+            return row.version
+        return 0
+
+    def record_schema_version(self, version: int, description: str):
+        self.client.query(
+            f"INSERT INTO `{self.migrations_table}` (version, description, applied_at) "
+            f"VALUES (@version, @description, @applied_at)",
+            job_config=self._bigquery.QueryJobConfig(query_parameters=[
+                self._bigquery.ScalarQueryParameter("version", "INT64", version),
+                self._bigquery.ScalarQueryParameter("description", "STRING", description),
+                self._bigquery.ScalarQueryParameter("applied_at", "TIMESTAMP", datetime.utcnow()),
+            ])
+        ).result()
+
+
+USER_STORES = {
+    'sqlite': SQLiteUserStore,
+    'duckdb': DuckDBUserStore,
+    'firestore': FirestoreUserStore,
+    'bigquery': BigQueryUserStore,
+}
+
+
+def create_user_store(kind: str = USER_STORE) -> UserStore:
+    """Instantiate the configured user store"""
+    if kind not in USER_STORES:
+        raise ValueError(f"Unknown USER_STORE '{kind}'. Expected one of: {', '.join(USER_STORES)}")
+    return USER_STORES[kind]()
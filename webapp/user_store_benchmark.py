@@ -0,0 +1,165 @@
+"""
+User store conformance check and lookup benchmark
+Runs the same contract checks against each selected user store, then times
+point lookups by email over a populated table.
+
+Usage (from the webapp directory):
+    python user_store_benchmark.py [--stores sqlite duckdb] [--users 10000] [--lookups 20000]
+
+Local stores run in a scratch directory; firestore and bigquery use the
+project configured by PROJECT_ID and a throwaway collection/table.
+"""
+
+import argparse
+import json
+import os
+import random
+import secrets
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from migrations import migrate
+from user_store import USER_STORES
+
+# Threads revoking one user's sessions at once in the conformance check
+SESSION_REVOKERS = 8
+
+def make_record(email):
+    return {
+        'user_id': secrets.token_hex(16),
+        'email': email,
+        'password_hash': secrets.token_hex(32),
+        'salt': secrets.token_hex(32),
+        'created_at': datetime.utcnow().replace(microsecond=0),
+    }
+
+
+def open_store(kind, workdir):
+    suffix = secrets.token_hex(4)
+    if kind == 'sqlite':
+        return USER_STORES[kind](os.path.join(workdir, f"users-{suffix}.sqlite"))
+    if kind == 'duckdb':
+        return USER_STORES[kind](os.path.join(workdir, f"users-{suffix}.db"))
+    if kind == 'firestore':
+        return USER_STORES[kind](f"users_benchmark_{suffix}")
+    return USER_STORES[kind](table_id=f"users_benchmark_{suffix}")
+
+
+def check_conformance(store):
+    """Contract every UserStore must satisfy; raises AssertionError on failure"""
+    record = make_record(f"conformance-{secrets.token_hex(4)}@example.com")
+    email = record['email']
+
+    assert store.get_user(email) is None, "unknown email must return None"
+    store.insert_user(record)
+
+    user = store.get_user(email)
+    assert user is not None, "inserted user must be found"
+    for field in ('user_id', 'email', 'password_hash', 'salt'):
+        assert user[field] == record[field], f"{field} must round-trip"
+    assert isinstance(user['created_at'], datetime), "created_at must be a datetime"
+
+    try:
+        store.insert_user(make_record(email))
+    except Exception:
+        pass
+    else:
+        raise AssertionError("duplicate email must be rejected")
+
+    token = secrets.token_urlsafe(32)
+    expires = datetime.utcnow().replace(microsecond=0) + timedelta(hours=1)
+    assert store.update_user(email, {'reset_token': token, 'reset_token_expires': expires}), \
+        "update of an existing user must return True"
+    assert not store.update_user("missing@example.com", {'reset_token': token}), \
+        "update of an unknown user must return False"
+
+    found = store.get_user_by_reset_token(token)
+    assert found and found['email'] == email, "reset token must find its user"
+    assert found['reset_token_expires'].replace(tzinfo=None) == expires, "reset_token_expires must round-trip"
+    assert store.get_user_by_reset_token("unknown-token") is None, "unknown token must return None"
+
+    store.update_user(email, {'reset_token': None, 'reset_token_expires': None})
+    assert store.get_user_by_reset_token(token) is None, "cleared token must not match"
+
+    store.update_last_logins({email: datetime.utcnow(), "missing@example.com": datetime.utcnow()})
+
+    preferences = {'digest': True, 'watchlist': ['SNTS']}
+    store.update_user(email, {'preferences': json.dumps(preferences)})
+    assert store.list_preferences().get(email) == preferences, "preferences must round-trip"
+
+    store.update_last_digests([email, "missing@example.com"], "2024-06-28")
+    assert store.last_digests().get(email) == "2024-06-28", "last digest date must round-trip"
+
+    # Concurrent revocations must each get their own version
+    before = store.get_user(email).get('session_version') or 0
+    with ThreadPoolExecutor(max_workers=SESSION_REVOKERS) as pool:
+        assert all(pool.map(lambda _: store.increment_session_version(email), range(SESSION_REVOKERS * 4))), \
+            "increment of an existing user must return True"
+    assert store.get_user(email)['session_version'] == before + SESSION_REVOKERS * 4, \
+        "concurrent session version increments must not be lost"
+    assert store.increment_session_version(email, {'reset_token': None}), "increment with fields must return True"
+    assert not store.increment_session_version("missing@example.com"), \
+        "increment of an unknown user must return False"
+
+
+def benchmark_lookups(store, users, lookups, seed=42):
+    """Populate `users` records and return per-lookup latencies in seconds"""
+    emails = [f"user{i}@example.com" for i in range(users)]
+    for email in emails:
+        store.insert_user(make_record(email))
+
+    rng = random.Random(seed)
+    latencies = []
+    for _ in range(lookups):
+        email = rng.choice(emails)
+        start = time.perf_counter()
+        user = store.get_user(email)
+        latencies.append(time.perf_counter() - start)
+        assert user is not None
+    return latencies
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stores", nargs="+", default=['sqlite', 'duckdb'], choices=list(USER_STORES))
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--budget-ms", type=float, default=1.0, help="median lookup budget for local stores")
+    args = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        for kind in args.stores:
+            store = open_store(kind, workdir)
+            migrate(store)
+            try:
+                check_conformance(store)
+                print(f"{kind}: conformance OK")
+            except AssertionError as e:
+                failures += 1
+                print(f"{kind}: conformance FAILED - {e}")
+                continue
+
+            latencies = benchmark_lookups(store, args.users, args.lookups)
+            p50, p95, p99 = (percentile(latencies, q) * 1000 for q in (0.50, 0.95, 0.99))
+            print(f"{kind}: {args.lookups} lookups over {args.users} users - "
+                  f"mean {statistics.mean(latencies) * 1000:.3f} ms, "
+                  f"p50 {p50:.3f} ms, p95 {p95:.3f} ms, p99 {p99:.3f} ms")
+            if kind in ('sqlite', 'duckdb') and p50 > args.budget_ms:
+                failures += 1
+                print(f"{kind}: median lookup {p50:.3f} ms exceeds the {args.budget_ms} ms budget")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())